@@ -0,0 +1,194 @@
+import threading
+import time
+
+import MySQLdb
+
+
+class AgentLocationStore:
+    """
+    Latest reported position of every delivery agent, held in this process,
+    with coalesced write-behind to MySQL.
+
+    record() only touches memory: the newest position per agent replaces
+    the previous one, both as the agent's current location and as its
+    pending write. flush() then writes one row per agent that moved,
+    however many reports arrived since the last flush, in multi-row
+    statements. Reports older than the position already held (a delayed
+    batch) are ignored.
+
+    Like the local cart backend, each worker process only sees the reports
+    it received itself; other processes (and the dispatcher) read the
+    positions from MySQL once they are flushed. Reports from one agent may
+    land on several workers, so the row keeps the time of its position
+    (location_updated_at) and a flush only replaces an older one, and
+    readers should prefer a position held here only when it is newer than
+    the row (newer_positions()).
+    """
+
+    FLUSH_CHUNK = 500  # rows per INSERT statement
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self._latest = {}   # agent_id -> (lat, lng, reported_at)
+        self._pending = {}  # agent_id -> (lat, lng, reported_at) not yet in MySQL
+        self._lock = threading.Lock()
+        self._stats = {'reports': 0, 'points': 0, 'stale_points': 0, 'flushes': 0,
+                       'rows_written': 0, 'flush_errors': 0, 'last_flush_ms': None}
+
+    def record(self, agent_id, points):
+        """
+        Take a batch of (lat, lng, reported_at) points from one agent
+        (reported_at in epoch seconds). Returns the agent's position after
+        the batch, or None if every point was older than the one held.
+        """
+        newest = max(points, key=lambda point: point[2])
+        with self._lock:
+            self._stats['reports'] += 1
+            self._stats['points'] += len(points)
+            current = self._latest.get(agent_id)
+            if current is not None and current[2] > newest[2]:
+                self._stats['stale_points'] += len(points)
+                return None
+            self._latest[agent_id] = self._pending[agent_id] = newest
+        return newest
+
+    def get(self, agent_id, max_age=None):
+        """
+        (lat, lng, reported_at) of the agent's last report, or None if there
+        is none (or it is older than `max_age` seconds)
+        """
+        with self._lock:
+            position = self._latest.get(agent_id)
+        max_age = self.max_age if max_age is None else max_age
+        if position is None or time.time() - position[2] > max_age:
+            return None
+        return position
+
+    def positions(self, agent_ids=None):
+        """
+        {agent_id: (lat, lng, reported_at)} of current positions
+        """
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            if agent_ids is None:
+                return {agent_id: position for agent_id, position in self._latest.items()
+                        if position[2] >= cutoff}
+            found = {}
+            for agent_id in agent_ids:
+                position = self._latest.get(agent_id)
+                if position is not None and position[2] >= cutoff:
+                    found[agent_id] = position
+            return found
+
+    def newer_positions(self, rows, id_key='delivery_agent_id'):
+        """
+        Overlay rows read from delivery_agent_availability (current_latitude,
+        current_longitude and location_reported_at in epoch seconds) with
+        the positions held here that are newer. Returns the rows.
+        """
+        positions = self.positions(row[id_key] for row in rows)
+        for row in rows:
+            position = positions.get(row[id_key])
+            if position is None:
+                continue
+            if row['location_reported_at'] is None or position[2] > row['location_reported_at']:
+                row['current_latitude'], row['current_longitude'] = position[:2]
+        return rows
+
+    def forget(self, agent_id):
+        with self._lock:
+            self._latest.pop(agent_id, None)
+            self._pending.pop(agent_id, None)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, cur):
+        """
+        Write the pending positions through `cur`: one upsert of
+        delivery_agent_availability per FLUSH_CHUNK agents, then the copies
+        on users in one statement per chunk. The caller commits and then
+        passes the result to confirm(); if the transaction fails the
+        positions stay pending.
+        """
+        with self._lock:
+            batch = dict(self._pending)
+        if not batch:
+            return batch
+
+        started = time.perf_counter()
+        rows = sorted(batch.items())  # same lock order in every flush
+        try:
+            for start in range(0, len(rows), self.FLUSH_CHUNK):
+                chunk = rows[start:start + self.FLUSH_CHUNK]
+                self._upsert(cur, [(agent_id, lat, lng, int(reported_at), round(reported_at, 3))
+                                   for agent_id, (lat, lng, reported_at) in chunk])
+                cur.execute("""
+                    UPDATE users u
+                    JOIN delivery_agent_availability da ON da.delivery_agent_id = u.id
+                    SET u.latitude = da.current_latitude, u.longitude = da.current_longitude
+                    WHERE u.id IN ({})
+                """.format(', '.join(['%s'] * len(chunk))), [agent_id for agent_id, _ in chunk])
+        except MySQLdb.Error:
+            with self._lock:
+                self._stats['flush_errors'] += 1
+            raise
+
+        with self._lock:
+            self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return batch
+
+    def _upsert(self, cur, rows):
+        # SET clauses apply left to right: location_updated_at changes last,
+        # so every condition sees the time of the position already stored
+        query = """
+            INSERT INTO delivery_agent_availability
+            (delivery_agent_id, current_latitude, current_longitude, is_available,
+             last_active, location_updated_at)
+            VALUES {}
+            ON DUPLICATE KEY UPDATE
+            current_latitude = IF(location_updated_at IS NULL OR VALUES(location_updated_at) >= location_updated_at,
+                                  VALUES(current_latitude), current_latitude),
+            current_longitude = IF(location_updated_at IS NULL OR VALUES(location_updated_at) >= location_updated_at,
+                                   VALUES(current_longitude), current_longitude),
+            last_active = GREATEST(last_active, VALUES(last_active)),
+            location_updated_at = IF(location_updated_at IS NULL OR VALUES(location_updated_at) >= location_updated_at,
+                                     VALUES(location_updated_at), location_updated_at)
+        """
+        row_sql = '(%s, %s, %s, TRUE, FROM_UNIXTIME(%s), FROM_UNIXTIME(%s))'
+        try:
+            cur.execute(query.format(', '.join([row_sql] * len(rows))),
+                        [value for row in rows for value in row])
+        except MySQLdb.IntegrityError:
+            # An agent deleted since reporting; write the others one by one
+            for row in rows:
+                try:
+                    cur.execute(query.format(row_sql), row)
+                except MySQLdb.IntegrityError:
+                    pass
+
+    def confirm(self, batch):
+        """
+        Forget pending positions written by a committed flush(), unless a
+        newer one arrived in the meantime; drop agents not heard from for
+        `max_age` seconds
+        """
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            for agent_id, position in batch.items():
+                if self._pending.get(agent_id) == position:
+                    del self._pending[agent_id]
+            if batch:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += len(batch)
+            for agent_id in [agent_id for agent_id, position in self._latest.items()
+                             if position[2] < cutoff and agent_id not in self._pending]:
+                del self._latest[agent_id]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['agents'] = len(self._latest)
+            stats['pending'] = len(self._pending)
+        return stats
@@ -1,15 +1,37 @@
-from flask import Flask, jsonify, render_template, request, redirect, url_for, session, flash, send_from_directory
-from flask_mysqldb import MySQL
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, session, flash, send_from_directory, stream_with_context
 import os
 import datetime
+import math
+import time
 import random
-import string
+import signal
+import socket
+import threading
+import uuid
+import atexit
+import asyncio
+from http.cookies import CookieError, SimpleCookie
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from functools import wraps
-import math
+import click
+from itsdangerous import BadSignature
 from MySQLdb.cursors import DictCursor
 from config import Config
+from db_pool import MySQLPool
+from geo_index import AgentLocationIndex
+from agent_locations import AgentLocationStore
+from distance import EARTH_RADIUS_KM, bounding_box, distance_matrix, distances_from
+from dispatch import assignment_costs, calculate_agent_score, solve_assignment
+from job_queue import MemoryJobQueue, MySQLJobQueue, retry_delay, work
+from export import EXPORT_FORMATS, encode_rows, stream_rows
+from cache import Cache, CategoryRegistry, LocalCacheBackend, MySQLCacheVersions, RedisCacheBackend
+from search_index import SearchIndex, SuggestIndex
+from order_numbers import OrderNumberAllocator
+from cart_store import CartService, LocalCartBackend, MySQLCartBackend, RedisCartBackend
+from pricing import line_total, price_cart, unit_price
+from order_events import BrokerFull, OrderEventBroker, format_comment, open_stream, stream_messages
+from sse_server import EventStreamServer
 from decimal import Decimal
 
 
@@ -17,12 +39,65 @@ app = Flask(__name__)
 app.config.from_object(Config)
 Config.init_app(app)
 
-mysql = MySQL(app)
+mysql = MySQLPool(app)
 
-# Helper Functions
-def generate_order_number():
-    return 'ORD' + ''.join(random.choices(string.digits, k=8)) + datetime.datetime.now().strftime('%m%d')
+# Nearest-agent lookups; refreshed from delivery_agent_availability periodically
+agent_index = AgentLocationIndex(cell_km=app.config['GEO_INDEX_CELL_KM'])
+
+# Latest agent positions as reported; written to MySQL by the location flusher, see start_location_flusher()
+agent_locations = AgentLocationStore(max_age=app.config['LOCATION_MAX_AGE_SECONDS'])
+
+# Background jobs; `flask worker` processes them, or an in-process thread with the memory backend
+job_queue = MemoryJobQueue() if app.config['JOB_QUEUE_BACKEND'] == 'memory' else MySQLJobQueue(mysql)
+
+# Restaurant listings and menus; invalidated by the seller and admin routes that change them
+cache = Cache(
+    RedisCacheBackend(app.config['CACHE_REDIS_URL']) if app.config['CACHE_BACKEND'] == 'redis'
+    else LocalCacheBackend(app.config['CACHE_MAX_ENTRIES'],
+                           MySQLCacheVersions(mysql, app.config['CACHE_VERSION_CHECK_SECONDS'])),
+    ttl=app.config['CACHE_TTL_SECONDS']
+)
+
+# Food categories, shared by every page; see refresh_categories()
+category_registry = CategoryRegistry()
+
+# Restaurant and dish search and type-ahead; kept current from search_changes by refresh_search_index()
+search_index = SearchIndex()
+suggest_index = SuggestIndex()
+
+# Order numbers, reserved from order_number_blocks a block at a time
+order_numbers = OrderNumberAllocator()
+
+# Customer carts; written back to the cart table by the flusher thread, see start_cart_flusher()
+def load_cart(customer_id):
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT food_item_id, quantity FROM cart WHERE customer_id = %s", (customer_id,))
+    items = {row['food_item_id']: row['quantity'] for row in cur.fetchall()}
+    cur.close()
+    return items
+
+def cart_backend(name):
+    if name == 'redis':
+        return RedisCartBackend(app.config['CACHE_REDIS_URL'])
+    if name == 'local':
+        return LocalCartBackend(app.config['CART_MAX_CARTS'])
+    return MySQLCartBackend(mysql)
+
+cart_service = CartService(
+    cart_backend(app.config['CART_BACKEND']),
+    load_cart,
+    max_quantity=app.config['CART_MAX_QUANTITY']
+)
+
+# Order status events for the SSE streams; fed from order_tracking by the tailer, see start_event_tailer()
+order_events = OrderEventBroker(
+    max_subscribers=app.config['EVENTS_MAX_STREAMS'],
+    max_queue=app.config['EVENTS_QUEUE_SIZE'],
+    replay_size=app.config['EVENTS_REPLAY_SIZE']
+)
+ASSIGN_DELIVERY_JOB = 'assign_delivery'
 
+# Helper Functions
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -59,10 +134,327 @@ def save_image(file):
         return 'uploads/' + unique_filename
     return None
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    # Simple distance calculation (Haversine formula simplified)
-    # In production, use proper geolocation library
-    return math.sqrt((lat2 - lat1)**2 + (lon2 - lon1)**2)
+def add_order_tracking(cur, order_id, status, notes='', latitude=None, longitude=None):
+    """
+    Insert an order_tracking entry and keep order_latest_status in sync.
+    Every status writer must go through here so list views can read the
+    current status with a primary key join instead of a per-row subquery.
+    """
+    cur.execute("""
+        INSERT INTO order_tracking (order_id, status, notes, location_latitude, location_longitude)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (order_id, status, notes, latitude, longitude))
+    tracking_id = cur.lastrowid
+
+    # Only move forward: a slower concurrent writer must not overwrite a newer entry
+    cur.execute("""
+        INSERT INTO order_latest_status (order_id, tracking_id, status)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        status = IF(VALUES(tracking_id) > tracking_id, VALUES(status), status),
+        tracking_id = GREATEST(tracking_id, VALUES(tracking_id))
+    """, (order_id, tracking_id, status))
+
+    return tracking_id
+
+ORDER_STATUSES = ('pending', 'confirmed', 'preparing', 'ready', 'assigned',
+                  'picked_up', 'on_the_way', 'delivered', 'cancelled')
+
+def record_seller_order(cur, order_id):
+    """
+    Count a newly placed (pending) order in its seller's daily stats
+    """
+    cur.execute("""
+        INSERT INTO seller_daily_stats (seller_id, stat_date, order_count, revenue, pending_count)
+        SELECT seller_id, DATE(created_at), 1, final_amount, 1
+        FROM orders
+        WHERE id = %s
+        ON DUPLICATE KEY UPDATE
+        order_count = order_count + 1,
+        revenue = revenue + VALUES(revenue),
+        pending_count = pending_count + 1
+    """, (order_id,))
+
+COUNTER_SLOTS = 16
+
+def bump_platform_counter(cur, name, delta=1):
+    """
+    Add `delta` to a platform counter. Each counter is spread over
+    COUNTER_SLOTS rows so concurrent writers rarely wait on the same row
+    lock; readers sum the slots.
+    """
+    cur.execute("""
+        INSERT INTO platform_counters (name, slot, value)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+    """, (name, random.randrange(COUNTER_SLOTS), delta))
+
+def record_platform_day(cur, stat_date=None, orders=0, revenue=0, new_users=0):
+    """
+    Add to the platform totals for a day (today by default), slotted like the counters
+    """
+    cur.execute("""
+        INSERT INTO platform_daily_stats (stat_date, slot, order_count, revenue, new_users)
+        VALUES (COALESCE(%s, CURDATE()), %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        order_count = order_count + VALUES(order_count),
+        revenue = revenue + VALUES(revenue),
+        new_users = new_users + VALUES(new_users)
+    """, (stat_date, random.randrange(COUNTER_SLOTS), orders, revenue, new_users))
+
+def read_platform_counters(cur):
+    cur.execute("SELECT name, SUM(value) as value FROM platform_counters GROUP BY name")
+    return {row['name']: int(row['value']) for row in cur.fetchall()}
+
+def record_new_user(cur, user_type):
+    bump_platform_counter(cur, f'users_{user_type}')
+    record_platform_day(cur, new_users=1)
+
+def record_new_order(cur, order_id, seller_id, final_amount):
+    """
+    Count a newly placed order in the seller rollup, the seller's lifetime
+    totals and the platform metrics
+    """
+    record_seller_order(cur, order_id)
+    
+    cur.execute("""
+        UPDATE sellers
+        SET total_orders = total_orders + 1, total_revenue = total_revenue + %s
+        WHERE id = %s
+    """, (final_amount, seller_id))
+    
+    bump_platform_counter(cur, 'orders_total')
+    bump_platform_counter(cur, 'orders_pending')
+    record_platform_day(cur, orders=1, revenue=final_amount)
+
+def record_user_removed(cur, user_id):
+    """
+    Take a user that is about to be deleted, and the orders that cascade
+    with them, out of the rollups and platform metrics
+    """
+    cur.execute("SELECT user_type, DATE(created_at) as joined FROM users WHERE id = %s", (user_id,))
+    user = cur.fetchone()
+    if not user:
+        return
+    
+    bump_platform_counter(cur, f'users_{user["user_type"]}', -1)
+    record_platform_day(cur, user['joined'], new_users=-1)
+    
+    # Orders placed by the customer, or received by the seller
+    cur.execute("""
+        SELECT o.id, o.seller_id, o.order_status, o.final_amount,
+               DATE(o.created_at) as stat_date, s.user_id = %s as own_restaurant
+        FROM orders o
+        JOIN sellers s ON o.seller_id = s.id
+        WHERE o.customer_id = %s
+        UNION
+        SELECT o.id, o.seller_id, o.order_status, o.final_amount,
+               DATE(o.created_at) as stat_date, TRUE as own_restaurant
+        FROM orders o
+        JOIN sellers s ON o.seller_id = s.id
+        WHERE s.user_id = %s
+    """, (user_id, user_id, user_id))
+    
+    for order in cur.fetchall():
+        bump_platform_counter(cur, 'orders_total', -1)
+        bump_platform_counter(cur, f'orders_{order["order_status"]}', -1)
+        record_platform_day(cur, order['stat_date'], orders=-1, revenue=-order['final_amount'])
+        
+        # A deleted seller's own stats go with the sellers row
+        if not order['own_restaurant']:
+            cur.execute("""
+                UPDATE sellers
+                SET total_orders = total_orders - 1, total_revenue = total_revenue - %s
+                WHERE id = %s
+            """, (order['final_amount'], order['seller_id']))
+            cur.execute("""
+                UPDATE seller_daily_stats
+                SET order_count = order_count - 1, revenue = revenue - %s,
+                    {status}_count = {status}_count - 1
+                WHERE seller_id = %s AND stat_date = %s
+            """.format(status=order['order_status']),
+                (order['final_amount'], order['seller_id'], order['stat_date']))
+
+def page_args():
+    """
+    Page size and keyset position for list pages: ?limit=N&cursor=C, where C
+    is the next_cursor of the previous page ("<created_at>:<id>" of its last
+    row). A malformed cursor starts over from the first page.
+    """
+    limit = request.args.get('limit', app.config['LIST_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['LIST_MAX_PAGE_SIZE'])
+    
+    after = None
+    if request.args.get('cursor'):
+        try:
+            created_at, row_id = request.args['cursor'].rsplit(':', 1)
+            after = (datetime.datetime.fromisoformat(created_at), int(row_id))
+        except ValueError:
+            pass
+    
+    return limit, after
+
+def fetch_page(cur, query, params, limit, after, created_column='o.created_at', id_column='o.id',
+               cursor_keys=('created_at', 'id')):
+    """
+    Run a list query newest first, one page at a time. `query` ends with its
+    WHERE conditions; the keyset condition on (created_column, id_column) and
+    the ORDER BY / LIMIT are added here, so each page is an index range scan.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    params = list(params)
+    
+    if after:
+        query += " AND ({created} < %s OR ({created} = %s AND {id} < %s))".format(
+            created=created_column, id=id_column)
+        params.extend([after[0], after[0], after[1]])
+    
+    # One extra row tells whether there is a next page
+    query += " ORDER BY {created} DESC, {id} DESC LIMIT %s".format(created=created_column, id=id_column)
+    params.append(limit + 1)
+    
+    cur.execute(query, params)
+    rows = list(cur.fetchall())
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        created_key, id_key = cursor_keys
+        next_cursor = f'{rows[-1][created_key].isoformat()}:{rows[-1][id_key]}'
+    
+    return rows, next_cursor
+
+def wants_json():
+    return request.args.get('format') == 'json'
+
+@app.template_global()
+def page_url(cursor=None):
+    """
+    The current list page with another cursor (None = first page), keeping its filters
+    """
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **request.view_args, **args)
+
+# Export datasets: (query, columns). Each query ends with its WHERE conditions
+# and is filtered on o.created_at and o.seller_id.
+EXPORT_DATASETS = {
+    'orders': ("""
+        SELECT o.id, o.order_number, o.created_at, o.updated_at, o.seller_id, s.restaurant_name,
+               o.customer_id, u.full_name as customer_name, o.delivery_agent_id,
+               o.total_amount, o.delivery_charge, o.tax_amount, o.final_amount,
+               o.payment_method, o.payment_status, o.order_status
+        FROM orders o
+        JOIN sellers s ON o.seller_id = s.id
+        JOIN users u ON o.customer_id = u.id
+        WHERE 1=1
+    """, ('id', 'order_number', 'created_at', 'updated_at', 'seller_id', 'restaurant_name',
+          'customer_id', 'customer_name', 'delivery_agent_id', 'total_amount', 'delivery_charge',
+          'tax_amount', 'final_amount', 'payment_method', 'payment_status', 'order_status')),
+    'order_items': ("""
+        SELECT oi.id, oi.order_id, o.order_number, o.created_at as order_created_at, o.seller_id,
+               oi.food_item_id, fi.name as food_name, oi.quantity, oi.price, oi.discount_price
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        JOIN food_items fi ON oi.food_item_id = fi.id
+        WHERE 1=1
+    """, ('id', 'order_id', 'order_number', 'order_created_at', 'seller_id', 'food_item_id',
+          'food_name', 'quantity', 'price', 'discount_price')),
+    'tracking': ("""
+        SELECT ot.id, ot.order_id, o.order_number, o.seller_id, ot.status, ot.notes,
+               ot.location_latitude, ot.location_longitude, ot.created_at
+        FROM orders o
+        JOIN order_tracking ot ON ot.order_id = o.id
+        WHERE 1=1
+    """, ('id', 'order_id', 'order_number', 'seller_id', 'status', 'notes',
+          'location_latitude', 'location_longitude', 'created_at')),
+}
+
+def export_response(dataset, seller_id=None):
+    """
+    Stream an export as CSV or NDJSON: ?format=csv|ndjson, ?start / ?end
+    (inclusive YYYY-MM-DD dates of the order). Rows come from a server-side
+    cursor on a connection borrowed for the length of the download, so memory
+    stays flat however many rows match.
+    """
+    fmt = request.args.get('format', 'csv')
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Unknown export'}), 404
+    
+    query, columns = EXPORT_DATASETS[dataset]
+    params = []
+    
+    try:
+        if request.args.get('start'):
+            query += " AND o.created_at >= %s"
+            params.append(datetime.date.fromisoformat(request.args['start']))
+        if request.args.get('end'):
+            query += " AND o.created_at < %s"
+            params.append(datetime.date.fromisoformat(request.args['end']) + datetime.timedelta(days=1))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    if seller_id:
+        query += " AND o.seller_id = %s"
+        params.append(seller_id)
+    
+    query += " ORDER BY o.created_at, o.id"
+    
+    # The request's own connection is not needed while streaming
+    mysql.release_connection()
+    
+    def generate():
+        conn = mysql.pool.acquire()
+        rows = stream_rows(conn, query, params, app.config['EXPORT_FETCH_SIZE'])
+        finished = False
+        try:
+            yield from encode_rows(rows, columns, fmt)
+            finished = True
+        finally:
+            # A download cut short closes the connection mid-result; never pool it again
+            rows.close()
+            mysql.pool.release(conn, discard=not finished)
+    
+    filename = f"{dataset}_{datetime.date.today().isoformat()}.{fmt}"
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def refresh_menu_item_count(cur, seller_id):
+    """
+    Recount a seller's available menu items after a menu change
+    """
+    cur.execute("""
+        UPDATE sellers
+        SET menu_item_count = (
+            SELECT COUNT(*) FROM food_items WHERE seller_id = %s AND is_available = TRUE
+        )
+        WHERE id = %s
+    """, (seller_id, seller_id))
+
+def record_order_status_change(cur, order_id, old_status, new_status):
+    """
+    Move an order between the per-status counts of its seller's daily stats.
+    Callers read `old_status` with the order row locked (FOR UPDATE or a
+    conditional UPDATE) so concurrent changes cannot double count.
+    """
+    if old_status == new_status or old_status not in ORDER_STATUSES or new_status not in ORDER_STATUSES:
+        return
+    
+    cur.execute("""
+        UPDATE seller_daily_stats sds
+        JOIN orders o ON o.seller_id = sds.seller_id AND sds.stat_date = DATE(o.created_at)
+        SET sds.{old}_count = sds.{old}_count - 1,
+            sds.{new}_count = sds.{new}_count + 1
+        WHERE o.id = %s
+    """.format(old=old_status, new=new_status), (order_id,))
+    
+    bump_platform_counter(cur, f'orders_{old_status}', -1)
+    bump_platform_counter(cur, f'orders_{new_status}')
 
 # Routes
 @app.route('/')
@@ -129,6 +521,8 @@ def register():
                     VALUES (%s, %s, %s, %s)
                 """, (user_id, restaurant_name, restaurant_address, restaurant_phone))
             
+            record_new_user(cur, user_type)
+            
             mysql.connection.commit()
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('login'))
@@ -166,25 +560,18 @@ def customer_dashboard():
     
     # Get top restaurants
     cur.execute("""
-        SELECT s.*, AVG(r.rating) as avg_rating
+        SELECT s.*, s.rating as avg_rating
         FROM sellers s
-        LEFT JOIN reviews r ON s.id = r.seller_id
         WHERE s.is_verified = TRUE
-        GROUP BY s.id
-        ORDER BY avg_rating DESC LIMIT 6
+        ORDER BY s.rating DESC LIMIT 6
     """)
     restaurants = cur.fetchall()
     
-    # Get categories
-    cur.execute("SELECT * FROM categories WHERE is_active = TRUE")
-    categories = cur.fetchall()
-    
     cur.close()
     
     return render_template('customer/dashboard.html', 
                          recent_orders=recent_orders,
-                         restaurants=restaurants,
-                         categories=categories)
+                         restaurants=restaurants)
 
 @app.route('/customer/restaurants')
 @login_required
@@ -196,35 +583,50 @@ def customer_restaurants():
     cur = mysql.connection.cursor()
     
     query = """
-        SELECT s.*, AVG(r.rating) as avg_rating, COUNT(DISTINCT fi.id) as menu_items
+        SELECT s.*, s.rating as avg_rating, s.menu_item_count as menu_items
         FROM sellers s
-        LEFT JOIN reviews r ON s.id = r.seller_id
-        LEFT JOIN food_items fi ON s.id = fi.seller_id AND fi.is_available = TRUE
         WHERE s.is_verified = TRUE
     """
     params = []
     
+    matches = {}
     if search:
-        query += " AND (s.restaurant_name LIKE %s OR s.restaurant_address LIKE %s)"
-        params.extend([f'%{search}%', f'%{search}%'])
+        # Restaurants matching by name or address, or through one of their dishes
+        matches = search_restaurants(search)
+        if not matches:
+            cur.close()
+            return render_template('customer/restaurants.html',
+                                 restaurants=[],
+                                 search=search,
+                                 selected_category=category_id)
+        query += " AND s.id IN ({})".format(', '.join(['%s'] * len(matches)))
+        params.extend(matches)
     
     if category_id:
-        query += " AND fi.category_id = %s"
+        query += """ AND EXISTS (
+            SELECT 1 FROM food_items fi
+            WHERE fi.seller_id = s.id AND fi.is_available = TRUE AND fi.category_id = %s
+        )"""
         params.append(category_id)
     
-    query += " GROUP BY s.id ORDER BY avg_rating DESC"
+    query += " ORDER BY s.rating DESC"
     
-    cur.execute(query, params)
-    restaurants = cur.fetchall()
+    def load_restaurants():
+        cur.execute(query, params)
+        return cur.fetchall()
     
-    cur.execute("SELECT * FROM categories WHERE is_active = TRUE")
-    categories = cur.fetchall()
+    # Free-text searches are too varied to be worth caching
+    if search:
+        restaurants = sorted(load_restaurants(), key=lambda row: -matches[row['id']]['score'])
+        for restaurant in restaurants:
+            restaurant['matched_dishes'] = matches[restaurant['id']]['dishes']
+    else:
+        restaurants = cache.get_or_load('restaurants', f'category={category_id}', load_restaurants)
     
     cur.close()
     
     return render_template('customer/restaurants.html',
                          restaurants=restaurants,
-                         categories=categories,
                          search=search,
                          selected_category=category_id)
 
@@ -234,49 +636,51 @@ def customer_restaurants():
 def customer_menu(seller_id):
     category_id = request.args.get('category_id', '')
     vegetarian = request.args.get('vegetarian', '')
+    if vegetarian not in ('veg', 'nonveg'):
+        vegetarian = ''
     
     cur = mysql.connection.cursor()
     
-    # Get restaurant info
-    cur.execute("SELECT * FROM sellers WHERE id = %s", (seller_id,))
-    restaurant = cur.fetchone()
-    
-    # Get menu items
-    query = "SELECT * FROM food_items WHERE seller_id = %s AND is_available = TRUE"
-    params = [seller_id]
-    
-    if category_id:
-        query += " AND category_id = %s"
-        params.append(category_id)
-    
-    if vegetarian == 'veg':
-        query += " AND is_vegetarian = TRUE"
-    elif vegetarian == 'nonveg':
-        query += " AND is_vegetarian = FALSE"
-    
-    query += " ORDER BY name"
-    
-    cur.execute(query, params)
-    menu_items = cur.fetchall()
+    def load_menu():
+        # Get restaurant info
+        cur.execute("SELECT * FROM sellers WHERE id = %s", (seller_id,))
+        restaurant = cur.fetchone()
+        
+        # Get menu items
+        query = "SELECT * FROM food_items WHERE seller_id = %s AND is_available = TRUE"
+        params = [seller_id]
+        
+        if category_id:
+            query += " AND category_id = %s"
+            params.append(category_id)
+        
+        if vegetarian == 'veg':
+            query += " AND is_vegetarian = TRUE"
+        elif vegetarian == 'nonveg':
+            query += " AND is_vegetarian = FALSE"
+        
+        query += " ORDER BY name"
+        
+        cur.execute(query, params)
+        menu_items = cur.fetchall()
+        
+        # Get categories for this restaurant
+        cur.execute("""
+            SELECT DISTINCT c.* 
+            FROM categories c
+            JOIN food_items fi ON c.id = fi.category_id
+            WHERE fi.seller_id = %s AND fi.is_available = TRUE
+            ORDER BY c.name
+        """, (seller_id,))
+        categories = cur.fetchall()
+        
+        return {'restaurant': restaurant, 'menu_items': menu_items, 'categories': categories}
     
-    # Get categories for this restaurant
-    cur.execute("""
-        SELECT DISTINCT c.* 
-        FROM categories c
-        JOIN food_items fi ON c.id = fi.category_id
-        WHERE fi.seller_id = %s AND fi.is_available = TRUE
-        ORDER BY c.name
-    """, (seller_id,))
-    categories = cur.fetchall()
+    menu = cache.get_or_load(f'menu:{seller_id}', f'category={category_id}:veg={vegetarian}', load_menu)
+    restaurant, menu_items, categories = menu['restaurant'], menu['menu_items'], menu['categories']
     
-    # Get cart items
-    cur.execute("""
-        SELECT c.food_item_id, c.quantity, fi.name, fi.price
-        FROM cart c
-        JOIN food_items fi ON c.food_item_id = fi.id
-        WHERE c.customer_id = %s AND fi.seller_id = %s
-    """, (session['user_id'], seller_id))
-    cart_items = cur.fetchall()
+    # Cart lines from this restaurant
+    cart_items = [line for line in cart_lines(session['user_id']) if line['seller_id'] == seller_id]
     
     cur.close()
     
@@ -285,33 +689,126 @@ def customer_menu(seller_id):
                          menu_items=menu_items,
                          categories=categories,
                          cart_items=cart_items,
+                         cart_quantities={line['food_item_id']: line['quantity'] for line in cart_items},
                          selected_category=category_id,
                          selected_vegetarian=vegetarian)
 
+def food_item_details(item_ids):
+    """
+    {food_item_id: row} with the fields cart pages show, for the items that
+    still exist; cached in the 'food_items' namespace, which the menu and
+    restaurant writers invalidate
+    """
+    def load_items(missing):
+        cur = mysql.connection.cursor()
+        cur.execute("""
+            SELECT fi.id, fi.seller_id, fi.name, fi.price, fi.discount_price, fi.image,
+                   fi.is_vegetarian, fi.is_available, s.restaurant_name
+            FROM food_items fi
+            JOIN sellers s ON fi.seller_id = s.id
+            WHERE fi.id IN ({})
+        """.format(', '.join(['%s'] * len(missing))), missing)
+        rows = {row['id']: row for row in cur.fetchall()}
+        cur.close()
+        return rows
+    
+    return cache.get_many('food_items', item_ids, load_items) if item_ids else {}
+
+def cart_lines(customer_id):
+    """
+    The customer's cart as rows of food_item_id, quantity and the item's
+    details, ordered by restaurant. Served from the cart store and the
+    item cache; lines for dishes that have since been deleted are dropped.
+    """
+    items = cart_service.items(customer_id)
+    details = food_item_details(list(items))
+    
+    lines = []
+    for food_item_id, quantity in items.items():
+        item = details.get(food_item_id)
+        if item is None:
+            cart_service.set_quantity(customer_id, food_item_id, 0)
+            continue
+        lines.append(dict(item, food_item_id=food_item_id, quantity=quantity))
+    
+    lines.sort(key=lambda line: (line['restaurant_name'], line['food_item_id']))
+    return lines
+
+def flush_carts():
+    """
+    Write pending cart changes to the cart table, in one transaction; if
+    that fails, customer by customer, so one customer's bad line cannot
+    hold back everyone else's changes
+    """
+    customer_ids = cart_service.pending_customers()
+    if not customer_ids:
+        return
+    
+    try:
+        flush_cart_batch(customer_ids)
+    except Exception:
+        if len(customer_ids) == 1:
+            raise
+        app.logger.exception('Cart flush failed; retrying customer by customer')
+        for customer_id in sorted(customer_ids):
+            try:
+                flush_cart_batch([customer_id])
+            except Exception:
+                app.logger.exception('Cart flush failed for customer %s', customer_id)
+
+def flush_cart_batch(customer_ids):
+    with cart_service.locked(customer_ids):
+        with mysql.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                batch = cart_service.flush(cur, customer_ids)
+                conn.commit()
+            finally:
+                cur.close()
+        cart_service.confirm(batch)
+
+def run_cart_flusher(stop_event):
+    while not stop_event.wait(app.config['CART_FLUSH_SECONDS']):
+        try:
+            flush_carts()
+        except Exception:
+            # Changes stay pending; try again next round
+            app.logger.exception('Cart flush failed')
+
+_cart_flusher = None
+_cart_flusher_lock = threading.Lock()
+
+def start_cart_flusher():
+    """
+    Start the write-behind thread for cart changes, and flush whatever is
+    still pending when the process exits
+    """
+    global _cart_flusher
+    with _cart_flusher_lock:
+        if _cart_flusher is None or not _cart_flusher.is_alive():
+            if _cart_flusher is None:
+                atexit.register(flush_carts)
+            _cart_flusher = threading.Thread(target=run_cart_flusher, args=(threading.Event(),), daemon=True)
+            _cart_flusher.start()
+
 @app.route('/customer/add_to_cart', methods=['POST'])
 @login_required
 @role_required(['customer'])
 def add_to_cart():
-    food_item_id = request.form['food_item_id']
+    food_item_id = int(request.form['food_item_id'])
     quantity = int(request.form['quantity'])
     
-    cur = mysql.connection.cursor()
-    
-    # Check if item already in cart
-    cur.execute("SELECT * FROM cart WHERE customer_id = %s AND food_item_id = %s",
-                (session['user_id'], food_item_id))
-    existing_item = cur.fetchone()
+    if not 1 <= quantity <= app.config['CART_MAX_QUANTITY']:
+        flash(f"Quantity must be between 1 and {app.config['CART_MAX_QUANTITY']}", 'danger')
+        return redirect(request.referrer or url_for('customer_dashboard'))
     
-    if existing_item:
-        new_quantity = existing_item['quantity'] + quantity
-        cur.execute("UPDATE cart SET quantity = %s WHERE id = %s",
-                    (new_quantity, existing_item['id']))
-    else:
-        cur.execute("INSERT INTO cart (customer_id, food_item_id, quantity) VALUES (%s, %s, %s)",
-                    (session['user_id'], food_item_id, quantity))
+    item = food_item_details([food_item_id]).get(food_item_id)
+    if not item or not item['is_available']:
+        flash('This item is not available', 'danger')
+        return redirect(request.referrer or url_for('customer_dashboard'))
     
-    mysql.connection.commit()
-    cur.close()
+    cart_service.add(session['user_id'], food_item_id, quantity)
+    start_cart_flusher()
     
     flash('Item added to cart successfully', 'success')
     return redirect(request.referrer)
@@ -320,52 +817,24 @@ def add_to_cart():
 @login_required
 @role_required(['customer'])
 def view_cart():
-    cur = mysql.connection.cursor()
-    
-    cur.execute("""
-        SELECT c.*, fi.name, fi.price, fi.discount_price, fi.image, fi.is_vegetarian,
-               s.restaurant_name, s.id as seller_id
-        FROM cart c
-        JOIN food_items fi ON c.food_item_id = fi.id
-        JOIN sellers s ON fi.seller_id = s.id
-        WHERE c.customer_id = %s
-        ORDER BY s.restaurant_name
-    """, (session['user_id'],))
-    cart_items = cur.fetchall()
+    cart_items = cart_lines(session['user_id'])
+    sellers, totals = price_cart(cart_items)
     
     # Group by seller
     cart_by_seller = {}
-    total_amount = Decimal("0.00")
-
-    
     for item in cart_items:
-        seller_id = item['seller_id']
-        if seller_id not in cart_by_seller:
-            cart_by_seller[seller_id] = {
-                'restaurant_name': item['restaurant_name'],
-                'items': [],
-                'subtotal': 0
-            }
-        
-        price = item['discount_price'] if item['discount_price'] is not None else item['price']
-        item_total = Decimal(str(price)) * item['quantity']
-
-        delivery_charge = Decimal("30.00")
-        tax = total_amount * Decimal("0.05")   # 5% tax
-        grand_total = total_amount + delivery_charge + tax
-
-        cart_by_seller[seller_id]['items'].append(item)
-        cart_by_seller[seller_id]['subtotal'] += item_total
-        total_amount += item_total
-    
-    cur.close()
+        item['line_total'] = line_total(item)
+        seller_info = cart_by_seller.setdefault(item['seller_id'], dict(sellers[item['seller_id']], items=[]))
+        seller_info['items'].append(item)
     
     return render_template(
     'customer/cart.html',
     cart_by_seller=cart_by_seller,
-    total_amount=total_amount,
-    tax=tax,
-    grand_total=grand_total
+    total_amount=totals['subtotal'],
+    delivery_charge=totals['delivery_charge'],
+    tax=totals['tax'],
+    grand_total=totals['grand_total'],
+    checkout_key=uuid.uuid4().hex
 )
 
 
@@ -373,93 +842,407 @@ def view_cart():
 @login_required
 @role_required(['customer'])
 def update_cart():
-    cart_id = request.form['cart_id']
+    food_item_id = int(request.form['food_item_id'])
     quantity = int(request.form['quantity'])
     
-    cur = mysql.connection.cursor()
-    
-    if quantity > 0:
-        cur.execute("UPDATE cart SET quantity = %s WHERE id = %s AND customer_id = %s",
-                    (quantity, cart_id, session['user_id']))
-    else:
-        cur.execute("DELETE FROM cart WHERE id = %s AND customer_id = %s",
-                    (cart_id, session['user_id']))
+    if not 0 <= quantity <= app.config['CART_MAX_QUANTITY']:
+        flash(f"Quantity must be between 0 and {app.config['CART_MAX_QUANTITY']}", 'danger')
+        return redirect(url_for('view_cart'))
     
-    mysql.connection.commit()
-    cur.close()
+    cart_service.set_quantity(session['user_id'], food_item_id, quantity)
+    start_cart_flusher()
     
     flash('Cart updated successfully', 'success')
     return redirect(url_for('view_cart'))
 
-@app.route('/customer/checkout', methods=['POST'])
+CART_BATCH_MAX_CHANGES = 100
+
+def parse_cart_change(change):
+    """
+    A cart change from a request, {'food_item_id': id} plus either
+    'quantity' (set) or 'add' (increment), as (food_item_id, mode, amount);
+    raises ValueError when it is malformed or the amount is out of range
+    """
+    food_item_id = int(change['food_item_id'])
+    max_quantity = app.config['CART_MAX_QUANTITY']
+    if 'add' in change:
+        amount = int(change['add'])
+        if not -max_quantity <= amount <= max_quantity:
+            raise ValueError(amount)
+        return food_item_id, 'add', amount
+    amount = int(change['quantity'])
+    if not 0 <= amount <= max_quantity:
+        raise ValueError(amount)
+    return food_item_id, 'set', amount
+
+def apply_cart_changes(customer_id, changes):
+    """
+    Validate and apply parsed cart changes. Items can only be added while
+    they are available; reducing or removing always works. Returns an error
+    message, or None once every change has been applied.
+    """
+    details = food_item_details([food_item_id for food_item_id, _, _ in changes])
+    current = cart_service.items(customer_id)
+    
+    for food_item_id, mode, amount in changes:
+        item = details.get(food_item_id)
+        grows = amount > 0 if mode == 'add' else amount > current.get(food_item_id, 0)
+        if grows and (item is None or not item['is_available']):
+            return f'Item {food_item_id} is not available'
+        if amount < 0 and mode == 'set':
+            return 'Quantity cannot be negative'
+    
+    for food_item_id, mode, amount in changes:
+        if mode == 'add':
+            cart_service.add(customer_id, food_item_id, amount)
+        else:
+            cart_service.set_quantity(customer_id, food_item_id, amount)
+    start_cart_flusher()
+    return None
+
+def cart_response(customer_id, food_item_ids):
+    """
+    JSON for the cart after a change: the changed lines (quantity 0 once
+    removed), the totals of the sellers they belong to and the cart totals
+    """
+    lines = cart_lines(customer_id)
+    sellers, totals = price_cart(lines)
+    by_item = {line['food_item_id']: line for line in lines}
+    details = food_item_details(food_item_ids)
+    
+    changed = []
+    seller_ids = set()
+    for food_item_id in dict.fromkeys(food_item_ids):
+        line = by_item.get(food_item_id)
+        item = line or details.get(food_item_id)
+        if item is None:
+            changed.append({'food_item_id': food_item_id, 'quantity': 0})
+            continue
+        quantity = line['quantity'] if line else 0
+        changed.append({
+            'food_item_id': food_item_id,
+            'seller_id': item['seller_id'],
+            'name': item['name'],
+            'quantity': quantity,
+            'unit_price': unit_price(item),
+            'line_total': line_total(dict(item, quantity=quantity))
+        })
+        seller_ids.add(item['seller_id'])
+    
+    return jsonify({
+        'success': True,
+        'lines': changed,
+        # A seller whose last line was removed maps to null
+        'sellers': {str(seller_id): sellers.get(seller_id) for seller_id in seller_ids},
+        'cart': totals
+    })
+
+def cart_request_data():
+    return request.get_json(silent=True) or request.form
+
+@app.route('/customer/api/cart')
 @login_required
 @role_required(['customer'])
-def checkout():
-    delivery_address = request.form['delivery_address']
-    payment_method = request.form['payment_method']
-    special_instructions = request.form.get('special_instructions', '')
+def api_cart():
+    """
+    The whole cart: lines, per-seller totals and cart totals
+    """
+    lines = cart_lines(session['user_id'])
+    sellers, totals = price_cart(lines)
+    return jsonify({
+        'lines': [{
+            'food_item_id': line['food_item_id'],
+            'seller_id': line['seller_id'],
+            'name': line['name'],
+            'quantity': line['quantity'],
+            'unit_price': unit_price(line),
+            'line_total': line_total(line)
+        } for line in lines],
+        'sellers': {str(seller_id): seller for seller_id, seller in sellers.items()},
+        'cart': totals
+    })
+
+@app.route('/customer/api/cart/add', methods=['POST'])
+@login_required
+@role_required(['customer'])
+def api_cart_add():
+    """
+    Add to an item's quantity: food_item_id, quantity (default 1)
+    """
+    data = cart_request_data()
+    try:
+        change = parse_cart_change({'food_item_id': data['food_item_id'], 'add': data.get('quantity', 1)})
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid item or quantity'}), 400
+    
+    error = apply_cart_changes(session['user_id'], [change])
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    return cart_response(session['user_id'], [change[0]])
+
+@app.route('/customer/api/cart/update', methods=['POST'])
+@login_required
+@role_required(['customer'])
+def api_cart_update():
+    """
+    Set an item's quantity: food_item_id, quantity (0 removes it)
+    """
+    data = cart_request_data()
+    try:
+        change = parse_cart_change({'food_item_id': data['food_item_id'], 'quantity': data['quantity']})
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid item or quantity'}), 400
+    
+    error = apply_cart_changes(session['user_id'], [change])
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    return cart_response(session['user_id'], [change[0]])
+
+@app.route('/customer/api/cart/batch', methods=['POST'])
+@login_required
+@role_required(['customer'])
+def api_cart_batch():
+    """
+    Apply several changes in one request, in order:
+    {"changes": [{"food_item_id": 3, "quantity": 2}, {"food_item_id": 5, "add": 1}, ...]}
+    Either every change is applied or, if one is invalid, none is.
+    """
+    data = request.get_json(silent=True) or {}
+    raw_changes = data.get('changes')
+    if not isinstance(raw_changes, list) or not raw_changes:
+        return jsonify({'success': False, 'message': 'No changes given'}), 400
+    if len(raw_changes) > CART_BATCH_MAX_CHANGES:
+        return jsonify({'success': False,
+                        'message': f'At most {CART_BATCH_MAX_CHANGES} changes per request'}), 400
+    
+    try:
+        changes = [parse_cart_change(change) for change in raw_changes]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid item or quantity'}), 400
+    
+    error = apply_cart_changes(session['user_id'], changes)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    return cart_response(session['user_id'], [food_item_id for food_item_id, _, _ in changes])
+
+@app.route('/customer/api/pricing/quote', methods=['POST'])
+@login_required
+@role_required(['customer'])
+def api_pricing_quote():
+    """
+    Price a cart without changing it, at current menu prices:
+    {"items": [{"food_item_id": 3, "quantity": 2}, ...]}
+    Items that no longer exist or are unavailable are listed, not priced.
+    """
+    data = request.get_json(silent=True) or {}
+    raw_items = data.get('items')
+    if not isinstance(raw_items, list) or len(raw_items) > CART_BATCH_MAX_CHANGES:
+        return jsonify({'success': False,
+                        'message': f'Send up to {CART_BATCH_MAX_CHANGES} items'}), 400
+    
+    quantities = {}
+    try:
+        for raw_item in raw_items:
+            food_item_id, quantity = int(raw_item['food_item_id']), int(raw_item['quantity'])
+            if not 0 <= quantity <= app.config['CART_MAX_QUANTITY']:
+                raise ValueError(quantity)
+            quantities[food_item_id] = quantities.get(food_item_id, 0) + quantity
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid item or quantity'}), 400
+    
+    details = food_item_details(list(quantities))
+    lines, unavailable = [], []
+    for food_item_id, quantity in quantities.items():
+        item = details.get(food_item_id)
+        if item is None or not item['is_available']:
+            unavailable.append(food_item_id)
+        elif quantity:
+            lines.append(dict(item, food_item_id=food_item_id, quantity=quantity))
+    
+    sellers, totals = price_cart(lines)
+    return jsonify({
+        'success': True,
+        'lines': [{
+            'food_item_id': line['food_item_id'],
+            'seller_id': line['seller_id'],
+            'quantity': line['quantity'],
+            'unit_price': unit_price(line),
+            'line_total': line_total(line)
+        } for line in lines],
+        'sellers': {str(seller_id): seller for seller_id, seller in sellers.items()},
+        'cart': totals,
+        'unavailable': unavailable
+    })
+
+def load_checkout(cur, customer_id, idempotency_key):
+    """
+    The orders created by an earlier checkout with this key, or None if the
+    key is new. Claiming the key waits for a concurrent checkout holding it,
+    so a retried POST sees that checkout's orders once it commits.
+    """
+    cur.execute("""
+        INSERT IGNORE INTO checkout_requests (customer_id, idempotency_key)
+        VALUES (%s, %s)
+    """, (customer_id, idempotency_key))
+    if cur.rowcount:
+        return None
     
-    cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT order_ids FROM checkout_requests
+        WHERE customer_id = %s AND idempotency_key = %s
+        LOCK IN SHARE MODE
+    """, (customer_id, idempotency_key))
+    row = cur.fetchone()
+    order_ids = [int(order_id) for order_id in (row['order_ids'] or '').split(',') if order_id]
+    if not order_ids:
+        return []
+    
+    cur.execute("""
+        SELECT id, order_number, seller_id, final_amount FROM orders
+        WHERE id IN ({}) ORDER BY id
+    """.format(', '.join(['%s'] * len(order_ids))), order_ids)
+    return list(cur.fetchall())
+
+def place_orders(cur, customer_id, delivery_address, payment_method,
+                 special_instructions='', idempotency_key=None):
+    """
+    Turn the customer's cart into one order per seller. The statement count
+    does not grow with the number of sellers: orders, their first tracking
+    entries and their items are each written with one multi-row INSERT.
+    Returns (orders, replayed); replayed is True when `idempotency_key` was
+    already used and the orders are the ones that checkout created. The
+    caller commits, or rolls back when no orders were placed.
+    """
+    if idempotency_key:
+        orders = load_checkout(cur, customer_id, idempotency_key)
+        if orders is not None:
+            return orders, True
+    
+    # Lock the cart rows: an item added mid-checkout is neither ordered nor lost,
+    # and a second checkout of the same cart waits and then finds it empty
+    cur.execute("SELECT id FROM cart WHERE customer_id = %s FOR UPDATE", (customer_id,))
+    cart_ids = [row['id'] for row in cur.fetchall()]
+    if not cart_ids:
+        return [], False
     
-    # Get cart items grouped by seller
     cur.execute("""
-        SELECT fi.seller_id, SUM(c.quantity) as total_items,
-               SUM((fi.discount_price OR fi.price) * c.quantity) as subtotal
+        SELECT c.food_item_id, c.quantity, fi.seller_id, fi.price, fi.discount_price
         FROM cart c
         JOIN food_items fi ON c.food_item_id = fi.id
-        WHERE c.customer_id = %s
-        GROUP BY fi.seller_id
-    """, (session['user_id'],))
-    seller_groups = cur.fetchall()
+        WHERE c.id IN ({})
+        ORDER BY fi.seller_id, c.id
+    """.format(', '.join(['%s'] * len(cart_ids))), cart_ids)
+    lines = cur.fetchall()
+    sellers, _ = price_cart(lines)
+    
+    numbers = order_numbers.take(cur, len(sellers))
+    order_rows = []
+    for order_number, seller in zip(numbers, sellers.values()):
+        order_rows.append((order_number, customer_id, seller['seller_id'], seller['subtotal'],
+                           seller['delivery_charge'], seller['tax'], seller['total'], delivery_address,
+                           payment_method, special_instructions))
+    
+    # executemany sends INSERT ... VALUES as a single multi-row statement
+    cur.executemany("""
+        INSERT INTO orders (order_number, customer_id, seller_id, total_amount,
+                          delivery_charge, tax_amount, final_amount, delivery_address,
+                          payment_method, special_instructions)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, order_rows)
     
-    for group in seller_groups:
-        seller_id = group['seller_id']
-        subtotal = group['subtotal'] or Decimal("0.00")
-        
-        # Calculate delivery charge (example: ₹30 per order)
-        delivery_charge = Decimal("30.00")
-        tax_amount = subtotal * Decimal("0.05")
-        final_amount = subtotal + delivery_charge + tax_amount
-        
-        # Create order
-        order_number = generate_order_number()
-        cur.execute("""
-            INSERT INTO orders (order_number, customer_id, seller_id, total_amount,
-                              delivery_charge, tax_amount, final_amount, delivery_address,
-                              payment_method, special_instructions)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (order_number, session['user_id'], seller_id, subtotal,
-              delivery_charge, tax_amount, final_amount, delivery_address,
-              payment_method, special_instructions))
-        
-        order_id = cur.lastrowid
-        
-        # Add order tracking
-        cur.execute("""
-            INSERT INTO order_tracking (order_id, status, notes)
-            VALUES (%s, 'pending', 'Order placed successfully')
-        """, (order_id,))
-        
-        # Move cart items to order items
-        cur.execute("""
-            INSERT INTO order_items (order_id, food_item_id, quantity, price, discount_price)
-            SELECT %s, c.food_item_id, c.quantity, fi.price, fi.discount_price
-            FROM cart c
-            JOIN food_items fi ON c.food_item_id = fi.id
-            WHERE c.customer_id = %s AND fi.seller_id = %s
-        """, (order_id, session['user_id'], seller_id))
-        
-        # Clear cart for this seller
-        cur.execute("""
-            DELETE c FROM cart c
-            JOIN food_items fi ON c.food_item_id = fi.id
-            WHERE c.customer_id = %s AND fi.seller_id = %s
-        """, (session['user_id'], seller_id))
+    # Auto-increment ids of a multi-row insert are not guaranteed to be
+    # consecutive, so look them up by the order numbers we chose
+    cur.execute("""
+        SELECT id, order_number, seller_id, final_amount FROM orders
+        WHERE order_number IN ({})
+        ORDER BY id
+    """.format(', '.join(['%s'] * len(numbers))), numbers)
+    orders = list(cur.fetchall())
+    order_ids = [order['id'] for order in orders]
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    
+    cur.executemany("""
+        INSERT INTO order_tracking (order_id, status, notes)
+        VALUES (%s, 'pending', 'Order placed successfully')
+    """, [(order_id,) for order_id in order_ids])
+    # New orders have no latest status yet, so this is what add_order_tracking would write
+    cur.execute("""
+        INSERT INTO order_latest_status (order_id, tracking_id, status)
+        SELECT order_id, MAX(id), 'pending'
+        FROM order_tracking
+        WHERE order_id IN ({})
+        GROUP BY order_id
+    """.format(placeholders), order_ids)
+    
+    order_for_seller = {order['seller_id']: order['id'] for order in orders}
+    cur.executemany("""
+        INSERT INTO order_items (order_id, food_item_id, quantity, price, discount_price)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(order_for_seller[line['seller_id']], line['food_item_id'], line['quantity'],
+           line['price'], line['discount_price']) for line in lines])
     
-    mysql.connection.commit()
+    cur.execute("""
+        DELETE FROM cart WHERE id IN ({})
+    """.format(', '.join(['%s'] * len(cart_ids))), cart_ids)
+    
+    for order in orders:
+        record_new_order(cur, order['id'], order['seller_id'], order['final_amount'])
+    
+    if idempotency_key:
+        cur.execute("""
+            UPDATE checkout_requests SET order_ids = %s
+            WHERE customer_id = %s AND idempotency_key = %s
+        """, (','.join(str(order_id) for order_id in order_ids), customer_id, idempotency_key))
+    
+    return orders, False
+
+@app.route('/customer/checkout', methods=['POST'])
+@login_required
+@role_required(['customer'])
+def checkout():
+    delivery_address = request.form['delivery_address']
+    payment_method = request.form['payment_method']
+    special_instructions = request.form.get('special_instructions', '')
+    # The cart page puts a fresh key in the form; API clients send the header
+    idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or None
+    
+    if idempotency_key and len(idempotency_key) > 64:
+        return jsonify({'success': False, 'message': 'Idempotency key is too long'}), 400
+    
+    cur = mysql.connection.cursor()
+    with cart_service.locked([session['user_id']]):
+        # The cart table must hold every change the customer made before it is read
+        flushed, stored = cart_service.sync(cur, session['user_id'])
+        orders, replayed = place_orders(cur, session['user_id'], delivery_address, payment_method,
+                                        special_instructions, idempotency_key)
+        
+        if orders and not replayed:
+            # Drop the stored cart while the customer's rows are still locked, so
+            # no worker's flush can write an ordered line back after the commit
+            cart_service.forget(session['user_id'])
+            try:
+                mysql.connection.commit()
+            except Exception:
+                cart_service.restore(session['user_id'], stored)
+                raise
+            cart_service.confirm(flushed)
+        else:
+            mysql.connection.rollback()
     cur.close()
     
-    flash('Order placed successfully!', 'success')
+    if wants_json() or request.headers.get('Idempotency-Key'):
+        if not orders:
+            return jsonify({'success': False, 'message': 'Your cart is empty'}), 400
+        return jsonify({'success': True, 'replayed': replayed, 'orders': orders})
+    
+    if not orders:
+        flash('Your cart is empty', 'warning')
+        return redirect(url_for('view_cart'))
+    
+    if replayed:
+        flash('This order was already placed', 'info')
+    else:
+        flash('Order placed successfully!', 'success')
     return redirect(url_for('customer_orders'))
 
 @app.route('/customer/orders')
@@ -474,12 +1257,11 @@ def customer_orders():
     query = """
         SELECT o.*, s.restaurant_name, 
                u.full_name as delivery_agent_name,
-               (SELECT status FROM order_tracking 
-                WHERE order_id = o.id 
-                ORDER BY created_at DESC LIMIT 1) as current_status
+               ols.status as current_status
         FROM orders o
         JOIN sellers s ON o.seller_id = s.id
         LEFT JOIN users u ON o.delivery_agent_id = u.id
+        LEFT JOIN order_latest_status ols ON ols.order_id = o.id
         WHERE o.customer_id = %s
     """
     params = [session['user_id']]
@@ -488,18 +1270,19 @@ def customer_orders():
         query += " AND o.order_status = %s"
         params.append(status_filter)
     
-    query += " ORDER BY o.created_at DESC"
-    
-    cur.execute(query, params)
-    orders = cur.fetchall()
+    limit, after = page_args()
+    orders, next_cursor = fetch_page(cur, query, params, limit, after)
     
-
     cur.close()
     
+    if wants_json():
+        return jsonify({'orders': orders, 'next_cursor': next_cursor})
+    
     return render_template(
         'customer/orders.html',
         orders=orders,
-        status_filter=status_filter
+        status_filter=status_filter,
+        next_cursor=next_cursor
     )
 
 @app.route('/customer/order/<int:order_id>')
@@ -562,22 +1345,21 @@ def seller_dashboard():
     today = datetime.date.today()
     cur.execute("""
         SELECT 
-            COUNT(*) as total_orders,
-            SUM(final_amount) as total_revenue,
-            AVG(final_amount) as avg_order_value
-        FROM orders 
-        WHERE seller_id = %s AND DATE(created_at) = %s
+            order_count as total_orders,
+            revenue as total_revenue,
+            revenue / NULLIF(order_count, 0) as avg_order_value
+        FROM seller_daily_stats 
+        WHERE seller_id = %s AND stat_date = %s
     """, (seller['id'], today))
-    today_stats = cur.fetchone()
+    today_stats = cur.fetchone() or {}
     
     # Get recent orders
     cur.execute("""
         SELECT o.*, u.full_name as customer_name,
-               (SELECT status FROM order_tracking 
-                WHERE order_id = o.id 
-                ORDER BY created_at DESC LIMIT 1) as current_status
+               ols.status as current_status
         FROM orders o
         JOIN users u ON o.customer_id = u.id
+        LEFT JOIN order_latest_status ols ON ols.order_id = o.id
         WHERE o.seller_id = %s
         ORDER BY o.created_at DESC
         LIMIT 10
@@ -618,11 +1400,10 @@ def seller_orders():
     
     query = """
         SELECT o.*, u.full_name as customer_name, u.phone as customer_phone,
-               (SELECT status FROM order_tracking 
-                WHERE order_id = o.id 
-                ORDER BY created_at DESC LIMIT 1) as current_status
+               ols.status as current_status
         FROM orders o
         JOIN users u ON o.customer_id = u.id
+        LEFT JOIN order_latest_status ols ON ols.order_id = o.id
         WHERE o.seller_id = %s
     """
     params = [seller['id']]
@@ -631,17 +1412,30 @@ def seller_orders():
         query += " AND o.order_status = %s"
         params.append(status_filter)
     
-    query += " ORDER BY o.created_at DESC"
-    
-    cur.execute(query, params)
-    orders = cur.fetchall()
+    limit, after = page_args()
+    orders, next_cursor = fetch_page(cur, query, params, limit, after)
     
     cur.close()
     
+    if wants_json():
+        return jsonify({'orders': orders, 'next_cursor': next_cursor})
+    
     return render_template('seller/orders.html',
                          orders=orders,
                          status_filter=status_filter,
-                         seller=seller)
+                         seller=seller,
+                         next_cursor=next_cursor)
+
+@app.route('/seller/export/<dataset>')
+@login_required
+@role_required(['seller'])
+def seller_export(dataset):
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT id FROM sellers WHERE user_id = %s", (session['user_id'],))
+    seller = cur.fetchone()
+    cur.close()
+    
+    return export_response(dataset, seller_id=seller['id'])
 @app.route('/seller/mark_order_ready', methods=['POST'])
 @login_required
 @role_required(['seller'])
@@ -650,8 +1444,8 @@ def mark_order_ready():
     
     cur = mysql.connection.cursor()
     
-    # Verify seller owns this order
-    cur.execute("SELECT seller_id FROM orders WHERE id = %s", (order_id,))
+    # Verify seller owns this order (locked until commit for the stats update)
+    cur.execute("SELECT seller_id, order_status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
     order = cur.fetchone()
     
     cur.execute("SELECT id FROM sellers WHERE user_id = %s", (session['user_id'],))
@@ -667,16 +1461,23 @@ def mark_order_ready():
         SET order_status = 'ready' 
         WHERE id = %s
     """, (order_id,))
+    record_order_status_change(cur, order_id, order['order_status'], 'ready')
     
     # Add tracking entry
-    cur.execute("""
-        INSERT INTO order_tracking (order_id, status, notes)
-        VALUES (%s, 'ready', 'Order is ready for pickup')
-    """, (order_id,))
+    add_order_tracking(cur, order_id, 'ready', 'Order is ready for pickup')
+    
+    # Queued mode: a background worker assigns the agent
+    queued = app.config['AUTO_ASSIGN_MODE'] == 'queue'
+    if queued:
+        enqueue_assignment(cur, order_id)
     
     mysql.connection.commit()
     cur.close()
     
+    if queued:
+        flash('Order marked as ready. A delivery agent will be assigned shortly.', 'success')
+        return redirect(request.referrer)
+    
     # Try to auto-assign delivery agent
     success, message = auto_assign_delivery_agent(order_id)
     
@@ -760,30 +1561,34 @@ def update_order_status():
     
     cur = mysql.connection.cursor()
     
-    # Verify seller owns this order
-    cur.execute("SELECT seller_id FROM orders WHERE id = %s", (order_id,))
+    # Verify seller owns this order (locked until commit for the stats update)
+    cur.execute("SELECT seller_id, order_status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
     order = cur.fetchone()
     
     cur.execute("SELECT id FROM sellers WHERE user_id = %s", (session['user_id'],))
     seller = cur.fetchone()
     
     if order['seller_id'] != seller['id']:
+        if wants_json():
+            return jsonify({'success': False, 'message': 'Unauthorized action'}), 403
         flash('Unauthorized action', 'danger')
         return redirect(url_for('seller_orders'))
     
     # Update order status
     cur.execute("UPDATE orders SET order_status = %s WHERE id = %s",
                 (status, order_id))
+    record_order_status_change(cur, order_id, order['order_status'], status)
     
     # Add tracking entry
-    cur.execute("""
-        INSERT INTO order_tracking (order_id, status, notes)
-        VALUES (%s, %s, %s)
-    """, (order_id, status, notes))
+    add_order_tracking(cur, order_id, status, notes)
     
     mysql.connection.commit()
     cur.close()
     
+    # The orders page updates itself from the order event instead of reloading
+    if wants_json():
+        return jsonify({'success': True, 'status': status})
+    
     flash('Order status updated successfully', 'success')
     return redirect(request.referrer)
 
@@ -795,40 +1600,34 @@ def assign_delivery_agent():
     delivery_agent_id = request.form['delivery_agent_id']
     
     cur = mysql.connection.cursor()
+    try:
+        # Verify seller owns this order
+        cur.execute("SELECT seller_id FROM orders WHERE id = %s", (order_id,))
+        order = cur.fetchone()
+        
+        cur.execute("SELECT id FROM sellers WHERE user_id = %s", (session['user_id'],))
+        seller = cur.fetchone()
+        
+        if not order or order['seller_id'] != seller['id']:
+            flash('Unauthorized action', 'danger')
+            return redirect(url_for('seller_orders'))
+        
+        # Claim the order for the agent; fails if either was taken meanwhile
+        error = claim_order(cur, order_id, delivery_agent_id, status='ready')
+        
+        if error:
+            mysql.connection.rollback()
+            flash(error, 'danger')
+            return redirect(request.referrer)
+        
+        # Add tracking entry
+        add_order_tracking(cur, order_id, 'ready', 'Order ready for pickup. Delivery agent assigned.')
+        
+        mysql.connection.commit()
+    finally:
+        cur.close()
     
-    # Verify seller owns this order
-    cur.execute("SELECT seller_id FROM orders WHERE id = %s", (order_id,))
-    order = cur.fetchone()
-    
-    cur.execute("SELECT id FROM sellers WHERE user_id = %s", (session['user_id'],))
-    seller = cur.fetchone()
-    
-    if order['seller_id'] != seller['id']:
-        flash('Unauthorized action', 'danger')
-        return redirect(url_for('seller_orders'))
-    
-    # Update order with delivery agent
-    cur.execute("""
-        UPDATE orders 
-        SET delivery_agent_id = %s, order_status = 'ready'
-        WHERE id = %s
-    """, (delivery_agent_id, order_id))
-    
-    # Update delivery agent availability
-    cur.execute("""
-        UPDATE delivery_agent_availability 
-        SET is_available = FALSE 
-        WHERE delivery_agent_id = %s
-    """, (delivery_agent_id,))
-    
-    # Add tracking entry
-    cur.execute("""
-        INSERT INTO order_tracking (order_id, status, notes)
-        VALUES (%s, 'ready', 'Order ready for pickup. Delivery agent assigned.')
-    """, (order_id,))
-    
-    mysql.connection.commit()
-    cur.close()
+    agent_index.set_available(int(delivery_agent_id), False)
     
     flash('Delivery agent assigned successfully', 'success')
     return redirect(request.referrer)
@@ -858,23 +1657,21 @@ def seller_menu():
     
     # Get menu items
     cur.execute("""
-        SELECT fi.*, c.name as category_name
+        SELECT fi.*
         FROM food_items fi
-        LEFT JOIN categories c ON fi.category_id = c.id
         WHERE fi.seller_id = %s
         ORDER BY fi.is_available DESC, fi.name
     """, (seller['id'],))
     menu_items = cur.fetchall()
     
-    # Get categories
-    cur.execute("SELECT * FROM categories WHERE is_active = TRUE")
-    categories = cur.fetchall()
-    
     cur.close()
     
+    refresh_categories()
+    for item in menu_items:
+        item['category_name'] = category_registry.name(item['category_id'])
+    
     return render_template('seller/menu.html',
                          menu_items=menu_items,
-                         categories=categories,
                          seller=seller)
 
 @app.route('/seller/add_menu_item', methods=['POST'])
@@ -909,10 +1706,14 @@ def add_menu_item():
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """, (seller['id'], category_id, name, description, price, discount_price,
           image_path, is_vegetarian, spice_level, preparation_time))
+    log_search_change(cur, 'item', cur.lastrowid)
+    refresh_menu_item_count(cur, seller['id'])
     
     mysql.connection.commit()
     cur.close()
     
+    cache.invalidate(f'menu:{seller["id"]}', 'restaurants')
+    
     flash('Menu item added successfully', 'success')
     return redirect(url_for('seller_menu'))
 
@@ -968,10 +1769,14 @@ def update_menu_item():
     params.append(item_id)
     
     cur.execute(update_query, params)
+    log_search_change(cur, 'item', int(item_id))
+    refresh_menu_item_count(cur, seller['id'])
     
     mysql.connection.commit()
     cur.close()
     
+    cache.invalidate(f'menu:{seller["id"]}', 'restaurants', 'food_items')
+    
     flash('Menu item updated successfully', 'success')
     return redirect(url_for('seller_menu'))
 
@@ -999,17 +1804,19 @@ def seller_analytics():
     else:  # year
         start_date = end_date - datetime.timedelta(days=365)
     
-    # Get sales data
+    # Get sales data (one rollup row per day)
     cur.execute("""
-        SELECT DATE(created_at) as date, 
-               COUNT(*) as order_count,
-               SUM(final_amount) as total_revenue,
-               AVG(final_amount) as avg_order_value
-        FROM orders
-        WHERE seller_id = %s AND created_at >= %s AND created_at <= %s
-        GROUP BY DATE(created_at)
-        ORDER BY date
-    """, (seller['id'], start_date, end_date))
+        SELECT stat_date as date, 
+               order_count,
+               revenue as total_revenue,
+               revenue / NULLIF(order_count, 0) as avg_order_value,
+               {status_counts}
+        FROM seller_daily_stats
+        WHERE seller_id = %s AND stat_date >= %s AND stat_date <= %s
+        AND order_count > 0
+        ORDER BY stat_date
+    """.format(status_counts=', '.join(f'{status}_count' for status in ORDER_STATUSES)),
+        (seller['id'], start_date, end_date))
     sales_data = cur.fetchall()
     
     # Get top selling items
@@ -1019,21 +1826,19 @@ def seller_analytics():
         FROM order_items oi
         JOIN food_items fi ON oi.food_item_id = fi.id
         JOIN orders o ON oi.order_id = o.id
-        WHERE o.seller_id = %s AND o.created_at >= %s AND o.created_at <= %s
+        WHERE o.seller_id = %s AND o.created_at >= %s AND o.created_at < %s
         GROUP BY fi.id
         ORDER BY total_quantity DESC
         LIMIT 10
-    """, (seller['id'], start_date, end_date))
+    """, (seller['id'], start_date, end_date + datetime.timedelta(days=1)))
     top_items = cur.fetchall()
     
-    # Get order status distribution
-    cur.execute("""
-        SELECT order_status, COUNT(*) as count
-        FROM orders
-        WHERE seller_id = %s AND created_at >= %s AND created_at <= %s
-        GROUP BY order_status
-    """, (seller['id'], start_date, end_date))
-    status_distribution = cur.fetchall()
+    # Get order status distribution from the daily status counts
+    status_distribution = []
+    for status in ORDER_STATUSES:
+        count = sum(day[f'{status}_count'] for day in sales_data)
+        if count:
+            status_distribution.append({'order_status': status, 'count': count})
     
     cur.close()
     
@@ -1056,12 +1861,11 @@ def delivery_dashboard():
     cur.execute("""
         SELECT o.*, s.restaurant_name, s.restaurant_address,
                u.full_name as customer_name, u.address as customer_address,
-               (SELECT status FROM order_tracking 
-                WHERE order_id = o.id 
-                ORDER BY created_at DESC LIMIT 1) as current_status
+               ols.status as current_status
         FROM orders o
         JOIN sellers s ON o.seller_id = s.id
         JOIN users u ON o.customer_id = u.id
+        LEFT JOIN order_latest_status ols ON ols.order_id = o.id
         WHERE o.delivery_agent_id = %s 
         AND o.order_status NOT IN ('delivered', 'cancelled')
         ORDER BY o.created_at DESC
@@ -1077,9 +1881,9 @@ def delivery_dashboard():
             AVG(TIMESTAMPDIFF(MINUTE, created_at, updated_at)) as avg_delivery_time
         FROM orders 
         WHERE delivery_agent_id = %s 
-        AND DATE(created_at) = %s
         AND order_status = 'delivered'
-    """, (session['user_id'], today))
+        AND created_at >= %s AND created_at < %s
+    """, (session['user_id'], today, today + datetime.timedelta(days=1)))
     today_stats = cur.fetchone()
     
     # Update availability
@@ -1096,6 +1900,33 @@ def delivery_dashboard():
                          active_orders=active_orders,
                          today_stats=today_stats)
 
+def ingest_locations(agent_id, points):
+    """
+    Take a batch of (latitude, longitude, reported_at) points from an agent:
+    the newest becomes the agent's position in memory and in the location
+    index at once, and reaches MySQL with the next location flush. Returns
+    the position kept, or None if the batch was older than it.
+    """
+    position = agent_locations.record(agent_id, points)
+    if position is not None:
+        agent_index.update(agent_id, position[0], position[1])
+    start_location_flusher()
+    return position
+
+def parse_location_point(raw, now):
+    """
+    (latitude, longitude, reported_at) from a posted point; `timestamp` is
+    optional epoch seconds, clamped to now so a fast clock cannot pin the
+    position. Raises ValueError.
+    """
+    latitude, longitude = float(raw['latitude']), float(raw['longitude'])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError((latitude, longitude))
+    reported_at = min(float(raw.get('timestamp') or now), now)
+    if now - reported_at > app.config['LOCATION_MAX_AGE_SECONDS']:
+        raise ValueError(reported_at)
+    return latitude, longitude, reported_at
+
 @app.route('/delivery/update_location', methods=['POST'])
 @login_required
 @role_required(['delivery'])
@@ -1106,113 +1937,203 @@ def update_delivery_location():
     if not latitude or not longitude:
         return jsonify({'success': False, 'message': 'Invalid coordinates'})
     
-    cur = mysql.connection.cursor()
-    
-    # Update user coordinates
-    cur.execute("""
-        UPDATE users 
-        SET latitude = %s, longitude = %s 
-        WHERE id = %s
-    """, (latitude, longitude, session['user_id']))
-    
-    # Update availability table
-    cur.execute("""
-        INSERT INTO delivery_agent_availability 
-        (delivery_agent_id, current_latitude, current_longitude, is_available, last_active)
-        VALUES (%s, %s, %s, TRUE, CURRENT_TIMESTAMP)
-        ON DUPLICATE KEY UPDATE 
-        current_latitude = VALUES(current_latitude),
-        current_longitude = VALUES(current_longitude),
-        last_active = VALUES(last_active)
-    """, (session['user_id'], latitude, longitude))
+    try:
+        point = parse_location_point({'latitude': latitude, 'longitude': longitude}, time.time())
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid coordinates'})
     
-    mysql.connection.commit()
-    cur.close()
+    ingest_locations(session['user_id'], [point])
     
     return jsonify({'success': True, 'message': 'Location updated'})
 
-@app.route('/delivery/api/available_orders')
+@app.route('/delivery/api/locations', methods=['POST'])
 @login_required
 @role_required(['delivery'])
-def get_available_orders():
+def api_delivery_locations():
     """
-    API endpoint for delivery agents to see available orders
+    Batched position reports from the delivery dashboard:
+    {"points": [{"latitude": 13.08, "longitude": 80.27, "timestamp": 1760000000.5}, ...]}
+    Only the newest point is kept. No database work happens in the request;
+    positions are written by the location flusher.
     """
-    cur = mysql.connection.cursor()
-    
-    # Get orders ready for delivery but not assigned
-    cur.execute("""
-        SELECT o.*, s.restaurant_name, s.restaurant_address, 
-               s.latitude as restaurant_lat, s.longitude as restaurant_lng,
-               u.full_name as customer_name, u.address as customer_address,
-               u.latitude as customer_lat, u.longitude as customer_lng
-        FROM orders o
-        JOIN sellers s ON o.seller_id = s.id
-        JOIN users u ON o.customer_id = u.id
-        WHERE o.order_status = 'ready'
-        AND o.delivery_agent_id IS NULL
-        ORDER BY o.created_at ASC
-    """)
-    
-    orders = cur.fetchall()
-    
-    # Add distance calculation for each order
-    for order in orders:
-        if order['restaurant_lat'] and order['restaurant_lng']:
-            # Get delivery agent's current location
-            cur.execute("""
-                SELECT current_latitude, current_longitude 
-                FROM delivery_agent_availability 
-                WHERE delivery_agent_id = %s
-            """, (session['user_id'],))
-            
-            agent_location = cur.fetchone()
-            
-            if agent_location and agent_location['current_latitude']:
-                distance = calculate_distance(
-                    order['restaurant_lat'], order['restaurant_lng'],
-                    agent_location['current_latitude'], agent_location['current_longitude']
-                )
-                order['distance'] = round(distance, 2)
-                order['estimated_time'] = int(distance * 3)  # Rough estimate: 3 min per km
-    
-    cur.close()
+    data = request.get_json(silent=True) or {}
+    raw_points = data.get('points')
+    if (not isinstance(raw_points, list) or not raw_points
+            or len(raw_points) > app.config['LOCATION_BATCH_MAX_POINTS']):
+        return jsonify({'success': False,
+                        'message': f"Send 1 to {app.config['LOCATION_BATCH_MAX_POINTS']} points"}), 400
+    
+    now = time.time()
+    try:
+        points = [parse_location_point(raw, now) for raw in raw_points]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid coordinates'}), 400
+    
+    position = ingest_locations(session['user_id'], points)
+    return jsonify({
+        'success': True,
+        'accepted': position is not None,
+        'report_seconds': app.config['LOCATION_REPORT_SECONDS']
+    })
+
+def flush_locations():
+    """
+    Write the agents' latest positions to delivery_agent_availability and users
+    """
+    if not agent_locations.pending_count():
+        return
     
-    return jsonify({'orders': orders})
+    with mysql.pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            batch = agent_locations.flush(cur)
+            conn.commit()
+        finally:
+            cur.close()
+    agent_locations.confirm(batch)
 
-@app.route('/delivery/accept_order/<int:order_id>', methods=['POST'])
+def run_location_flusher(stop_event):
+    while not stop_event.wait(app.config['LOCATION_FLUSH_SECONDS']):
+        try:
+            flush_locations()
+        except Exception:
+            # Positions stay pending; try again next round
+            app.logger.exception('Location flush failed')
+
+_location_flusher = None
+_location_flusher_lock = threading.Lock()
+
+def start_location_flusher():
+    """
+    Start the write-behind thread for agent positions, and flush whatever
+    is still pending when the process exits
+    """
+    global _location_flusher
+    if _location_flusher is not None and _location_flusher.is_alive():
+        return
+    with _location_flusher_lock:
+        if _location_flusher is None or not _location_flusher.is_alive():
+            if _location_flusher is None:
+                atexit.register(flush_locations)
+            _location_flusher = threading.Thread(target=run_location_flusher, args=(threading.Event(),),
+                                                 daemon=True)
+            _location_flusher.start()
+
+@app.route('/delivery/api/available_orders')
 @login_required
 @role_required(['delivery'])
-def accept_order(order_id):
+def get_available_orders():
+    """
+    API endpoint for delivery agents to see available orders near them,
+    closest restaurant first
+
+    Query params:
+        radius - search radius in km (default AVAILABLE_ORDERS_RADIUS_KM)
+        limit  - page size (default AVAILABLE_ORDERS_PAGE_SIZE)
+        cursor - next_cursor from the previous page
+    """
+    radius_km = request.args.get('radius', app.config['AVAILABLE_ORDERS_RADIUS_KM'], type=float)
+    if not math.isfinite(radius_km):
+        return jsonify({'success': False, 'message': 'Invalid radius'}), 400
+    radius_km = min(max(radius_km, 0.1), app.config['AVAILABLE_ORDERS_MAX_RADIUS_KM'])
+    limit = request.args.get('limit', app.config['AVAILABLE_ORDERS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['AVAILABLE_ORDERS_MAX_PAGE_SIZE'])
+    
+    # Cursor is "<distance>:<order id>" of the last order on the previous page
+    after = None
+    if request.args.get('cursor'):
+        try:
+            distance, order_id = request.args['cursor'].split(':')
+            after = (float(distance), int(order_id))
+            if not math.isfinite(after[0]):
+                raise ValueError(distance)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+    
     cur = mysql.connection.cursor()
     
-    # Check if agent is available
+    # Get delivery agent's current location: the last one flushed to the
+    # database, or the last report this worker received if that is newer
     cur.execute("""
-        SELECT is_available FROM delivery_agent_availability 
+        SELECT delivery_agent_id, current_latitude, current_longitude,
+               UNIX_TIMESTAMP(location_updated_at) as location_reported_at
+        FROM delivery_agent_availability 
         WHERE delivery_agent_id = %s
     """, (session['user_id'],))
+    agent_location = cur.fetchone()
     
-    availability = cur.fetchone()
+    if agent_location:
+        agent_locations.newer_positions([agent_location])
+    else:
+        position = agent_locations.get(session['user_id'])
+        if position is not None:
+            agent_location = {'current_latitude': position[0], 'current_longitude': position[1]}
     
-    if not availability or not availability['is_available']:
-        return jsonify({'success': False, 'message': 'You are not available'})
+    if not agent_location or agent_location['current_latitude'] is None:
+        cur.close()
+        return jsonify({'orders': [], 'next_cursor': None,
+                        'message': 'Share your location to see nearby orders'})
+    
+    agent_lat = agent_location['current_latitude']
+    agent_lng = agent_location['current_longitude']
+    min_lat, max_lat, min_lng, max_lng = bounding_box(agent_lat, agent_lng, radius_km)
+    
+    # Get orders ready for delivery but not assigned, prefiltered to the
+    # bounding box around the agent (sellers location index). The exact
+    # (haversine) distance, the cursor and the page size are applied in SQL,
+    # so only one page of rows comes back. Distances are rounded to 6 places
+    # so the cursor value survives the round trip exactly.
+    query = """
+        SELECT * FROM (
+            SELECT o.*, s.restaurant_name, s.restaurant_address, 
+                   s.latitude as restaurant_lat, s.longitude as restaurant_lng,
+                   u.full_name as customer_name, u.address as customer_address,
+                   u.latitude as customer_lat, u.longitude as customer_lng,
+                   ROUND(2 * %s * ASIN(SQRT(
+                       POW(SIN(RADIANS(s.latitude - %s) / 2), 2)
+                       + COS(RADIANS(%s)) * COS(RADIANS(s.latitude))
+                       * POW(SIN(RADIANS(s.longitude - %s) / 2), 2)
+                   )), 6) as distance
+            FROM orders o
+            JOIN sellers s ON o.seller_id = s.id
+            JOIN users u ON o.customer_id = u.id
+            WHERE o.order_status = 'ready'
+            AND o.delivery_agent_id IS NULL
+            AND s.latitude BETWEEN %s AND %s
+            AND s.longitude BETWEEN %s AND %s
+        ) nearby
+        WHERE distance <= %s
+    """
+    params = [EARTH_RADIUS_KM, agent_lat, agent_lat, agent_lng, min_lat, max_lat, min_lng, max_lng, radius_km]
     
-    # Check if order is still available
-    cur.execute("""
-        SELECT order_status, delivery_agent_id 
-        FROM orders 
-        WHERE id = %s
-    """, (order_id,))
+    if after:
+        query += " AND (distance > %s OR (distance = %s AND id > %s))"
+        params.extend([after[0], after[0], after[1]])
     
-    order = cur.fetchone()
+    query += " ORDER BY distance, id LIMIT %s"
+    params.append(limit + 1)
+    
+    cur.execute(query, params)
+    orders = list(cur.fetchall())
+    cur.close()
     
-    if not order or order['delivery_agent_id']:
-        return jsonify({'success': False, 'message': 'Order already assigned'})
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = f"{orders[-1]['distance']!r}:{orders[-1]['id']}"
     
-    if order['order_status'] != 'ready':
-        return jsonify({'success': False, 'message': 'Order not ready for delivery'})
+    for order in orders:
+        distance = order['distance']
+        order['distance'] = round(distance, 2)
+        order['estimated_time'] = int(distance * 3)  # Rough estimate: 3 min per km
     
-    # Assign agent to order
+    return jsonify({'orders': orders, 'next_cursor': next_cursor})
+
+@app.route('/delivery/accept_order/<int:order_id>', methods=['POST'])
+@login_required
+@role_required(['delivery'])
+def accept_order(order_id):
+    # Assign agent to order; the claim itself checks the order and the agent
     success, message = manual_assign_delivery_agent(order_id, session['user_id'])
     
     if success:
@@ -1231,12 +2152,11 @@ def delivery_orders():
     query = """
         SELECT o.*, s.restaurant_name, s.restaurant_address,
                u.full_name as customer_name, u.address as customer_address,
-               (SELECT status FROM order_tracking 
-                WHERE order_id = o.id 
-                ORDER BY created_at DESC LIMIT 1) as current_status
+               ols.status as current_status
         FROM orders o
         JOIN sellers s ON o.seller_id = s.id
         JOIN users u ON o.customer_id = u.id
+        LEFT JOIN order_latest_status ols ON ols.order_id = o.id
         WHERE o.delivery_agent_id = %s
     """
     params = [session['user_id']]
@@ -1245,16 +2165,18 @@ def delivery_orders():
         query += " AND o.order_status = %s"
         params.append(status_filter)
     
-    query += " ORDER BY o.created_at DESC"
-    
-    cur.execute(query, params)
-    orders = cur.fetchall()
+    limit, after = page_args()
+    orders, next_cursor = fetch_page(cur, query, params, limit, after)
     
     cur.close()
     
+    if wants_json():
+        return jsonify({'orders': orders, 'next_cursor': next_cursor})
+    
     return render_template('delivery/orders.html',
                          orders=orders,
-                         status_filter=status_filter)
+                         status_filter=status_filter,
+                         next_cursor=next_cursor)
 
 @app.route('/delivery/order/<int:order_id>')
 @login_required
@@ -1315,22 +2237,23 @@ def delivery_update_order_status():
     cur = mysql.connection.cursor()
     
     # Verify delivery agent is assigned to this order
-    cur.execute("SELECT delivery_agent_id FROM orders WHERE id = %s", (order_id,))
+    cur.execute("SELECT delivery_agent_id, order_status FROM orders WHERE id = %s FOR UPDATE",
+                (order_id,))
     order = cur.fetchone()
     
     if order['delivery_agent_id'] != session['user_id']:
+        if wants_json():
+            return jsonify({'success': False, 'message': 'Unauthorized action'}), 403
         flash('Unauthorized action', 'danger')
         return redirect(url_for('delivery_orders'))
     
     # Update order status
     cur.execute("UPDATE orders SET order_status = %s WHERE id = %s",
                 (status, order_id))
+    record_order_status_change(cur, order_id, order['order_status'], status)
     
     # Add tracking entry
-    cur.execute("""
-        INSERT INTO order_tracking (order_id, status, notes, location_latitude, location_longitude)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (order_id, status, notes, latitude, longitude))
+    add_order_tracking(cur, order_id, status, notes, latitude, longitude)
     
     # If delivered, make agent available again
     if status == 'delivered':
@@ -1339,10 +2262,19 @@ def delivery_update_order_status():
             SET is_available = TRUE 
             WHERE delivery_agent_id = %s
         """, (session['user_id'],))
+        
+        if order['order_status'] != 'delivered':
+            record_agent_delivery(cur, session['user_id'], order_id)
     
     mysql.connection.commit()
     cur.close()
     
+    if status == 'delivered':
+        agent_index.set_available(session['user_id'], True)
+    
+    if wants_json():
+        return jsonify({'success': True, 'status': status})
+    
     flash('Order status updated successfully', 'success')
     return redirect(request.referrer)
 
@@ -1363,6 +2295,8 @@ def update_availability():
     mysql.connection.commit()
     cur.close()
     
+    agent_index.set_available(session['user_id'], is_available)
+    
     status = "available" if is_available else "unavailable"
     flash(f'You are now {status}', 'success')
     return redirect(url_for('delivery_dashboard'))
@@ -1402,12 +2336,7 @@ def get_cart_count():
     if session.get('user_type') != 'customer':
         return {'count': 0}
     
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT COUNT(*) as count FROM cart WHERE customer_id = %s", (session['user_id'],))
-    result = cur.fetchone()
-    cur.close()
-    
-    return {'count': result['count'] if result else 0}
+    return {'count': cart_service.count(session['user_id'])}
 
 @app.route('/api/order_stats')
 @login_required
@@ -1419,24 +2348,14 @@ def get_order_stats():
     cur.execute("SELECT id FROM sellers WHERE user_id = %s", (session['user_id'],))
     seller = cur.fetchone()
     
-    if period == 'today':
-        cur.execute("""
-            SELECT COUNT(*) as orders, SUM(final_amount) as revenue
-            FROM orders 
-            WHERE seller_id = %s AND DATE(created_at) = CURDATE()
-        """, (seller['id'],))
-    elif period == 'week':
-        cur.execute("""
-            SELECT COUNT(*) as orders, SUM(final_amount) as revenue
-            FROM orders 
-            WHERE seller_id = %s AND created_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
-        """, (seller['id'],))
-    elif period == 'month':
-        cur.execute("""
-            SELECT COUNT(*) as orders, SUM(final_amount) as revenue
-            FROM orders 
-            WHERE seller_id = %s AND created_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        """, (seller['id'],))
+    days = {'today': 0, 'week': 7, 'month': 30}.get(period, 0)
+    start_date = datetime.date.today() - datetime.timedelta(days=days)
+    
+    cur.execute("""
+        SELECT SUM(order_count) as orders, SUM(revenue) as revenue
+        FROM seller_daily_stats 
+        WHERE seller_id = %s AND stat_date >= %s
+    """, (seller['id'], start_date))
     
     stats = cur.fetchone()
     cur.close()
@@ -1466,10 +2385,13 @@ def update_restaurant():
         SET restaurant_name = %s, restaurant_phone = %s, restaurant_address = %s 
         WHERE id = %s
     """, (restaurant_name, restaurant_phone, restaurant_address, seller['id']))
+    log_search_change(cur, 'seller', seller['id'])
     
     mysql.connection.commit()
     cur.close()
     
+    cache.invalidate(f'menu:{seller["id"]}', 'restaurants', 'food_items')
+    
     flash('Restaurant information updated successfully', 'success')
     return redirect(url_for('seller_dashboard'))
 
@@ -1490,7 +2412,10 @@ def delete_menu_item():
     
     if item and item['seller_id'] == seller['id']:
         cur.execute("DELETE FROM food_items WHERE id = %s", (item_id,))
+        log_search_change(cur, 'item', int(item_id))
+        refresh_menu_item_count(cur, seller['id'])
         mysql.connection.commit()
+        cache.invalidate(f'menu:{seller["id"]}', 'restaurants', 'food_items')
         flash('Menu item deleted successfully', 'success')
     else:
         flash('Unauthorized action or item not found', 'danger')
@@ -1504,20 +2429,21 @@ def delete_menu_item():
 def delivery_earnings():
     cur = mysql.connection.cursor()
     
-    # Get current month earnings
+    # Get current month earnings (15% commission)
+    month_start = datetime.date.today().replace(day=1)
     cur.execute("""
         SELECT 
             DATE(created_at) as date,
             COUNT(*) as deliveries,
             SUM(final_amount) as total_value,
-            SUM(final_amount * 0.15) as earnings  # 15% commission
+            SUM(final_amount * 0.15) as earnings
         FROM orders 
         WHERE delivery_agent_id = %s 
             AND order_status = 'delivered'
-            AND MONTH(created_at) = MONTH(CURDATE())
+            AND created_at >= %s
         GROUP BY DATE(created_at)
         ORDER BY date DESC
-    """, (session['user_id'],))
+    """, (session['user_id'], month_start))
     
     earnings_data = cur.fetchall()
     
@@ -1562,18 +2488,13 @@ def role_required(roles):
 def admin_dashboard():
     cur = mysql.connection.cursor()
     
-    # Get counts
-    cur.execute("SELECT COUNT(*) as count FROM users WHERE user_type = 'customer'")
-    customer_count = cur.fetchone()['count']
-    
-    cur.execute("SELECT COUNT(*) as count FROM users WHERE user_type = 'seller'")
-    seller_count = cur.fetchone()['count']
-    
-    cur.execute("SELECT COUNT(*) as count FROM users WHERE user_type = 'delivery'")
-    delivery_count = cur.fetchone()['count']
-    
-    cur.execute("SELECT COUNT(*) as count FROM orders")
-    order_count = cur.fetchone()['count']
+    # Get counts from the platform counters
+    counters = read_platform_counters(cur)
+    customer_count = counters.get('users_customer', 0)
+    seller_count = counters.get('users_seller', 0)
+    delivery_count = counters.get('users_delivery', 0)
+    order_count = counters.get('orders_total', 0)
+    active_order_count = order_count - counters.get('orders_delivered', 0) - counters.get('orders_cancelled', 0)
     
     # Get pending sellers for approval
     cur.execute("""
@@ -1611,6 +2532,7 @@ def admin_dashboard():
                          seller_count=seller_count,
                          delivery_count=delivery_count,
                          order_count=order_count,
+                         active_order_count=active_order_count,
                          pending_sellers=pending_sellers,
                          recent_orders=recent_orders,
                          recent_users=recent_users)
@@ -1630,14 +2552,19 @@ def admin_users():
         query += " AND user_type = %s"
         params.append(user_type)
     
-    query += " ORDER BY created_at DESC"
-    
-    cur.execute(query, params)
-    users = cur.fetchall()
+    limit, after = page_args()
+    users, next_cursor = fetch_page(cur, query, params, limit, after,
+                                    created_column='created_at', id_column='id')
     
     cur.close()
     
-    return render_template('admin/users.html', users=users, user_type=user_type)
+    if wants_json():
+        return jsonify({'users': [{key: value for key, value in user.items() if key != 'password'}
+                                  for user in users],
+                        'next_cursor': next_cursor})
+    
+    return render_template('admin/users.html', users=users, user_type=user_type,
+                           next_cursor=next_cursor)
 
 @app.route('/admin/sellers')
 @login_required
@@ -1647,15 +2574,13 @@ def admin_sellers():
     
     cur = mysql.connection.cursor()
     
+    # total_orders is the lifetime counter on sellers
     query = """
         SELECT s.*, u.username, u.email, u.phone, u.created_at as registered_date,
-               COUNT(DISTINCT fi.id) as menu_items,
-               COUNT(DISTINCT o.id) as total_orders
-        FROM sellers s
-        JOIN users u ON s.user_id = u.id
-        LEFT JOIN food_items fi ON s.id = fi.seller_id
-        LEFT JOIN orders o ON s.id = o.seller_id
-        WHERE 1=1
+               (SELECT COUNT(*) FROM food_items fi WHERE fi.seller_id = s.id) as menu_items
+        FROM users u
+        JOIN sellers s ON s.user_id = u.id
+        WHERE u.user_type = 'seller'
     """
     params = []
     
@@ -1663,14 +2588,18 @@ def admin_sellers():
         query += " AND s.verification_status = %s"
         params.append(status_filter)
     
-    query += " GROUP BY s.id ORDER BY u.created_at DESC"
-    
-    cur.execute(query, params)
-    sellers = cur.fetchall()
+    limit, after = page_args()
+    sellers, next_cursor = fetch_page(cur, query, params, limit, after,
+                                      created_column='u.created_at', id_column='u.id',
+                                      cursor_keys=('registered_date', 'user_id'))
     
     cur.close()
     
-    return render_template('admin/sellers.html', sellers=sellers, status_filter=status_filter)
+    if wants_json():
+        return jsonify({'sellers': sellers, 'next_cursor': next_cursor})
+    
+    return render_template('admin/sellers.html', sellers=sellers, status_filter=status_filter,
+                           next_cursor=next_cursor)
 
 @app.route('/admin/orders')
 @login_required
@@ -1697,14 +2626,22 @@ def admin_orders():
         query += " AND o.order_status = %s"
         params.append(status_filter)
     
-    query += " ORDER BY o.created_at DESC"
-    
-    cur.execute(query, params)
-    orders = cur.fetchall()
+    limit, after = page_args()
+    orders, next_cursor = fetch_page(cur, query, params, limit, after)
     
     cur.close()
     
-    return render_template('admin/orders.html', orders=orders, status_filter=status_filter)
+    if wants_json():
+        return jsonify({'orders': orders, 'next_cursor': next_cursor})
+    
+    return render_template('admin/orders.html', orders=orders, status_filter=status_filter,
+                           next_cursor=next_cursor)
+
+@app.route('/admin/export/<dataset>')
+@login_required
+@role_required(['admin'])
+def admin_export(dataset):
+    return export_response(dataset, seller_id=request.args.get('seller_id', type=int))
 
 @app.route('/admin/update_seller_status', methods=['POST'])
 @login_required
@@ -1722,6 +2659,7 @@ def update_seller_status():
         SET verification_status = %s, is_verified = %s 
         WHERE id = %s
     """, (status, (status == 'approved'), seller_id))
+    log_search_change(cur, 'seller', int(seller_id))
     
     # Get seller info for notification
     cur.execute("""
@@ -1735,6 +2673,8 @@ def update_seller_status():
     mysql.connection.commit()
     cur.close()
     
+    cache.invalidate(f'menu:{int(seller_id)}', 'restaurants', 'food_items')
+    
     flash(f'Seller status updated to {status}', 'success')
     return redirect(url_for('admin_sellers'))
 
@@ -1750,6 +2690,8 @@ def delete_user():
     cur.execute("SELECT user_type FROM users WHERE id = %s", (user_id,))
     user = cur.fetchone()
     
+    record_user_removed(cur, user_id)
+    
     if user['user_type'] == 'seller':
         # Delete seller and their menu items
         cur.execute("SELECT id FROM sellers WHERE user_id = %s", (user_id,))
@@ -1757,6 +2699,7 @@ def delete_user():
         if seller:
             cur.execute("DELETE FROM food_items WHERE seller_id = %s", (seller['id'],))
             cur.execute("DELETE FROM sellers WHERE id = %s", (seller['id'],))
+            log_search_change(cur, 'seller', seller['id'])
     
     # Delete user
     cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
@@ -1764,6 +2707,14 @@ def delete_user():
     mysql.connection.commit()
     cur.close()
     
+    if user['user_type'] == 'seller' and seller:
+        cache.invalidate(f'menu:{seller["id"]}', 'restaurants', 'food_items')
+    elif user['user_type'] == 'customer':
+        cart_service.forget(user_id)
+    elif user['user_type'] == 'delivery':
+        agent_locations.forget(user_id)
+        agent_index.remove(user_id)
+    
     flash('User deleted successfully', 'success')
     return redirect(url_for('admin_users'))
 
@@ -1775,47 +2726,39 @@ def admin_analytics():
     
     # Sales data
     cur.execute("""
-        SELECT DATE(created_at) as date, 
-               COUNT(*) as order_count,
-               SUM(final_amount) as revenue
-        FROM orders 
-        WHERE created_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        GROUP BY DATE(created_at)
-        ORDER BY date
+        SELECT stat_date as date, 
+               SUM(order_count) as order_count,
+               SUM(revenue) as revenue,
+               SUM(new_users) as user_count
+        FROM platform_daily_stats 
+        WHERE stat_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+        GROUP BY stat_date
+        ORDER BY stat_date
     """)
-    sales_data = cur.fetchall()
+    daily_stats = cur.fetchall()
+    sales_data = [day for day in daily_stats if day['order_count']]
     
     # User growth
-    cur.execute("""
-        SELECT DATE(created_at) as date, 
-               COUNT(*) as user_count
-        FROM users 
-        WHERE created_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        GROUP BY DATE(created_at)
-        ORDER BY date
-    """)
-    user_growth = cur.fetchall()
+    user_growth = [day for day in daily_stats if day['user_count']]
     
-    # Top restaurants
+    # Top restaurants by lifetime revenue
     cur.execute("""
-        SELECT s.restaurant_name, 
-               COUNT(o.id) as order_count,
-               SUM(o.final_amount) as revenue
-        FROM orders o
-        JOIN sellers s ON o.seller_id = s.id
-        GROUP BY s.id
-        ORDER BY revenue DESC
+        SELECT restaurant_name, 
+               total_orders as order_count,
+               total_revenue as revenue
+        FROM sellers
+        WHERE total_orders > 0
+        ORDER BY total_revenue DESC
         LIMIT 10
     """)
     top_restaurants = cur.fetchall()
     
     # User distribution
-    cur.execute("""
-        SELECT user_type, COUNT(*) as count
-        FROM users
-        GROUP BY user_type
-    """)
-    user_distribution = cur.fetchall()
+    user_distribution = [
+        {'user_type': name[len('users_'):], 'count': count}
+        for name, count in sorted(read_platform_counters(cur).items())
+        if name.startswith('users_') and count
+    ]
     
     cur.close()
     
@@ -1825,170 +2768,849 @@ def admin_analytics():
                          top_restaurants=top_restaurants,
                          user_distribution=user_distribution)
 
-import math
-from decimal import Decimal
+@app.route('/admin/api/db_pool_stats')
+@login_required
+@role_required(['admin'])
+def admin_db_pool_stats():
+    """
+    Connection pool statistics for the worker process serving this request
+    """
+    return jsonify(mysql.pool.stats())
 
-def calculate_distance(lat1, lon1, lat2, lon2):
+@app.route('/api/search')
+@login_required
+def api_search():
     """
-    Calculate distance between two coordinates using Haversine formula
-    Returns distance in kilometers
+    Ranked restaurants and dishes for ?q=; the last word matches as a prefix
     """
-    if not all([lat1, lon1, lat2, lon2]):
-        return float('inf')
+    text = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
     
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+    refresh_search_index()
+    results = []
+    for score, (doc_type, doc_id), meta in search_index.search(text, limit=limit):
+        results.append(dict(meta, type='restaurant' if doc_type == 'seller' else 'dish',
+                            id=doc_id, score=round(score, 3)))
     
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-    return c * r
+    return jsonify({'query': text, 'results': results})
 
-def find_nearest_delivery_agent(restaurant_lat, restaurant_lng):
+@app.route('/api/search/suggest')
+@login_required
+def api_search_suggest():
     """
-    Find the nearest available delivery agent to the restaurant
+    Type-ahead suggestions for ?q= (restaurant and dish names, Tamil or English)
     """
-    cur = mysql.connection.cursor()
-    
-    # Get all available delivery agents with their current location
-    cur.execute("""
-        SELECT u.*, da.is_available, da.current_latitude, da.current_longitude
-        FROM users u
-        JOIN delivery_agent_availability da ON u.id = da.delivery_agent_id
-        WHERE u.user_type = 'delivery' 
-        AND da.is_available = TRUE
-        AND da.current_latitude IS NOT NULL 
-        AND da.current_longitude IS NOT NULL
-        AND u.is_active = TRUE
-    """)
-    
-    available_agents = cur.fetchall()
-    cur.close()
-    
-    if not available_agents:
-        return None
+    text = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
     
-    # Calculate distance for each agent
-    agents_with_distance = []
-    for agent in available_agents:
-        distance = calculate_distance(
-            restaurant_lat, restaurant_lng,
-            agent['current_latitude'], agent['current_longitude']
-        )
+    refresh_search_index()
+    return jsonify({'query': text, 'suggestions': suggest_index.suggest(text, limit=limit)})
+
+@app.route('/admin/api/cart_stats')
+@login_required
+@role_required(['admin'])
+def admin_cart_stats():
+    """
+    Cart store and write-behind statistics for the worker process serving this request
+    """
+    return jsonify(cart_service.stats())
+
+@app.route('/admin/api/location_stats')
+@login_required
+@role_required(['admin'])
+def admin_location_stats():
+    """
+    Agent location ingestion and write-behind statistics for the worker process serving this request
+    """
+    return jsonify(agent_locations.stats())
+
+@app.route('/admin/api/cache_stats')
+@login_required
+@role_required(['admin'])
+def admin_cache_stats():
+    """
+    Restaurant and menu cache statistics for the worker process serving this request
+    """
+    return jsonify(cache.stats())
+
+@app.route('/admin/api/event_stats')
+@login_required
+@role_required(['admin'])
+def admin_event_stats():
+    """
+    Order event stream statistics for the worker process serving this request
+    """
+    stats = order_events.stats()
+    stats['tail_after_id'] = event_tail['after_id']
+    stats['tail_gaps'] = len(event_tail['gaps'])
+    return jsonify(stats)
+
+EVENT_TAIL_BATCH = 500
+EVENT_TAIL_MAX_GAP = 1000
+
+# Read position of the event tailer: highest order_tracking id published and
+# the lower ids not seen yet ({id: when first missed})
+event_tail = {'after_id': None, 'gaps': {}}
+
+def event_topics(user_id, user_type):
+    """
+    The topics a user's event stream subscribes to: admins see every order,
+    everyone else the orders they are the customer, restaurant or agent of
+    """
+    return ['all'] if user_type == 'admin' else [f'user:{user_id}']
+
+def publish_order_events(cur, tail):
+    """
+    Publish the order_tracking rows inserted since the last call, whichever
+    process or route wrote them. Ids are handed out at insert but become
+    visible at commit, so a slow transaction can commit a lower id after a
+    higher one was read: skipped ids are looked for again for
+    EVENTS_GAP_SECONDS (a rolled-back insert never shows up).
+    Returns the number of rows published.
+    """
+    if tail['after_id'] is None:
+        cur.execute("SELECT COALESCE(MAX(id), 0) as id FROM order_tracking")
+        tail['after_id'] = cur.fetchone()['id']
+        return 0
+    
+    now = time.monotonic()
+    gaps = tail['gaps']
+    for missing_id, missed_at in list(gaps.items()):
+        if now - missed_at > app.config['EVENTS_GAP_SECONDS']:
+            del gaps[missing_id]
+    
+    query = """
+        SELECT ot.id, ot.order_id, ot.status, ot.notes, ot.location_latitude, ot.location_longitude,
+               ot.created_at, o.order_number, o.customer_id, o.delivery_agent_id,
+               s.user_id as seller_user_id
+        FROM order_tracking ot
+        JOIN orders o ON o.id = ot.order_id
+        JOIN sellers s ON s.id = o.seller_id
+        WHERE ot.id > %s
+    """
+    params = [tail['after_id']]
+    if gaps:
+        query += " OR ot.id IN ({})".format(', '.join(['%s'] * len(gaps)))
+        params.extend(gaps)
+    query += " ORDER BY ot.id LIMIT %s"
+    params.append(EVENT_TAIL_BATCH)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    
+    for row in rows:
+        if row['id'] > tail['after_id']:
+            # A jump bigger than this is an auto-increment jump, not open transactions
+            if row['id'] - tail['after_id'] <= EVENT_TAIL_MAX_GAP:
+                gaps.update((missing_id, now) for missing_id in range(tail['after_id'] + 1, row['id']))
+            tail['after_id'] = row['id']
+        else:
+            gaps.pop(row['id'], None)
         
-        # Calculate agent score based on multiple factors
-        score = calculate_agent_score(agent, distance)
+        topics = {'all', f"user:{row['customer_id']}", f"user:{row['seller_user_id']}"}
+        if row['delivery_agent_id']:
+            topics.add(f"user:{row['delivery_agent_id']}")
+        order_events.publish({
+            'tracking_id': row['id'],
+            'order_id': row['order_id'],
+            'order_number': row['order_number'],
+            'status': row['status'],
+            'notes': row['notes'],
+            'latitude': float(row['location_latitude']) if row['location_latitude'] is not None else None,
+            'longitude': float(row['location_longitude']) if row['location_longitude'] is not None else None,
+            'created_at': row['created_at'].isoformat(),
+            'delivery_agent_id': row['delivery_agent_id']
+        }, topics)
+    
+    return len(rows)
+
+def run_event_tailer(stop_event):
+    while not stop_event.is_set():
+        published = 0
+        try:
+            with mysql.pool.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    published = publish_order_events(cur, event_tail)
+                finally:
+                    cur.close()
+        except Exception:
+            app.logger.exception('Order event tailer failed')
         
-        agents_with_distance.append({
-            'agent': agent,
-            'distance': distance,
-            'score': score
-        })
+        # Keep reading without a pause while catching up on a backlog
+        if published < EVENT_TAIL_BATCH:
+            stop_event.wait(app.config['EVENTS_POLL_SECONDS'])
+
+_event_tailer = None
+_event_tailer_lock = threading.Lock()
+
+def start_event_tailer():
+    """
+    Start the thread that publishes new order_tracking rows to this
+    process's event streams: one small query per poll, however many
+    streams are open
+    """
+    global _event_tailer
+    with _event_tailer_lock:
+        if _event_tailer is None or not _event_tailer.is_alive():
+            _event_tailer = threading.Thread(target=run_event_tailer, args=(threading.Event(),), daemon=True)
+            _event_tailer.start()
+
+@app.template_global()
+def order_events_url(order_id=None):
+    """
+    Where the page opens its event stream, starting after the tracking rows
+    already published in this process (the page shows at least those)
+    """
+    start_event_tailer()
+    args = {}
+    if order_id is not None:
+        args['order_id'] = order_id
+    if event_tail['after_id'] is not None:
+        args['since'] = event_tail['after_id']
+    if app.config['EVENTS_URL']:
+        query = '&'.join(f'{name}={value}' for name, value in args.items())
+        return app.config['EVENTS_URL'] + ('?' + query if query else '')
+    return url_for('order_events_stream', **args)
+
+@app.route('/events/orders')
+@login_required
+def order_events_stream():
+    """
+    Server-Sent Events stream of status changes to the user's orders
+    (?order_id= for one order). Each order_tracking insert arrives as an
+    `order_status` event. A reconnecting browser sends Last-Event-ID and
+    gets what it missed; one that cannot be caught up, or reads too slowly,
+    gets a `reset` event and reloads the page.
+    Every open stream holds a server thread; `flask --app app serve-events`
+    serves them from one asyncio process instead.
+    """
+    start_event_tailer()
+    try:
+        subscriber, messages = open_stream(
+            order_events, event_topics(session['user_id'], session['user_type']),
+            request.args.get('order_id', type=int),
+            request.headers.get('Last-Event-ID'),
+            request.args.get('since', type=int)
+        )
+    except BrokerFull:
+        return jsonify({'success': False, 'message': 'Too many open event streams'}), 503, {'Retry-After': '10'}
     
-    # Sort by score (higher is better) then by distance
-    agents_with_distance.sort(key=lambda x: (-x['score'], x['distance']))
+    keepalive = app.config['EVENTS_KEEPALIVE_SECONDS']
     
-    return agents_with_distance[0]['agent'] if agents_with_distance else None
+    def generate():
+        try:
+            yield ''.join(messages)
+            while not subscriber.closed:
+                items = subscriber.get(keepalive)
+                if items or subscriber.closed:
+                    yield ''.join(stream_messages(subscriber, items))
+                else:
+                    yield format_comment('keepalive')
+        finally:
+            # Also reached when the client disconnects and the next write fails
+            order_events.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-def calculate_agent_score(agent, distance):
+def session_event_topics(cookie_header):
     """
-    Calculate a score for agent based on various factors
-    Higher score = better candidate
+    Event topics for the user logged in with this Cookie header, or None;
+    how the asyncio event server reads the Flask session
     """
-    score = 100  # Base score
+    cookie = SimpleCookie()
+    try:
+        cookie.load(cookie_header)
+    except CookieError:
+        return None
+    morsel = cookie.get(app.config['SESSION_COOKIE_NAME'])
+    serializer = app.session_interface.get_signing_serializer(app)
+    if morsel is None or serializer is None:
+        return None
+    try:
+        data = serializer.loads(morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    if 'user_id' not in data:
+        return None
+    return event_topics(data['user_id'], data.get('user_type'))
+
+def refresh_categories(force=False):
+    """
+    Reload the category registry when the categories version in cache_versions
+    has moved. The version is checked at most every CATEGORY_CHECK_SECONDS.
+    """
+    if not force and not category_registry.needs_check(app.config['CATEGORY_CHECK_SECONDS']):
+        return
+    
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT version FROM cache_versions WHERE name = 'categories'")
+    row = cur.fetchone()
+    version = row['version'] if row else None
     
-    # Distance penalty (farther = lower score)
-    if distance < 5:  # Within 5km
-        score += 50
-    elif distance < 10:  # Within 10km
-        score += 30
-    elif distance < 15:  # Within 15km
-        score += 10
+    if force or version is None or version != category_registry.version:
+        cur.execute("SELECT * FROM categories ORDER BY id")
+        category_registry.load(cur.fetchall(), version)
     else:
-        score -= (distance - 15) * 2  # Penalty for distance beyond 15km
+        category_registry.mark_checked()
+    
+    cur.close()
+
+@app.context_processor
+def inject_categories():
+    """
+    Active categories for every template; routes can pass their own `categories`
+    """
+    refresh_categories()
+    return {'categories': category_registry.active()}
+
+def log_search_change(cur, doc_type, doc_id):
+    """
+    Note a restaurant ('seller') or dish ('item') whose search entry must be
+    rebuilt; part of the caller's transaction
+    """
+    cur.execute("INSERT INTO search_changes (doc_type, doc_id) VALUES (%s, %s)", (doc_type, doc_id))
+
+def search_documents(cur, seller_ids=None, item_ids=None):
+    """
+    (doc_key, fields, meta) for verified restaurants and their available dishes,
+    optionally limited to some sellers (with all their dishes) or some dishes
+    """
+    refresh_categories()
+    docs = []
+    
+    if item_ids is None:
+        query = "SELECT id, restaurant_name, restaurant_address FROM sellers WHERE is_verified = TRUE"
+        params = []
+        if seller_ids is not None:
+            query += " AND id IN ({})".format(', '.join(['%s'] * len(seller_ids)))
+            params.extend(seller_ids)
+        cur.execute(query, params)
+        for row in cur.fetchall():
+            docs.append((('seller', row['id']),
+                         {'name': row['restaurant_name'], 'address': row['restaurant_address']},
+                         {'seller_id': row['id'], 'name': row['restaurant_name']}))
+    
+    query = """
+        SELECT fi.id, fi.seller_id, fi.name, fi.description, fi.category_id,
+               fi.price, fi.discount_price, fi.is_vegetarian, s.restaurant_name
+        FROM food_items fi
+        JOIN sellers s ON s.id = fi.seller_id
+        WHERE fi.is_available = TRUE AND s.is_verified = TRUE
+    """
+    params = []
+    if seller_ids is not None:
+        query += " AND fi.seller_id IN ({})".format(', '.join(['%s'] * len(seller_ids)))
+        params.extend(seller_ids)
+    if item_ids is not None:
+        query += " AND fi.id IN ({})".format(', '.join(['%s'] * len(item_ids)))
+        params.extend(item_ids)
+    cur.execute(query, params)
+    for row in cur.fetchall():
+        docs.append((('item', row['id']),
+                     {'name': row['name'], 'description': row['description'],
+                      'category': category_registry.name(row['category_id'])},
+                     {'seller_id': row['seller_id'], 'name': row['name'],
+                      'restaurant_name': row['restaurant_name'],
+                      'price': row['discount_price'] or row['price'],
+                      'is_vegetarian': bool(row['is_vegetarian'])}))
+    
+    return docs
+
+def refresh_search_index(force=False):
+    """
+    Bring the search index up to date. The first call loads every restaurant
+    and dish; later calls (at most every SEARCH_CHECK_SECONDS) re-read only
+    the rows named in search_changes since the last one applied.
+    """
+    if (not force and search_index.loaded_at is not None
+            and time.monotonic() - search_index.loaded_at < app.config['SEARCH_CHECK_SECONDS']):
+        return
     
-    # Get agent's performance metrics
     cur = mysql.connection.cursor()
     
-    # Get delivery history
+    # A worker that has not checked for longer than purge-search-changes keeps
+    # rows may have missed some; rebuild instead of applying what is left
+    stale = (search_index.loaded_at is not None and time.monotonic() - search_index.loaded_at
+             > app.config['SEARCH_CHANGES_TTL_HOURS'] * 3600 / 2)
+    
+    changes = None
+    if not force and not stale and search_index.version is not None:
+        # Ids are handed out at insert but become visible at commit, so a slow
+        # transaction can commit a lower id later; re-reading the last few
+        # seconds of changes catches it (applying a change twice is harmless)
+        cur.execute("""
+            SELECT id, doc_type, doc_id FROM search_changes
+            WHERE id > %s OR created_at > NOW() - INTERVAL 30 SECOND
+            ORDER BY id
+            LIMIT %s
+        """, (search_index.version, app.config['SEARCH_MAX_CHANGES'] + 1))
+        changes = cur.fetchall()
+    
+    if changes is None or len(changes) > app.config['SEARCH_MAX_CHANGES']:
+        cur.execute("SELECT COALESCE(MAX(id), 0) as version FROM search_changes")
+        version = cur.fetchone()['version']
+        docs = search_documents(cur)
+        suggest_index.load((doc_key, meta['name']) for doc_key, _, meta in docs)
+        search_index.load(docs, version)
+        cur.close()
+        return
+    
+    seller_ids = sorted({row['doc_id'] for row in changes if row['doc_type'] == 'seller'})
+    item_ids = sorted({row['doc_id'] for row in changes if row['doc_type'] == 'item'})
+    
+    if seller_ids:
+        docs = search_documents(cur, seller_ids=seller_ids)
+        found = {doc_key for doc_key, _, _ in docs}
+        for seller_id in seller_ids:
+            stale = [('seller', seller_id)] + [('item', item_id) for item_id in search_index.seller_items(seller_id)]
+            for doc_key in stale:
+                if doc_key not in found:
+                    search_index.remove(doc_key)
+                    suggest_index.remove(doc_key)
+        for doc_key, fields, meta in docs:
+            search_index.upsert(doc_key, fields, meta)
+            suggest_index.upsert(doc_key, meta['name'])
+    
+    if item_ids:
+        docs = search_documents(cur, item_ids=item_ids)
+        found = {doc_key for doc_key, _, _ in docs}
+        for item_id in item_ids:
+            if ('item', item_id) not in found:
+                search_index.remove(('item', item_id))
+                suggest_index.remove(('item', item_id))
+        for doc_key, fields, meta in docs:
+            search_index.upsert(doc_key, fields, meta)
+            suggest_index.upsert(doc_key, meta['name'])
+    
+    if changes:
+        search_index.version = max(search_index.version, changes[-1]['id'])
+    search_index.loaded_at = time.monotonic()
+    cur.close()
+
+def search_restaurants(text):
+    """
+    Verified restaurants matching `text` by name, address or one of their
+    dishes: {seller_id: {'score': best hit, 'dishes': [up to 3 matching dish names]}}
+    """
+    refresh_search_index()
+    matches = {}
+    for score, (doc_type, _), meta in search_index.search(text, limit=app.config['SEARCH_MAX_RESULTS']):
+        match = matches.setdefault(meta['seller_id'], {'score': 0.0, 'dishes': []})
+        match['score'] = max(match['score'], score)
+        if doc_type == 'item' and len(match['dishes']) < 3:
+            match['dishes'].append(meta['name'])
+    return matches
+
+def refresh_agent_index(force=False):
+    """
+    Reload the agent location index once it is older than GEO_INDEX_REFRESH_SECONDS,
+    picking up location and availability changes made by other workers
+    """
+    if not force and not agent_index.is_stale(app.config['GEO_INDEX_REFRESH_SECONDS']):
+        return
+    
+    cur = mysql.connection.cursor()
     cur.execute("""
-        SELECT 
-            COUNT(*) as total_deliveries,
-            AVG(TIMESTAMPDIFF(MINUTE, created_at, updated_at)) as avg_delivery_time,
-            SUM(CASE WHEN order_status = 'delivered' THEN 1 ELSE 0 END) as successful_deliveries
-        FROM orders 
-        WHERE delivery_agent_id = %s
-    """, (agent['id'],))
+        SELECT da.delivery_agent_id, da.current_latitude, da.current_longitude, da.is_available,
+               UNIX_TIMESTAMP(da.location_updated_at) as location_reported_at
+        FROM delivery_agent_availability da
+        JOIN users u ON u.id = da.delivery_agent_id
+        WHERE u.user_type = 'delivery'
+        AND u.is_active = TRUE
+        AND da.current_latitude IS NOT NULL
+        AND da.current_longitude IS NOT NULL
+    """)
+    rows = cur.fetchall()
+    cur.close()
     
-    performance = cur.fetchone()
+    # Positions reported to this worker but not flushed yet may be newer than the table
+    agent_locations.newer_positions(rows)
+    
+    agent_index.load((row['delivery_agent_id'], row['current_latitude'],
+                      row['current_longitude'], row['is_available']) for row in rows)
+
+def load_available_agents(agent_ids):
+    """
+    Re-check availability of candidate agents and load their precomputed
+    performance stats in a single query
+    """
+    if not agent_ids:
+        return []
+    
+    agent_ids = list(agent_ids)
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT u.*, da.is_available, da.current_latitude, da.current_longitude,
+               UNIX_TIMESTAMP(da.location_updated_at) as location_reported_at,
+               COALESCE(st.total_orders, 0) as total_deliveries,
+               COALESCE(st.successful_deliveries, 0) as successful_deliveries,
+               st.total_delivery_minutes / NULLIF(st.successful_deliveries, 0) as avg_delivery_time,
+               st.successful_deliveries / NULLIF(st.total_orders, 0) as success_rate
+        FROM users u
+        JOIN delivery_agent_availability da ON u.id = da.delivery_agent_id
+        LEFT JOIN delivery_agent_stats st ON st.delivery_agent_id = u.id
+        WHERE u.user_type = 'delivery' 
+        AND da.is_available = TRUE
+        AND da.current_latitude IS NOT NULL 
+        AND da.current_longitude IS NOT NULL
+        AND u.is_active = TRUE
+        AND u.id IN ({})
+    """.format(', '.join(['%s'] * len(agent_ids))), agent_ids)
+    
+    agents = list(cur.fetchall())
     cur.close()
     
-    # Experience bonus
-    total_deliveries = performance['total_deliveries'] or 0
-    score += min(total_deliveries * 0.5, 20)  # Max 20 points for experience
+    return agent_locations.newer_positions(agents, id_key='id')
+
+def find_nearest_delivery_agent(restaurant_lat, restaurant_lng):
+    """
+    Find the nearest available delivery agent to the restaurant
+    """
+    # Only the closest candidates from the location index are scored
+    refresh_agent_index()
+    candidates = agent_index.nearest(
+        restaurant_lat, restaurant_lng,
+        k=app.config['ASSIGNMENT_CANDIDATES'],
+        max_radius_km=app.config['ASSIGNMENT_MAX_RADIUS_KM']
+    )
+    
+    available_agents = load_available_agents(agent_id for _, agent_id in candidates)
     
-    # Rating bonus (if you have rating system)
-    # Assuming rating column exists in users table
-    if agent.get('rating'):
-        score += agent['rating'] * 10
+    if not available_agents:
+        return None
     
-    return max(score, 0)  # Ensure score is not negative
+    # Calculate distance to every agent in one batch
+    distances = distances_from(
+        restaurant_lat, restaurant_lng,
+        [agent['current_latitude'] for agent in available_agents],
+        [agent['current_longitude'] for agent in available_agents]
+    )
+    
+    agents_with_distance = []
+    for agent, distance in zip(available_agents, distances.tolist()):
+        # Calculate agent score based on multiple factors
+        score = calculate_agent_score(agent, distance)
+        
+        agents_with_distance.append({
+            'agent': agent,
+            'distance': distance,
+            'score': score
+        })
+    
+    # Sort by score (higher is better) then by distance
+    agents_with_distance.sort(key=lambda x: (-x['score'], x['distance']))
+    
+    return agents_with_distance[0]['agent'] if agents_with_distance else None
 
-def auto_assign_delivery_agent(order_id):
+def dispatch_ready_orders(order_ids=None):
     """
-    Automatically assign delivery agent to an order
+    Assign ready, unassigned orders to available agents jointly by solving a
+    min-cost matching over the distance + agent score matrix, committing all
+    assignments in one transaction.
+    Returns (assigned, unassigned): (order_id, agent) pairs and leftover order ids
     """
     cur = mysql.connection.cursor()
     
-    # Get order details including restaurant location
-    cur.execute("""
-        SELECT o.*, s.latitude, s.longitude
+    query = """
+        SELECT o.id, s.latitude, s.longitude
         FROM orders o
         JOIN sellers s ON o.seller_id = s.id
-        WHERE o.id = %s
-    """, (order_id,))
+        WHERE o.order_status = 'ready'
+        AND o.delivery_agent_id IS NULL
+        AND s.latitude IS NOT NULL
+        AND s.longitude IS NOT NULL
+    """
+    params = []
     
-    order = cur.fetchone()
+    if order_ids is not None:
+        if not order_ids:
+            cur.close()
+            return [], []
+        query += " AND o.id IN ({})".format(', '.join(['%s'] * len(order_ids)))
+        params.extend(order_ids)
+    
+    query += " ORDER BY o.created_at, o.id LIMIT %s"
+    params.append(app.config['DISPATCH_BATCH_SIZE'])
+    
+    cur.execute(query, params)
+    orders = cur.fetchall()
+    
+    if not orders:
+        cur.close()
+        return [], []
     
-    if not order or not order['latitude'] or not order['longitude']:
-        return False, "Restaurant location not available"
+    # Candidate agents: the nearest few for every order in the batch
+    refresh_agent_index()
+    candidate_ids = set()
+    for order in orders:
+        candidate_ids.update(agent_id for _, agent_id in agent_index.nearest(
+            order['latitude'], order['longitude'],
+            k=app.config['ASSIGNMENT_CANDIDATES'],
+            max_radius_km=app.config['ASSIGNMENT_MAX_RADIUS_KM']
+        ))
+    
+    agents = load_available_agents(candidate_ids)
+    
+    if not agents:
+        cur.close()
+        return [], [order['id'] for order in orders]
     
-    # Find nearest available agent
-    agent = find_nearest_delivery_agent(
-        order['latitude'], 
-        order['longitude']
+    distances = distance_matrix(
+        [order['latitude'] for order in orders],
+        [order['longitude'] for order in orders],
+        [agent['current_latitude'] for agent in agents],
+        [agent['current_longitude'] for agent in agents]
     )
+    costs = assignment_costs(distances, agents, app.config['ASSIGNMENT_MAX_RADIUS_KM'])
+    
+    assigned = []
+    for row, col in solve_assignment(costs):
+        order, agent = orders[row], agents[col]
+        
+        # Each assignment is undone on its own if the order or agent was
+        # taken since they were read
+        if claim_order(cur, order['id'], agent['id']):
+            continue
+        
+        add_order_tracking(cur, order['id'], 'assigned',
+                           f"Delivery agent {agent['full_name']} assigned to order")
+        assigned.append((order['id'], agent))
+    
+    mysql.connection.commit()
+    cur.close()
+    
+    for _, agent in assigned:
+        agent_index.set_available(agent['id'], False)
     
-    if not agent:
-        return False, "No available delivery agents found"
+    assigned_ids = {order_id for order_id, _ in assigned}
+    return assigned, [order['id'] for order in orders if order['id'] not in assigned_ids]
+
+def enqueue_assignment(cur, order_id):
+    """
+    Queue auto-assignment for a ready order. With the MySQL backend the job is
+    inserted through the caller's cursor, so it commits with the status change.
+    """
+    if isinstance(job_queue, MemoryJobQueue):
+        # Not transactional: give the caller time to commit before it is due
+        job_queue.enqueue(ASSIGN_DELIVERY_JOB, {'order_id': int(order_id)}, delay=1)
+        start_local_worker()
+    else:
+        job_queue.enqueue(ASSIGN_DELIVERY_JOB, {'order_id': int(order_id)}, cur=cur)
+
+def handle_assignment_jobs(jobs):
+    """
+    Worker handler for assign_delivery jobs: dispatch the batch's orders jointly,
+    retry orders still waiting for an agent with backoff, and after
+    JOB_MAX_ATTEMPTS leave them for the seller to assign manually
+    """
+    with app.app_context():
+        jobs_by_order = {}
+        for job in jobs:
+            jobs_by_order.setdefault(int(job['payload']['order_id']), []).append(job)
+        
+        assigned, unassigned = dispatch_ready_orders(list(jobs_by_order))
+        waiting = set(unassigned)
+        
+        cur = mysql.connection.cursor()
+        # Orders dispatch skipped because the restaurant has no location
+        skipped = set(jobs_by_order) - waiting - {order_id for order_id, _ in assigned}
+        unlocated = orders_without_location(cur, skipped) if skipped else set()
+        
+        for order_id, order_jobs in jobs_by_order.items():
+            # The same order may have been queued more than once
+            job, duplicates = order_jobs[0], order_jobs[1:]
+            for duplicate in duplicates:
+                job_queue.complete(duplicate)
+            
+            if order_id in unlocated:
+                add_order_tracking(cur, order_id, 'ready',
+                                   'Restaurant location not available. Please assign a delivery agent manually')
+                mysql.connection.commit()
+                job_queue.fail(job, 'Restaurant location not available')
+            # Assigned now, or no longer waiting (assigned by hand, cancelled ...)
+            elif order_id not in waiting:
+                job_queue.complete(job)
+            elif job['attempts'] >= app.config['JOB_MAX_ATTEMPTS']:
+                add_order_tracking(cur, order_id, 'ready',
+                                   'No delivery agent available. Please assign one manually')
+                mysql.connection.commit()
+                job_queue.fail(job, 'No available delivery agents found')
+            else:
+                job_queue.retry(job, 'No available delivery agents found',
+                                retry_delay(job['attempts'],
+                                            app.config['JOB_RETRY_BASE_SECONDS'],
+                                            app.config['JOB_RETRY_MAX_SECONDS']))
+        cur.close()
+
+def orders_without_location(cur, order_ids):
+    """
+    Which of these ready, unassigned orders come from a restaurant with no
+    location, so dispatch can never match them
+    """
+    cur.execute("""
+        SELECT o.id
+        FROM orders o
+        JOIN sellers s ON o.seller_id = s.id
+        WHERE o.id IN ({})
+        AND o.order_status = 'ready'
+        AND o.delivery_agent_id IS NULL
+        AND (s.latitude IS NULL OR s.longitude IS NULL)
+    """.format(', '.join(['%s'] * len(order_ids))), list(order_ids))
+    return {row['id'] for row in cur.fetchall()}
+
+def run_job_worker(stop_event, worker_id):
+    work(job_queue, [ASSIGN_DELIVERY_JOB], handle_assignment_jobs, worker_id, stop_event,
+         batch_size=app.config['DISPATCH_BATCH_SIZE'],
+         poll_interval=app.config['JOB_POLL_SECONDS'],
+         stale_after=app.config['JOB_STALE_SECONDS'],
+         max_attempts=app.config['JOB_MAX_ATTEMPTS'])
+
+_local_worker = None
+_local_worker_lock = threading.Lock()
+
+def start_local_worker():
+    """
+    Start the in-process worker thread for the memory job queue
+    """
+    global _local_worker
+    with _local_worker_lock:
+        if _local_worker is None or not _local_worker.is_alive():
+            _local_worker = threading.Thread(
+                target=run_job_worker,
+                args=(threading.Event(), f'local:{os.getpid()}'),
+                daemon=True
+            )
+            _local_worker.start()
+
+AGENT_UNAVAILABLE = "Delivery agent is not available"
+AUTO_ASSIGN_ATTEMPTS = 3
+
+def claim_order(cur, order_id, agent_id, status='assigned'):
+    """
+    Atomically give a ready, unassigned order to an available agent.
+    The order and the agent are each claimed with a conditional UPDATE, so of
+    any number of concurrent claims on either exactly one succeeds; a claim
+    that loses a race is rolled back to its savepoint. The caller commits.
+    Returns None on success, otherwise why the claim failed
+    """
+    cur.execute("SAVEPOINT claim_order")
     
-    # Assign agent to order
+    # Agent earns a 15% commission
     cur.execute("""
         UPDATE orders 
         SET delivery_agent_id = %s, 
-            order_status = 'assigned',
-            delivery_commission = final_amount * 0.15  -- 15% commission
-        WHERE id = %s
-    """, (agent['id'], order_id))
+            order_status = %s,
+            delivery_commission = final_amount * 0.15
+        WHERE id = %s AND delivery_agent_id IS NULL AND order_status = 'ready'
+    """, (agent_id, status, order_id))
+    
+    if cur.rowcount != 1:
+        cur.execute("ROLLBACK TO SAVEPOINT claim_order")
+        # A plain SELECT would read the transaction's snapshot, which can predate
+        # the claim that beat this one; a locking read sees the latest commit
+        cur.execute("SELECT order_status, delivery_agent_id FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+        order = cur.fetchone()
+        if not order:
+            return "Order not found"
+        if order['delivery_agent_id']:
+            return "Order already assigned"
+        return "Order not ready for delivery"
     
-    # Mark agent as unavailable
     cur.execute("""
         UPDATE delivery_agent_availability 
         SET is_available = FALSE 
-        WHERE delivery_agent_id = %s
-    """, (agent['id'],))
+        WHERE delivery_agent_id = %s AND is_available = TRUE
+    """, (agent_id,))
     
-    # Add tracking entry
+    if cur.rowcount != 1:
+        cur.execute("ROLLBACK TO SAVEPOINT claim_order")
+        return AGENT_UNAVAILABLE
+    
+    record_agent_assignment(cur, agent_id)
+    record_order_status_change(cur, order_id, 'ready', status)
+    return None
+
+def record_agent_assignment(cur, agent_id):
+    """
+    Count a newly assigned order in the agent's performance stats
+    """
     cur.execute("""
-        INSERT INTO order_tracking (order_id, status, notes)
-        VALUES (%s, 'assigned', 'Delivery agent %s assigned to order')
-    """, (order_id, agent['full_name']))
+        INSERT INTO delivery_agent_stats (delivery_agent_id, total_orders)
+        VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE total_orders = total_orders + 1
+    """, (agent_id,))
+
+def record_agent_delivery(cur, agent_id, order_id):
+    """
+    Count a completed delivery and its duration in the agent's performance stats
+    """
+    cur.execute("""
+        INSERT INTO delivery_agent_stats
+        (delivery_agent_id, total_orders, successful_deliveries, total_delivery_minutes)
+        SELECT %s, 1, 1, TIMESTAMPDIFF(MINUTE, o.created_at, CURRENT_TIMESTAMP)
+        FROM orders o
+        WHERE o.id = %s
+        ON DUPLICATE KEY UPDATE
+        successful_deliveries = successful_deliveries + 1,
+        total_delivery_minutes = total_delivery_minutes + VALUES(total_delivery_minutes)
+    """, (agent_id, order_id))
+
+def auto_assign_delivery_agent(order_id):
+    """
+    Automatically assign delivery agent to an order
+    """
+    cur = mysql.connection.cursor()
+    try:
+        # Get order details including restaurant location
+        cur.execute("""
+            SELECT o.*, s.latitude, s.longitude
+            FROM orders o
+            JOIN sellers s ON o.seller_id = s.id
+            WHERE o.id = %s
+        """, (order_id,))
+        
+        order = cur.fetchone()
+        
+        if not order or not order['latitude'] or not order['longitude']:
+            return False, "Restaurant location not available"
+        
+        for _ in range(AUTO_ASSIGN_ATTEMPTS):
+            # Find nearest available agent
+            agent = find_nearest_delivery_agent(
+                order['latitude'], 
+                order['longitude']
+            )
+            
+            if not agent:
+                mysql.connection.rollback()
+                return False, "No available delivery agents found"
+            
+            # Assign agent to order
+            error = claim_order(cur, order_id, agent['id'])
+            
+            if not error:
+                break
+            
+            if error != AGENT_UNAVAILABLE:
+                mysql.connection.rollback()
+                return False, error
+            
+            # Another assignment took this agent first; try the next best one
+            agent_index.set_available(agent['id'], False)
+        else:
+            mysql.connection.rollback()
+            return False, "No available delivery agents found"
+        
+        # Add tracking entry
+        add_order_tracking(cur, order_id, 'assigned',
+                           f"Delivery agent {agent['full_name']} assigned to order")
+        
+        mysql.connection.commit()
+    finally:
+        cur.close()
     
-    mysql.connection.commit()
-    cur.close()
+    agent_index.set_available(agent['id'], False)
     
     return True, f"Order assigned to {agent['full_name']}"
 
@@ -1997,44 +3619,329 @@ def manual_assign_delivery_agent(order_id, agent_id):
     Manually assign specific delivery agent to an order
     """
     cur = mysql.connection.cursor()
+    try:
+        # Assign agent to order
+        error = claim_order(cur, order_id, agent_id)
+        
+        if error:
+            mysql.connection.rollback()
+            return False, error
+        
+        # Add tracking entry
+        add_order_tracking(cur, order_id, 'assigned', 'Delivery agent manually assigned to order')
+        
+        mysql.connection.commit()
+    finally:
+        cur.close()
     
-    # Check if agent is available
-    cur.execute("""
-        SELECT is_available FROM delivery_agent_availability 
-        WHERE delivery_agent_id = %s
-    """, (agent_id,))
-    
-    availability = cur.fetchone()
-    
-    if not availability or not availability['is_available']:
-        return False, "Delivery agent is not available"
+    agent_index.set_available(agent_id, False)
     
-    # Assign agent to order
+    return True, "Delivery agent assigned successfully"
+
+# Maintenance Commands
+@app.cli.command('rebuild-order-status')
+def rebuild_order_status():
+    """
+    Backfill or repair order_latest_status from the order_tracking history
+    Usage: flask --app app rebuild-order-status
+    """
+    cur = mysql.connection.cursor()
+
     cur.execute("""
-        UPDATE orders 
-        SET delivery_agent_id = %s, 
-            order_status = 'assigned',
-            delivery_commission = final_amount * 0.15
-        WHERE id = %s
-    """, (agent_id, order_id))
-    
-    # Mark agent as unavailable
+        INSERT INTO order_latest_status (order_id, tracking_id, status)
+        SELECT ot.order_id, ot.id, ot.status
+        FROM order_tracking ot
+        JOIN (
+            SELECT order_id, MAX(id) as tracking_id
+            FROM order_tracking
+            GROUP BY order_id
+        ) latest ON latest.tracking_id = ot.id
+        ON DUPLICATE KEY UPDATE
+        status = VALUES(status),
+        tracking_id = VALUES(tracking_id)
+    """)
+    synced = cur.rowcount
+
+    # Drop projections for orders that no longer have any tracking history
     cur.execute("""
-        UPDATE delivery_agent_availability 
-        SET is_available = FALSE 
-        WHERE delivery_agent_id = %s
-    """, (agent_id,))
-    
-    # Add tracking entry
+        DELETE ols FROM order_latest_status ols
+        LEFT JOIN order_tracking ot ON ot.order_id = ols.order_id
+        WHERE ot.id IS NULL
+    """)
+    removed = cur.rowcount
+
+    mysql.connection.commit()
+    cur.close()
+
+    print(f'order_latest_status rebuilt ({synced} rows affected, {removed} stale rows removed)')
+
+@app.cli.command('rebuild-agent-stats')
+def rebuild_agent_stats():
+    """
+    Recompute delivery_agent_stats from the orders table
+    Usage: flask --app app rebuild-agent-stats
+    """
+    cur = mysql.connection.cursor()
+
     cur.execute("""
-        INSERT INTO order_tracking (order_id, status, notes)
-        VALUES (%s, 'assigned', 'Delivery agent manually assigned to order')
-    """, (order_id,))
-    
+        UPDATE delivery_agent_stats
+        SET total_orders = 0, successful_deliveries = 0, total_delivery_minutes = 0
+    """)
+
+    cur.execute("""
+        INSERT INTO delivery_agent_stats
+        (delivery_agent_id, total_orders, successful_deliveries, total_delivery_minutes)
+        SELECT delivery_agent_id,
+               COUNT(*),
+               SUM(CASE WHEN order_status = 'delivered' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN order_status = 'delivered'
+                        THEN TIMESTAMPDIFF(MINUTE, created_at, updated_at) ELSE 0 END)
+        FROM orders
+        WHERE delivery_agent_id IS NOT NULL
+        GROUP BY delivery_agent_id
+        ON DUPLICATE KEY UPDATE
+        total_orders = VALUES(total_orders),
+        successful_deliveries = VALUES(successful_deliveries),
+        total_delivery_minutes = VALUES(total_delivery_minutes)
+    """)
+
     mysql.connection.commit()
     cur.close()
+
+    print('delivery_agent_stats rebuilt')
+
+@app.cli.command('rebuild-seller-stats')
+def rebuild_seller_stats():
+    """
+    Recompute seller_daily_stats from the orders table
+    Usage: flask --app app rebuild-seller-stats
+    """
+    cur = mysql.connection.cursor()
+
+    cur.execute("DELETE FROM seller_daily_stats")
+
+    cur.execute("""
+        INSERT INTO seller_daily_stats
+        (seller_id, stat_date, order_count, revenue, {columns})
+        SELECT seller_id, DATE(created_at), COUNT(*), SUM(final_amount), {counts}
+        FROM orders
+        GROUP BY seller_id, DATE(created_at)
+    """.format(
+        columns=', '.join(f'{status}_count' for status in ORDER_STATUSES),
+        counts=', '.join(f"SUM(order_status = '{status}')" for status in ORDER_STATUSES)
+    ))
+    rows = cur.rowcount
+
+    mysql.connection.commit()
+    cur.close()
+
+    print(f'seller_daily_stats rebuilt ({rows} seller days)')
+
+@app.cli.command('rebuild-platform-stats')
+def rebuild_platform_stats():
+    """
+    Recompute platform_counters, platform_daily_stats and seller lifetime totals
+    Usage: flask --app app rebuild-platform-stats
+    """
+    cur = mysql.connection.cursor()
+
+    cur.execute("DELETE FROM platform_counters")
+    cur.execute("""
+        INSERT INTO platform_counters (name, slot, value)
+        SELECT CONCAT('users_', user_type), 0, COUNT(*) FROM users GROUP BY user_type
+    """)
+    cur.execute("""
+        INSERT INTO platform_counters (name, slot, value)
+        SELECT 'orders_total', 0, COUNT(*) FROM orders
+    """)
+    cur.execute("""
+        INSERT INTO platform_counters (name, slot, value)
+        SELECT CONCAT('orders_', order_status), 0, COUNT(*) FROM orders GROUP BY order_status
+    """)
+
+    cur.execute("DELETE FROM platform_daily_stats")
+    cur.execute("""
+        INSERT INTO platform_daily_stats (stat_date, slot, order_count, revenue)
+        SELECT DATE(created_at), 0, COUNT(*), SUM(final_amount)
+        FROM orders
+        GROUP BY DATE(created_at)
+    """)
+    cur.execute("""
+        INSERT INTO platform_daily_stats (stat_date, slot, new_users)
+        SELECT DATE(created_at), 0, COUNT(*)
+        FROM users
+        GROUP BY DATE(created_at)
+        ON DUPLICATE KEY UPDATE new_users = VALUES(new_users)
+    """)
+
+    cur.execute("""
+        UPDATE sellers s
+        LEFT JOIN (
+            SELECT seller_id, COUNT(*) as order_count, SUM(final_amount) as revenue
+            FROM orders
+            GROUP BY seller_id
+        ) totals ON totals.seller_id = s.id
+        SET s.total_orders = COALESCE(totals.order_count, 0),
+            s.total_revenue = COALESCE(totals.revenue, 0)
+    """)
+
+    mysql.connection.commit()
+    cur.close()
+
+    print('platform stats rebuilt')
+
+@app.cli.command('reconcile-ratings')
+def reconcile_ratings():
+    """
+    Recompute seller and food item rating totals from reviews, and seller menu counts
+    Usage: flask --app app reconcile-ratings
+    """
+    cur = mysql.connection.cursor()
+
+    # Every rated review of a seller counts, whatever its review_type, as
+    # AVG(reviews.rating) per seller did
+    for table, key in (('sellers', 'seller_id'), ('food_items', 'food_item_id')):
+        cur.execute("""
+            UPDATE {table} t
+            LEFT JOIN (
+                SELECT {key} as id, SUM(rating) as rating_sum, COUNT(rating) as rating_count
+                FROM reviews
+                WHERE {key} IS NOT NULL AND rating IS NOT NULL
+                GROUP BY {key}
+            ) r ON r.id = t.id
+            SET t.rating_sum = COALESCE(r.rating_sum, 0),
+                t.rating_count = COALESCE(r.rating_count, 0),
+                t.rating = COALESCE(ROUND(r.rating_sum / r.rating_count, 2), 0)
+        """.format(table=table, key=key))
+        print(f'{table} ratings reconciled ({cur.rowcount} rows updated)')
+
+    cur.execute("""
+        UPDATE sellers s
+        SET s.menu_item_count = (
+            SELECT COUNT(*) FROM food_items fi WHERE fi.seller_id = s.id AND fi.is_available = TRUE
+        )
+    """)
+    print(f'seller menu counts reconciled ({cur.rowcount} rows updated)')
+
+    mysql.connection.commit()
+    cur.close()
+
+    cache.invalidate('restaurants')
+
+@app.cli.command('purge-checkout-keys')
+def purge_checkout_keys():
+    """
+    Delete checkout idempotency keys older than CHECKOUT_KEY_TTL_HOURS
+    Usage: flask --app app purge-checkout-keys
+    """
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        DELETE FROM checkout_requests
+        WHERE created_at < NOW() - INTERVAL %s HOUR
+    """, (app.config['CHECKOUT_KEY_TTL_HOURS'],))
+    print(f'{cur.rowcount} checkout keys purged')
+    mysql.connection.commit()
+    cur.close()
+
+@app.cli.command('purge-search-changes')
+def purge_search_changes():
+    """
+    Delete search index changes older than SEARCH_CHANGES_TTL_HOURS; every
+    worker has applied them (or rebuilds its index) by then
+    Usage: flask --app app purge-search-changes
+    """
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        DELETE FROM search_changes
+        WHERE created_at < NOW() - INTERVAL %s HOUR
+    """, (app.config['SEARCH_CHANGES_TTL_HOURS'],))
+    print(f'{cur.rowcount} search changes purged')
+    mysql.connection.commit()
+    cur.close()
+
+@app.cli.command('serve-events')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', type=int, default=5001)
+@click.option('--max-streams', type=int, default=10000, help='Open streams this process accepts.')
+def serve_events_command(host, port, max_streams):
+    """
+    Serve the order event streams (/events/orders) from one asyncio process,
+    so open pages do not each hold a web server thread. Route /events/ to it
+    from the reverse proxy in front of the app and set EVENTS_URL.
+    Usage: flask --app app serve-events [--port 5001] [--max-streams 10000]
+    """
+    order_events.max_subscribers = max_streams
+    start_event_tailer()
+    server = EventStreamServer(order_events, session_event_topics,
+                               keepalive=app.config['EVENTS_KEEPALIVE_SECONDS'])
+    print(f'Serving order events on http://{host}:{port}/events/orders')
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('dispatch')
+@click.option('--once', is_flag=True, help='Run a single dispatch round and exit.')
+@click.option('--window', type=float, default=None,
+              help='Seconds to collect ready orders between rounds (default DISPATCH_WINDOW_SECONDS).')
+def dispatch_command(once, window):
+    """
+    Batch dispatcher: every window, match all ready orders to available agents at once.
+    The worker handles queued orders; this sweeps any ready order without a job.
+    Usage: flask --app app dispatch [--once] [--window 5]
+    """
+    window = window if window is not None else app.config['DISPATCH_WINDOW_SECONDS']
     
-    return True, "Delivery agent assigned successfully"
+    while True:
+        started = time.monotonic()
+        assigned, unassigned = dispatch_ready_orders()
+        elapsed_ms = (time.monotonic() - started) * 1000
+        
+        if assigned or unassigned:
+            print(f'[{datetime.datetime.now():%H:%M:%S}] assigned {len(assigned)}, '
+                  f'waiting {len(unassigned)} ({elapsed_ms:.1f} ms)')
+        
+        # Release the pooled connection between rounds
+        mysql.release_connection()
+        
+        if once:
+            break
+        time.sleep(max(window - (time.monotonic() - started), 0))
+
+@app.cli.command('worker')
+@click.option('--threads', type=int, default=1, help='Worker threads in this process.')
+def worker_command(threads):
+    """
+    Background worker: claim queued auto-assignment jobs and dispatch them
+    Usage: flask --app app worker [--threads 2]
+    Run as many as needed; workers share the jobs table without claiming the same job twice.
+    """
+    if isinstance(job_queue, MemoryJobQueue):
+        raise click.ClickException('JOB_QUEUE_BACKEND is "memory"; jobs run inside the web process')
+    
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    
+    workers = [
+        threading.Thread(target=run_job_worker,
+                         args=(stop, f'{socket.gethostname()}:{os.getpid()}:{n}'),
+                         daemon=True)
+        for n in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    print(f'Worker started with {threads} thread(s)')
+    
+    try:
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+    
+    # Let in-flight batches finish
+    for worker in workers:
+        worker.join()
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,318 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LocalCacheBackend:
+    """
+    In-process LRU cache with per-entry TTL. Each worker process has its own
+    copy. Namespace versions are kept in this process too unless `versions`
+    (e.g. MySQLCacheVersions) is given, in which case invalidations reach
+    every worker; without it other workers see a change only once their
+    entries expire.
+    """
+
+    def __init__(self, max_entries=2000, versions=None):
+        self.max_entries = max_entries
+        self.versions = versions
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._versions = {}  # kept apart so LRU eviction never resets a version
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self, name):
+        if self.versions is not None:
+            return self.versions.get(name)
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def bump_version(self, name):
+        if self.versions is not None:
+            return self.versions.bump(name)
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+    def size(self):
+        return len(self._entries)
+
+
+class MySQLCacheVersions:
+    """
+    Cache namespace versions shared through the `cache_versions` table, for
+    LocalCacheBackend in several worker processes.
+
+    bump() increments the row and commits at once, so the worker that
+    invalidated sees the new version immediately. Every worker reads the
+    rows changed since its last read at most every `check_interval` seconds
+    (the way CategoryRegistry checks its version), so other workers stop
+    serving the old entries within that interval rather than at their TTL.
+    """
+
+    SLACK_SECONDS = 2  # re-read rows this much older than the newest seen
+
+    def __init__(self, mysql, check_interval=2):
+        self.mysql = mysql
+        self.check_interval = check_interval
+        self._versions = {}
+        self._seen_until = None  # newest updated_at read so far
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        if self._checked_at is None or time.monotonic() - self._checked_at > self.check_interval:
+            self._check()
+        return self._versions.get(name, 0)
+
+    def _check(self):
+        with self._lock:
+            # Another thread is reading the changes; use the versions we have
+            if self._checked_at is not None and time.monotonic() - self._checked_at <= self.check_interval:
+                return
+            self._checked_at = time.monotonic()
+            since = self._seen_until
+
+        query = "SELECT name, version, updated_at FROM cache_versions"
+        params = ()
+        if since is not None:
+            query += " WHERE updated_at >= %s - INTERVAL %s SECOND"
+            params = (since, self.SLACK_SECONDS)
+
+        with self.mysql.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(query, params)
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+
+        with self._lock:
+            for row in rows:
+                self._set(row['name'], row['version'])
+                if self._seen_until is None or row['updated_at'] > self._seen_until:
+                    self._seen_until = row['updated_at']
+
+    def _set(self, name, version):
+        # Versions only move forward
+        if version > self._versions.get(name, 0):
+            self._versions[name] = version
+
+    def bump(self, name):
+        with self.mysql.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+                    ON DUPLICATE KEY UPDATE version = version + 1
+                """, (name,))
+                cur.execute("SELECT version FROM cache_versions WHERE name = %s", (name,))
+                version = cur.fetchone()['version']
+                conn.commit()
+            finally:
+                cur.close()
+
+        with self._lock:
+            self._set(name, version)
+        return version
+
+
+class RedisCacheBackend:
+    """
+    Cache shared by every worker, stored in Redis (needs the `redis`
+    package). Versions are plain keys without a TTL, so an invalidation is
+    seen by all workers at once.
+    """
+
+    def __init__(self, url, prefix='tfo:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0  # Redis does its own eviction
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return MISSING if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(int(ttl), 1))
+
+    def get_version(self, name):
+        return int(self.client.get(self.prefix + 'version:' + name) or 0)
+
+    def bump_version(self, name):
+        return self.client.incr(self.prefix + 'version:' + name)
+
+    def size(self):
+        return None
+
+
+class Cache:
+    """
+    Read-through cache with versioned invalidation.
+
+    Entries live in namespaces (e.g. `menu:12`) and their keys include the
+    namespace's current version. invalidate() bumps the version rather than
+    deleting keys: every older entry becomes unreachable at once and ages
+    out, and a reader that loaded stale rows just before the bump stores
+    them under the old version where nobody reads them.
+    """
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+        self._namespaces = {}  # namespace prefix -> {'hits': n, 'misses': n}
+
+    def _count(self, namespace, outcome, n=1):
+        group = namespace.split(':', 1)[0]
+        with self._lock:
+            self._stats[outcome] += n
+            counts = self._namespaces.setdefault(group, {'hits': 0, 'misses': 0})
+            counts[outcome] += n
+
+    def get_or_load(self, namespace, key, loader, ttl=None):
+        """
+        Return the cached value for `key` in `namespace`, calling `loader()`
+        and caching its result on a miss. Backend failures fall back to the
+        loader so the cache can never take a page down.
+        """
+        try:
+            version = self.backend.get_version(namespace)
+            full_key = f'{namespace}:v{version}:{key}'
+            value = self.backend.get(full_key)
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            return loader()
+
+        if value is not MISSING:
+            self._count(namespace, 'hits')
+            return value
+
+        self._count(namespace, 'misses')
+        value = loader()
+        try:
+            self.backend.set(full_key, value, self.ttl if ttl is None else ttl)
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+        return value
+
+    def get_many(self, namespace, keys, loader, ttl=None):
+        """
+        get_or_load for several keys of one namespace: `loader(missing_keys)`
+        is called once with every miss and returns {key: value}; keys it
+        leaves out are not cached. Returns {key: value} for the keys found.
+        """
+        keys = list(dict.fromkeys(keys))
+        try:
+            version = self.backend.get_version(namespace)
+            values = {key: self.backend.get(f'{namespace}:v{version}:{key}') for key in keys}
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            return loader(keys) if keys else {}
+
+        missing = [key for key, value in values.items() if value is MISSING]
+        self._count(namespace, 'hits', len(keys) - len(missing))
+        self._count(namespace, 'misses', len(missing))
+
+        found = {key: value for key, value in values.items() if value is not MISSING}
+        if missing:
+            loaded = loader(missing)
+            try:
+                for key, value in loaded.items():
+                    self.backend.set(f'{namespace}:v{version}:{key}', value, self.ttl if ttl is None else ttl)
+            except Exception:
+                with self._lock:
+                    self._stats['errors'] += 1
+            found.update(loaded)
+        return found
+
+    def invalidate(self, *namespaces):
+        """
+        Drop everything cached under the given namespaces. Call after the
+        change has been committed.
+        """
+        for namespace in namespaces:
+            try:
+                self.backend.bump_version(namespace)
+            except Exception:
+                with self._lock:
+                    self._stats['errors'] += 1
+                continue
+            with self._lock:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['namespaces'] = {name: dict(counts) for name, counts in self._namespaces.items()}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats['entries'] = self.backend.size()
+        stats['evictions'] = self.backend.evictions
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+class CategoryRegistry:
+    """
+    Process-wide copy of the categories table.
+
+    The table is tiny and almost never changes, so every worker keeps it in
+    memory and only checks a version number in `cache_versions` (bumped by
+    triggers on categories) every few seconds, reloading when it moves.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.checked_at = None
+        self._by_id = {}
+        self._active = ()
+        self._lock = threading.Lock()
+
+    def needs_check(self, interval):
+        return self.checked_at is None or time.monotonic() - self.checked_at > interval
+
+    def mark_checked(self):
+        self.checked_at = time.monotonic()
+
+    def load(self, rows, version):
+        by_id = {row['id']: row for row in rows}
+        active = tuple(row for row in rows if row['is_active'])
+        with self._lock:
+            self._by_id, self._active = by_id, active
+            self.version = version
+            self.checked_at = time.monotonic()
+
+    def active(self):
+        return self._active
+
+    def name(self, category_id):
+        category = self._by_id.get(category_id)
+        return category['name'] if category else None
@@ -0,0 +1,473 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import MySQLdb
+
+
+class LocalCartBackend:
+    """
+    Carts held in this worker process, least recently used dropped first.
+    Only correct when one process serves every request (`python app.py`, or
+    a single gunicorn worker with threads); with several worker processes a
+    customer's next click may land on a worker holding an older copy, so use
+    MySQLCartBackend or RedisCartBackend there.
+    """
+
+    shared = False
+    write_through = False
+
+    def __init__(self, max_carts=10000):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()  # customer_id -> {food_item_id: quantity}
+        self._lock = threading.Lock()
+
+    def get(self, customer_id):
+        with self._lock:
+            items = self._carts.get(customer_id)
+            if items is None:
+                return None
+            self._carts.move_to_end(customer_id)
+            return dict(items)
+
+    def put(self, customer_id, items):
+        with self._lock:
+            self._carts[customer_id] = dict(items)
+            self._carts.move_to_end(customer_id)
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def add(self, customer_id, food_item_id, quantity):
+        with self._lock:
+            items = self._carts.get(customer_id)
+            if items is None:
+                return None
+            items[food_item_id] = max(items.get(food_item_id, 0) + quantity, 0)
+            if not items[food_item_id]:
+                del items[food_item_id]
+                return 0
+            return items[food_item_id]
+
+    def set(self, customer_id, food_item_id, quantity):
+        with self._lock:
+            items = self._carts.get(customer_id)
+            if items is None:
+                return None
+            if quantity > 0:
+                items[food_item_id] = quantity
+            else:
+                items.pop(food_item_id, None)
+            return quantity
+
+    def count(self, customer_id):
+        with self._lock:
+            items = self._carts.get(customer_id)
+            return None if items is None else len(items)
+
+    def drop(self, customer_id):
+        with self._lock:
+            self._carts.pop(customer_id, None)
+
+
+class RedisCartBackend:
+    """
+    Carts shared by every worker, one Redis hash per customer (needs the
+    `redis` package). Field 0 marks a cart as loaded, so a missing key always
+    means "read it from MySQL" rather than "empty".
+    """
+
+    shared = True
+    write_through = False
+
+    # Change a quantity only if the cart is loaded; drop lines that reach zero
+    CHANGE_SCRIPT = """
+        if redis.call('exists', KEYS[1]) == 0 then return nil end
+        local quantity
+        if ARGV[3] == 'add' then
+            quantity = redis.call('hincrby', KEYS[1], ARGV[1], ARGV[2])
+        else
+            quantity = tonumber(ARGV[2])
+            redis.call('hset', KEYS[1], ARGV[1], quantity)
+        end
+        if quantity <= 0 then
+            redis.call('hdel', KEYS[1], ARGV[1])
+            quantity = 0
+        end
+        redis.call('expire', KEYS[1], ARGV[4])
+        return quantity
+    """
+
+    def __init__(self, url, prefix='tfo:cart:', ttl=86400):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._change = self.client.register_script(self.CHANGE_SCRIPT)
+
+    def get(self, customer_id):
+        items = self.client.hgetall(f'{self.prefix}{customer_id}')
+        if not items:
+            return None
+        return {int(item_id): int(quantity) for item_id, quantity in items.items() if int(item_id)}
+
+    def put(self, customer_id, items):
+        key = f'{self.prefix}{customer_id}'
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping={0: 1, **items})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def add(self, customer_id, food_item_id, quantity):
+        return self._change(keys=[f'{self.prefix}{customer_id}'],
+                            args=[food_item_id, quantity, 'add', self.ttl])
+
+    def set(self, customer_id, food_item_id, quantity):
+        return self._change(keys=[f'{self.prefix}{customer_id}'],
+                            args=[food_item_id, quantity, 'set', self.ttl])
+
+    def count(self, customer_id):
+        size = self.client.hlen(f'{self.prefix}{customer_id}')
+        return size - 1 if size else None
+
+    def drop(self, customer_id):
+        self.client.delete(f'{self.prefix}{customer_id}')
+
+
+class MySQLCartBackend:
+    """
+    Carts read from and written to the `cart` table on every call, through
+    connections borrowed from `mysql.pool` and committed at once. Every
+    worker process sees the same cart without a cache server; the cost is a
+    database round trip per cart access, as before the write-behind store.
+    Nothing is pending, so CartService skips its flush for this backend.
+    """
+
+    shared = True
+    write_through = True
+
+    def __init__(self, mysql):
+        self.mysql = mysql
+
+    @contextmanager
+    def _cursor(self):
+        with self.mysql.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+                conn.commit()
+            finally:
+                cur.close()
+
+    def get(self, customer_id):
+        with self._cursor() as cur:
+            cur.execute("SELECT food_item_id, quantity FROM cart WHERE customer_id = %s", (customer_id,))
+            return {row['food_item_id']: row['quantity'] for row in cur.fetchall()}
+
+    def put(self, customer_id, items):
+        with self._cursor() as cur:
+            cur.execute("DELETE FROM cart WHERE customer_id = %s", (customer_id,))
+            if items:
+                cur.executemany("""
+                    INSERT INTO cart (customer_id, food_item_id, quantity) VALUES (%s, %s, %s)
+                """, [(customer_id, food_item_id, quantity) for food_item_id, quantity in sorted(items.items())])
+
+    def add(self, customer_id, food_item_id, quantity):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT quantity FROM cart WHERE customer_id = %s AND food_item_id = %s FOR UPDATE
+            """, (customer_id, food_item_id))
+            row = cur.fetchone()
+            new_quantity = max((row['quantity'] if row else 0) + quantity, 0)
+            self._write(cur, customer_id, food_item_id, new_quantity)
+        return new_quantity
+
+    def set(self, customer_id, food_item_id, quantity):
+        with self._cursor() as cur:
+            self._write(cur, customer_id, food_item_id, quantity)
+        return quantity
+
+    @staticmethod
+    def _write(cur, customer_id, food_item_id, quantity):
+        if quantity > 0:
+            cur.execute("""
+                INSERT INTO cart (customer_id, food_item_id, quantity) VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+            """, (customer_id, food_item_id, quantity))
+        else:
+            cur.execute("DELETE FROM cart WHERE customer_id = %s AND food_item_id = %s",
+                        (customer_id, food_item_id))
+
+    def count(self, customer_id):
+        with self._cursor() as cur:
+            cur.execute("SELECT COUNT(*) as count FROM cart WHERE customer_id = %s", (customer_id,))
+            return cur.fetchone()['count']
+
+    def drop(self, customer_id):
+        # The table is the store; there is no copy to drop
+        pass
+
+
+class CartService:
+    """
+    Customer carts served from a fast store with write-behind to MySQL.
+
+    A cart is read from the `cart` table once (through `load_cart(customer_id)`,
+    which returns {food_item_id: quantity}), then kept in the backend;
+    adding, changing and counting items touch only the backend. Changed
+    lines are remembered as pending and written to the table by flush(),
+    which a background thread calls every few seconds and checkout calls
+    for its customer before reading the table. Pending lines are applied
+    over the table when a cart is reloaded, so evicting a cart never loses
+    a change that has not been written yet.
+
+    Writers hold locked() for the customers they write, from flush() until
+    after commit, so the background flush can never write back lines that a
+    checkout has just ordered and deleted.
+
+    With a shared backend every worker keeps its own pending lines, so the
+    stored cart, not this worker's pending quantity, is what gets written:
+    checkout writes the customer's whole stored cart (sync()), and a flush
+    drops pending lines whose cart is no longer stored (checked out, or
+    removed with the customer). Both lock the customers' users rows first,
+    which serializes them across workers.
+
+    A write-through backend (MySQLCartBackend) is the cart table itself:
+    changes are never pending and sync() has nothing to write.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, backend, load_cart, max_quantity=99):
+        self.backend = backend
+        self.load_cart = load_cart
+        self.max_quantity = max_quantity
+        self._pending = {}  # (customer_id, food_item_id) -> quantity not yet in the cart table
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._stats = {'loads': 0, 'changes': 0, 'flushes': 0, 'rows_written': 0, 'flush_errors': 0}
+
+    def _load(self, customer_id):
+        items = dict(self.load_cart(customer_id))
+        with self._lock:
+            self._stats['loads'] += 1
+            for (pending_customer, food_item_id), quantity in list(self._pending.items()):
+                if pending_customer != customer_id:
+                    continue
+                if self.backend.shared:
+                    # The shared cart was dropped; what was pending for it is obsolete
+                    del self._pending[(pending_customer, food_item_id)]
+                else:
+                    items[food_item_id] = quantity
+        items = {food_item_id: quantity for food_item_id, quantity in items.items() if quantity > 0}
+        self.backend.put(customer_id, items)
+        return items
+
+    def _changed(self, customer_id, food_item_id, quantity):
+        with self._lock:
+            if not self.backend.write_through:
+                self._pending[(customer_id, food_item_id)] = quantity
+            self._stats['changes'] += 1
+
+    def items(self, customer_id):
+        """
+        {food_item_id: quantity} for the customer's cart
+        """
+        items = self.backend.get(customer_id)
+        return self._load(customer_id) if items is None else items
+
+    def count(self, customer_id):
+        """
+        Number of distinct items in the cart
+        """
+        count = self.backend.count(customer_id)
+        return len(self._load(customer_id)) if count is None else count
+
+    def add(self, customer_id, food_item_id, quantity):
+        """
+        Add `quantity` of an item (negative to remove some); returns the new
+        quantity, at most max_quantity
+        """
+        new_quantity = self.backend.add(customer_id, food_item_id, quantity)
+        if new_quantity is None:
+            self._load(customer_id)
+            new_quantity = self.backend.add(customer_id, food_item_id, quantity)
+        if new_quantity > self.max_quantity:
+            new_quantity = self.max_quantity
+            self.backend.set(customer_id, food_item_id, new_quantity)
+        self._changed(customer_id, food_item_id, new_quantity)
+        return new_quantity
+
+    def set_quantity(self, customer_id, food_item_id, quantity):
+        """
+        Set an item's quantity, at most max_quantity; zero or less removes it
+        """
+        quantity = min(max(quantity, 0), self.max_quantity)
+        if self.backend.set(customer_id, food_item_id, quantity) is None:
+            self._load(customer_id)
+            self.backend.set(customer_id, food_item_id, quantity)
+        self._changed(customer_id, food_item_id, quantity)
+        return quantity
+
+    def forget(self, customer_id):
+        """
+        Drop the stored cart so the next access reloads it from the table,
+        e.g. after checkout emptied it
+        """
+        self.backend.drop(customer_id)
+
+    def restore(self, customer_id, items):
+        """
+        Put back a stored cart taken by sync() when the checkout did not commit
+        """
+        if items is not None:
+            self.backend.put(customer_id, items)
+
+    def pending_customers(self):
+        with self._lock:
+            return {customer_id for customer_id, _ in self._pending}
+
+    @contextmanager
+    def locked(self, customer_ids):
+        """
+        Hold the write locks of these customers (striped, taken in order so
+        two holders cannot deadlock)
+        """
+        stripes = sorted({customer_id % self.LOCK_STRIPES for customer_id in customer_ids})
+        for stripe in stripes:
+            self._stripes[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._stripes[stripe].release()
+
+    def flush(self, cur, customer_ids):
+        """
+        Write the pending lines of `customer_ids` to the cart table through
+        `cur`, holding locked() for them. The caller commits and then passes
+        the result to confirm(); if the transaction fails the lines stay
+        pending for the next flush. Quantities are written as absolute
+        values, so writing a line twice can never double it.
+        """
+        customer_ids = set(customer_ids)
+        with self._lock:
+            batch = {key: quantity for key, quantity in self._pending.items() if key[0] in customer_ids}
+        if not batch:
+            return batch
+
+        if self.backend.shared:
+            self._lock_customers(cur, {key[0] for key in batch})
+        # A shared backend may hold a newer quantity than this worker's pending one
+        current = {pending_customer: self.backend.get(pending_customer)
+                   for pending_customer in {key[0] for key in batch}}
+        upserts, deletes = [], []
+        for (pending_customer, food_item_id), quantity in batch.items():
+            items = current[pending_customer]
+            if items is not None:
+                quantity = items.get(food_item_id, 0)
+            elif self.backend.shared:
+                # Checked out (or removed) since the change; confirm() forgets the line
+                continue
+            if quantity > 0:
+                upserts.append((pending_customer, food_item_id, quantity))
+            else:
+                deletes.append((pending_customer, food_item_id))
+
+        try:
+            if upserts:
+                self._upsert(cur, upserts)
+            if deletes:
+                cur.execute("""
+                    DELETE FROM cart WHERE (customer_id, food_item_id) IN ({})
+                """.format(', '.join(['(%s, %s)'] * len(deletes))),
+                            [value for line in deletes for value in line])
+        except MySQLdb.Error:
+            with self._lock:
+                self._stats['flush_errors'] += 1
+            raise
+        return batch
+
+    def sync(self, cur, customer_id):
+        """
+        Make the cart table hold the customer's cart before checkout reads
+        it. Locally that is flush(); with a shared backend the whole stored
+        cart is written, since lines changed on other workers may still be
+        pending there. Returns (batch, stored cart or None): after commit the
+        batch goes to confirm(), and if the checkout fails after forget() the
+        stored cart goes back with restore().
+        """
+        if self.backend.write_through:
+            # Every change is already in the table
+            return {}, None
+        if not self.backend.shared:
+            return self.flush(cur, [customer_id]), None
+
+        self._lock_customers(cur, [customer_id])
+        with self._lock:
+            batch = {key: quantity for key, quantity in self._pending.items() if key[0] == customer_id}
+        items = self.backend.get(customer_id)
+        if items is None:
+            # Not stored, so the table is current and anything pending is obsolete
+            return batch, None
+
+        try:
+            query = "DELETE FROM cart WHERE customer_id = %s"
+            if items:
+                query += " AND food_item_id NOT IN ({})".format(', '.join(['%s'] * len(items)))
+            cur.execute(query, [customer_id, *items])
+            if items:
+                self._upsert(cur, [(customer_id, food_item_id, quantity)
+                                   for food_item_id, quantity in sorted(items.items())])
+        except MySQLdb.Error:
+            with self._lock:
+                self._stats['flush_errors'] += 1
+            raise
+        return batch, items
+
+    @staticmethod
+    def _lock_customers(cur, customer_ids):
+        # Row locks on users, held until commit: one worker at a time writes a customer's cart
+        customer_ids = sorted(customer_ids)
+        cur.execute("""
+            SELECT id FROM users WHERE id IN ({}) ORDER BY id FOR UPDATE
+        """.format(', '.join(['%s'] * len(customer_ids))), customer_ids)
+
+    def confirm(self, batch):
+        """
+        Forget pending lines written by a committed flush(), unless they
+        changed again in the meantime
+        """
+        with self._lock:
+            for key, quantity in batch.items():
+                if self._pending.get(key) == quantity:
+                    del self._pending[key]
+            if batch:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += len(batch)
+
+    def _upsert(self, cur, rows):
+        query = """
+            INSERT INTO cart (customer_id, food_item_id, quantity)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+        """
+        try:
+            # One multi-row statement
+            cur.executemany(query, rows)
+        except (MySQLdb.IntegrityError, MySQLdb.DataError):
+            # A dish deleted since it was added (or a quantity the column
+            # cannot hold); write the others one by one
+            for row in rows:
+                try:
+                    cur.execute(query, row)
+                except (MySQLdb.IntegrityError, MySQLdb.DataError):
+                    pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['backend'] = type(self.backend).__name__
+        return stats
@@ -7,6 +7,57 @@ class Config:
     MYSQL_PASSWORD = ''
     MYSQL_DB = 'tamil_food_ordering'
     MYSQL_CURSORCLASS = 'DictCursor'
+    MYSQL_POOL_SIZE = 5          # idle connections kept per worker process
+    MYSQL_POOL_MAX_OVERFLOW = 10 # extra connections allowed under load
+    MYSQL_POOL_TIMEOUT = 30      # seconds to wait for a free connection
+    MYSQL_POOL_RECYCLE = 3600    # reconnect connections older than this (seconds)
+    MYSQL_POOL_PRE_PING = True   # ping connections before handing them out
+    GEO_INDEX_CELL_KM = 2.0           # grid cell size of the agent location index
+    GEO_INDEX_REFRESH_SECONDS = 30    # reload the index from MySQL this often
+    LOCATION_REPORT_SECONDS = 5       # how often the delivery dashboard posts its batch of positions
+    LOCATION_BATCH_MAX_POINTS = 20    # positions accepted per post
+    LOCATION_FLUSH_SECONDS = 5        # write-behind interval from memory to delivery_agent_availability
+    LOCATION_MAX_AGE_SECONDS = 3600   # positions older than this are ignored and dropped from memory
+    ASSIGNMENT_CANDIDATES = 25        # nearest agents scored per auto-assignment
+    ASSIGNMENT_MAX_RADIUS_KM = None   # None = widen the search until candidates are found
+    AUTO_ASSIGN_MODE = 'queue'        # 'queue': background worker (flask worker); 'sync': assign in mark_order_ready
+    DISPATCH_WINDOW_SECONDS = 5       # how long the dispatcher collects ready orders per round
+    DISPATCH_BATCH_SIZE = 200         # max orders matched per round
+    JOB_QUEUE_BACKEND = 'mysql'       # 'mysql': durable jobs table; 'memory': in-process worker for local dev
+    JOB_POLL_SECONDS = 1.0            # worker sleep when the queue is empty
+    JOB_STALE_SECONDS = 300           # requeue running jobs whose worker died
+    JOB_RETRY_BASE_SECONDS = 5        # backoff while no agent is available: 5s, 10s, 20s ...
+    JOB_RETRY_MAX_SECONDS = 300
+    JOB_MAX_ATTEMPTS = 30             # then leave the order for manual assignment
+    AVAILABLE_ORDERS_RADIUS_KM = 10       # default radius of the agent's available orders feed
+    AVAILABLE_ORDERS_MAX_RADIUS_KM = 50
+    AVAILABLE_ORDERS_PAGE_SIZE = 20
+    AVAILABLE_ORDERS_MAX_PAGE_SIZE = 100
+    LIST_PAGE_SIZE = 25               # rows per page of the order/user/seller lists
+    LIST_MAX_PAGE_SIZE = 100
+    EXPORT_FETCH_SIZE = 1000          # rows per fetch from the export's server-side cursor
+    CACHE_BACKEND = 'local'           # 'local': per-worker LRU; 'redis': shared by all workers (needs redis)
+    CACHE_REDIS_URL = 'redis://localhost:6379/0'
+    CACHE_TTL_SECONDS = 300           # restaurant listings and menus
+    CACHE_MAX_ENTRIES = 2000          # per worker, local backend only
+    CACHE_VERSION_CHECK_SECONDS = 2   # local backend: how often workers read invalidations made by others
+    CATEGORY_CHECK_SECONDS = 10       # how often workers check whether categories changed
+    SEARCH_CHECK_SECONDS = 5          # how often workers apply menu changes to the search index
+    SEARCH_MAX_CHANGES = 500          # more pending changes than this: rebuild the index instead
+    SEARCH_MAX_RESULTS = 200          # hits considered when ranking restaurants for a search
+    SEARCH_CHANGES_TTL_HOURS = 24     # purge-search-changes deletes applied menu changes older than this
+    CART_BACKEND = 'mysql'            # 'mysql': the cart table, any number of workers; 'redis': shared, written behind; 'local': one process only
+    CART_MAX_CARTS = 10000            # carts kept per worker, local backend only
+    CART_FLUSH_SECONDS = 2            # write-behind interval from the cart store to the cart table
+    CART_MAX_QUANTITY = 99            # most of one item a cart line can hold
+    CHECKOUT_KEY_TTL_HOURS = 24       # purge-checkout-keys drops idempotency keys older than this
+    EVENTS_URL = None                 # None: streams served by this app; else the path routed to `flask serve-events`
+    EVENTS_POLL_SECONDS = 1.0         # how often each process reads new order_tracking rows
+    EVENTS_GAP_SECONDS = 10           # how long a lower tracking id is awaited from a slow transaction
+    EVENTS_MAX_STREAMS = 200          # open streams per process; each holds a thread under the threaded server
+    EVENTS_QUEUE_SIZE = 100           # events a stream may fall behind before it is reset
+    EVENTS_REPLAY_SIZE = 1000         # recent events kept for reconnecting streams
+    EVENTS_KEEPALIVE_SECONDS = 15
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
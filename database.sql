@@ -213,4 +213,365 @@ ADD COLUMN IF NOT EXISTS longitude DECIMAL(11, 8);
 
 -- Add delivery commission rate
 ALTER TABLE orders 
-ADD COLUMN IF NOT EXISTS delivery_commission DECIMAL(10, 2) DEFAULT 0;
\ No newline at end of file
+ADD COLUMN IF NOT EXISTS delivery_commission DECIMAL(10, 2) DEFAULT 0;
+-- Allow the 'assigned' status written by delivery agent assignment
+ALTER TABLE orders
+MODIFY order_status ENUM('pending', 'confirmed', 'preparing', 'ready', 'assigned', 'picked_up', 'on_the_way', 'delivered', 'cancelled') DEFAULT 'pending';
+
+ALTER TABLE order_tracking
+MODIFY status ENUM('pending', 'confirmed', 'preparing', 'ready', 'assigned', 'picked_up', 'on_the_way', 'delivered', 'cancelled') NOT NULL;
+
+-- Latest status per order (maintained by add_order_tracking in app.py)
+CREATE TABLE IF NOT EXISTS order_latest_status (
+    order_id INT PRIMARY KEY,
+    tracking_id INT NOT NULL,
+    status ENUM('pending', 'confirmed', 'preparing', 'ready', 'assigned', 'picked_up', 'on_the_way', 'delivered', 'cancelled') NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
+);
+
+-- Backfill existing orders (same as: flask --app app rebuild-order-status)
+INSERT INTO order_latest_status (order_id, tracking_id, status)
+SELECT ot.order_id, ot.id, ot.status
+FROM order_tracking ot
+JOIN (
+    SELECT order_id, MAX(id) as tracking_id
+    FROM order_tracking
+    GROUP BY order_id
+) latest ON latest.tracking_id = ot.id
+ON DUPLICATE KEY UPDATE
+status = VALUES(status),
+tracking_id = VALUES(tracking_id);
+
+-- Per-agent delivery performance (maintained incrementally by app.py)
+CREATE TABLE IF NOT EXISTS delivery_agent_stats (
+    delivery_agent_id INT PRIMARY KEY,
+    total_orders INT NOT NULL DEFAULT 0,
+    successful_deliveries INT NOT NULL DEFAULT 0,
+    total_delivery_minutes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (delivery_agent_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Backfill from existing orders (same as: flask --app app rebuild-agent-stats)
+INSERT INTO delivery_agent_stats
+(delivery_agent_id, total_orders, successful_deliveries, total_delivery_minutes)
+SELECT delivery_agent_id,
+       COUNT(*),
+       SUM(CASE WHEN order_status = 'delivered' THEN 1 ELSE 0 END),
+       SUM(CASE WHEN order_status = 'delivered'
+                THEN TIMESTAMPDIFF(MINUTE, created_at, updated_at) ELSE 0 END)
+FROM orders
+WHERE delivery_agent_id IS NOT NULL
+GROUP BY delivery_agent_id
+ON DUPLICATE KEY UPDATE
+total_orders = VALUES(total_orders),
+successful_deliveries = VALUES(successful_deliveries),
+total_delivery_minutes = VALUES(total_delivery_minutes);
+
+-- Background jobs (delivery auto-assignment), processed by `flask --app app worker`
+-- Claiming uses SELECT ... FOR UPDATE SKIP LOCKED (MySQL 8.0+)
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    kind VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    status ENUM('pending', 'running', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    run_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    locked_by VARCHAR(100),
+    locked_at DATETIME(3),
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_jobs_claim (status, kind, run_at)
+);
+
+-- Composite indexes matching the app's filter + sort shapes
+-- (checked by: python scripts/check_query_plans.py)
+CREATE INDEX IF NOT EXISTS idx_orders_customer_created ON orders(customer_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_seller_created ON orders(seller_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_agent_created ON orders(delivery_agent_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_agent_status ON orders(delivery_agent_id, order_status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_orders_status_agent ON orders(order_status, delivery_agent_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);
+CREATE INDEX IF NOT EXISTS idx_order_tracking_order_created ON order_tracking(order_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_food_seller_available ON food_items(seller_id, is_available, name);
+CREATE INDEX IF NOT EXISTS idx_users_type_created ON users(user_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at);
+
+-- Superseded by the composites above (each is a prefix of one of them)
+DROP INDEX IF EXISTS idx_orders_customer ON orders;
+DROP INDEX IF EXISTS idx_orders_seller ON orders;
+DROP INDEX IF EXISTS idx_orders_delivery ON orders;
+DROP INDEX IF EXISTS idx_orders_status ON orders;
+DROP INDEX IF EXISTS idx_order_tracking_order ON order_tracking;
+DROP INDEX IF EXISTS idx_food_seller ON food_items;
+
+-- Per-seller daily order rollup for dashboards and analytics (maintained incrementally by app.py)
+CREATE TABLE IF NOT EXISTS seller_daily_stats (
+    seller_id INT NOT NULL,
+    stat_date DATE NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    pending_count INT NOT NULL DEFAULT 0,
+    confirmed_count INT NOT NULL DEFAULT 0,
+    preparing_count INT NOT NULL DEFAULT 0,
+    ready_count INT NOT NULL DEFAULT 0,
+    assigned_count INT NOT NULL DEFAULT 0,
+    picked_up_count INT NOT NULL DEFAULT 0,
+    on_the_way_count INT NOT NULL DEFAULT 0,
+    delivered_count INT NOT NULL DEFAULT 0,
+    cancelled_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (seller_id, stat_date),
+    INDEX idx_seller_daily_stats_date (stat_date),
+    FOREIGN KEY (seller_id) REFERENCES sellers(id) ON DELETE CASCADE
+);
+
+-- Backfill from existing orders (same as: flask --app app rebuild-seller-stats)
+INSERT INTO seller_daily_stats
+(seller_id, stat_date, order_count, revenue, pending_count, confirmed_count, preparing_count,
+ ready_count, assigned_count, picked_up_count, on_the_way_count, delivered_count, cancelled_count)
+SELECT seller_id, DATE(created_at), COUNT(*), SUM(final_amount),
+       SUM(order_status = 'pending'), SUM(order_status = 'confirmed'), SUM(order_status = 'preparing'),
+       SUM(order_status = 'ready'), SUM(order_status = 'assigned'), SUM(order_status = 'picked_up'),
+       SUM(order_status = 'on_the_way'), SUM(order_status = 'delivered'), SUM(order_status = 'cancelled')
+FROM orders
+GROUP BY seller_id, DATE(created_at);
+
+-- Platform metrics for the admin pages (maintained incrementally by app.py).
+-- Counters are spread over slots so concurrent writers rarely share a row; readers sum them.
+CREATE TABLE IF NOT EXISTS platform_counters (
+    name VARCHAR(50) NOT NULL,
+    slot TINYINT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, slot)
+);
+
+CREATE TABLE IF NOT EXISTS platform_daily_stats (
+    stat_date DATE NOT NULL,
+    slot TINYINT NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    new_users INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, slot)
+);
+
+-- Lifetime totals per restaurant
+ALTER TABLE sellers
+ADD COLUMN IF NOT EXISTS total_orders INT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_sellers_total_revenue ON sellers(total_revenue);
+
+-- Backfill (same as: flask --app app rebuild-platform-stats)
+INSERT INTO platform_counters (name, slot, value)
+SELECT CONCAT('users_', user_type), 0, COUNT(*) FROM users GROUP BY user_type;
+
+INSERT INTO platform_counters (name, slot, value)
+SELECT 'orders_total', 0, COUNT(*) FROM orders;
+
+INSERT INTO platform_counters (name, slot, value)
+SELECT CONCAT('orders_', order_status), 0, COUNT(*) FROM orders GROUP BY order_status;
+
+INSERT INTO platform_daily_stats (stat_date, slot, order_count, revenue)
+SELECT DATE(created_at), 0, COUNT(*), SUM(final_amount)
+FROM orders
+GROUP BY DATE(created_at);
+
+INSERT INTO platform_daily_stats (stat_date, slot, new_users)
+SELECT DATE(created_at), 0, COUNT(*)
+FROM users
+GROUP BY DATE(created_at)
+ON DUPLICATE KEY UPDATE new_users = VALUES(new_users);
+
+UPDATE sellers s
+JOIN (
+    SELECT seller_id, COUNT(*) as order_count, SUM(final_amount) as revenue
+    FROM orders
+    GROUP BY seller_id
+) totals ON totals.seller_id = s.id
+SET s.total_orders = totals.order_count,
+    s.total_revenue = totals.revenue;
+
+-- Change counters for data cached in every worker. Workers poll the version
+-- and reload when it moves; triggers keep the categories version current.
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO cache_versions (name) VALUES ('categories');
+
+DROP TRIGGER IF EXISTS categories_version_insert;
+CREATE TRIGGER categories_version_insert AFTER INSERT ON categories FOR EACH ROW
+UPDATE cache_versions SET version = version + 1 WHERE name = 'categories';
+
+DROP TRIGGER IF EXISTS categories_version_update;
+CREATE TRIGGER categories_version_update AFTER UPDATE ON categories FOR EACH ROW
+UPDATE cache_versions SET version = version + 1 WHERE name = 'categories';
+
+DROP TRIGGER IF EXISTS categories_version_delete;
+CREATE TRIGGER categories_version_delete AFTER DELETE ON categories FOR EACH ROW
+UPDATE cache_versions SET version = version + 1 WHERE name = 'categories';
+
+-- Running rating totals (maintained by the reviews triggers below); rating = rating_sum / rating_count
+ALTER TABLE sellers
+ADD COLUMN IF NOT EXISTS rating_sum INT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS rating_count INT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS menu_item_count INT NOT NULL DEFAULT 0;
+
+ALTER TABLE food_items
+ADD COLUMN IF NOT EXISTS rating_sum INT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS rating_count INT NOT NULL DEFAULT 0;
+
+-- Top restaurants: WHERE is_verified = TRUE ORDER BY rating DESC LIMIT 6
+CREATE INDEX IF NOT EXISTS idx_sellers_verified_rating ON sellers(is_verified, rating);
+
+-- Backfill (same as: flask --app app reconcile-ratings)
+UPDATE sellers s
+LEFT JOIN (
+    SELECT seller_id, SUM(rating) as rating_sum, COUNT(rating) as rating_count
+    FROM reviews
+    WHERE seller_id IS NOT NULL AND rating IS NOT NULL
+    GROUP BY seller_id
+) r ON r.seller_id = s.id
+SET s.rating_sum = COALESCE(r.rating_sum, 0),
+    s.rating_count = COALESCE(r.rating_count, 0),
+    s.rating = COALESCE(ROUND(r.rating_sum / r.rating_count, 2), 0);
+
+UPDATE food_items fi
+LEFT JOIN (
+    SELECT food_item_id, SUM(rating) as rating_sum, COUNT(rating) as rating_count
+    FROM reviews
+    WHERE food_item_id IS NOT NULL AND rating IS NOT NULL
+    GROUP BY food_item_id
+) r ON r.food_item_id = fi.id
+SET fi.rating_sum = COALESCE(r.rating_sum, 0),
+    fi.rating_count = COALESCE(r.rating_count, 0),
+    fi.rating = COALESCE(ROUND(r.rating_sum / r.rating_count, 2), 0);
+
+UPDATE sellers s
+SET s.menu_item_count = (
+    SELECT COUNT(*) FROM food_items fi WHERE fi.seller_id = s.id AND fi.is_available = TRUE
+);
+
+-- Every rated review of a seller counts towards its rating, whatever its
+-- review_type, as AVG(reviews.rating) per seller did. SET clauses apply left
+-- to right, so `rating` sees the new totals. Only reviews removed by a foreign
+-- key cascade (which fires no trigger) need flask --app app reconcile-ratings.
+DROP TRIGGER IF EXISTS reviews_seller_rating_insert;
+CREATE TRIGGER reviews_seller_rating_insert AFTER INSERT ON reviews FOR EACH ROW
+UPDATE sellers
+SET rating_sum = rating_sum + NEW.rating,
+    rating_count = rating_count + 1,
+    rating = ROUND(rating_sum / rating_count, 2)
+WHERE id = NEW.seller_id AND NEW.rating IS NOT NULL;
+
+DROP TRIGGER IF EXISTS reviews_item_rating_insert;
+CREATE TRIGGER reviews_item_rating_insert AFTER INSERT ON reviews FOR EACH ROW
+UPDATE food_items
+SET rating_sum = rating_sum + NEW.rating,
+    rating_count = rating_count + 1,
+    rating = ROUND(rating_sum / rating_count, 2)
+WHERE id = NEW.food_item_id AND NEW.rating IS NOT NULL;
+
+DROP TRIGGER IF EXISTS reviews_seller_rating_delete;
+CREATE TRIGGER reviews_seller_rating_delete AFTER DELETE ON reviews FOR EACH ROW
+UPDATE sellers
+SET rating_sum = rating_sum - OLD.rating,
+    rating_count = rating_count - 1,
+    rating = IF(rating_count > 0, ROUND(rating_sum / rating_count, 2), 0)
+WHERE id = OLD.seller_id AND OLD.rating IS NOT NULL;
+
+DROP TRIGGER IF EXISTS reviews_item_rating_delete;
+CREATE TRIGGER reviews_item_rating_delete AFTER DELETE ON reviews FOR EACH ROW
+UPDATE food_items
+SET rating_sum = rating_sum - OLD.rating,
+    rating_count = rating_count - 1,
+    rating = IF(rating_count > 0, ROUND(rating_sum / rating_count, 2), 0)
+WHERE id = OLD.food_item_id AND OLD.rating IS NOT NULL;
+
+-- An edited review takes the OLD row out of its seller's (or dish's) totals
+-- and adds the NEW row, which may belong to another one; either side may
+-- have no rating
+DROP TRIGGER IF EXISTS reviews_seller_rating_update;
+CREATE TRIGGER reviews_seller_rating_update AFTER UPDATE ON reviews FOR EACH ROW
+UPDATE sellers
+SET rating_sum = rating_sum
+        - IF(id = OLD.seller_id AND OLD.rating IS NOT NULL, OLD.rating, 0)
+        + IF(id = NEW.seller_id AND NEW.rating IS NOT NULL, NEW.rating, 0),
+    rating_count = rating_count
+        - IF(id = OLD.seller_id AND OLD.rating IS NOT NULL, 1, 0)
+        + IF(id = NEW.seller_id AND NEW.rating IS NOT NULL, 1, 0),
+    rating = IF(rating_count > 0, ROUND(rating_sum / rating_count, 2), 0)
+WHERE id IN (OLD.seller_id, NEW.seller_id)
+  AND NOT (OLD.seller_id <=> NEW.seller_id AND OLD.rating <=> NEW.rating);
+
+DROP TRIGGER IF EXISTS reviews_item_rating_update;
+CREATE TRIGGER reviews_item_rating_update AFTER UPDATE ON reviews FOR EACH ROW
+UPDATE food_items
+SET rating_sum = rating_sum
+        - IF(id = OLD.food_item_id AND OLD.rating IS NOT NULL, OLD.rating, 0)
+        + IF(id = NEW.food_item_id AND NEW.rating IS NOT NULL, NEW.rating, 0),
+    rating_count = rating_count
+        - IF(id = OLD.food_item_id AND OLD.rating IS NOT NULL, 1, 0)
+        + IF(id = NEW.food_item_id AND NEW.rating IS NOT NULL, 1, 0),
+    rating = IF(rating_count > 0, ROUND(rating_sum / rating_count, 2), 0)
+WHERE id IN (OLD.food_item_id, NEW.food_item_id)
+  AND NOT (OLD.food_item_id <=> NEW.food_item_id AND OLD.rating <=> NEW.rating);
+
+-- Restaurants and dishes whose search entries changed; every worker's in-memory
+-- search index applies rows newer than the last one it has seen
+CREATE TABLE IF NOT EXISTS search_changes (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    doc_type ENUM('seller', 'item') NOT NULL,
+    doc_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_search_changes_created (created_at)
+);
+
+-- Categories are edited in the database, not through the app: renaming or
+-- deleting one changes the search entry of every dish in it. Workers re-read
+-- the last 30 seconds of changes, which outlasts CATEGORY_CHECK_SECONDS, so
+-- the dishes are re-indexed again after the category registry reloads.
+DROP TRIGGER IF EXISTS categories_search_update;
+CREATE TRIGGER categories_search_update AFTER UPDATE ON categories FOR EACH ROW
+INSERT INTO search_changes (doc_type, doc_id)
+SELECT 'item', id FROM food_items WHERE category_id = NEW.id AND NOT (OLD.name <=> NEW.name);
+
+-- Before the delete: ON DELETE SET NULL clears the dishes' category_id
+DROP TRIGGER IF EXISTS categories_search_delete;
+CREATE TRIGGER categories_search_delete BEFORE DELETE ON categories FOR EACH ROW
+INSERT INTO search_changes (doc_type, doc_id)
+SELECT 'item', id FROM food_items WHERE category_id = OLD.id;
+
+-- Order number blocks: each worker inserts a row to reserve the 1000 order
+-- numbers starting at id * 1000 (see order_numbers.py)
+CREATE TABLE IF NOT EXISTS order_number_blocks (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Checkout idempotency keys; a retried checkout POST returns the orders recorded here.
+-- Purged after CHECKOUT_KEY_TTL_HOURS by: flask --app app purge-checkout-keys
+CREATE TABLE IF NOT EXISTS checkout_requests (
+    customer_id INT NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL,
+    order_ids VARCHAR(1000),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (customer_id, idempotency_key),
+    INDEX idx_checkout_requests_created (created_at),
+    FOREIGN KEY (customer_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- When the agent's current position was reported (time of the GPS fix). Every worker
+-- flushes the positions it received; an older one never overwrites a newer one.
+ALTER TABLE delivery_agent_availability
+ADD COLUMN IF NOT EXISTS location_updated_at TIMESTAMP(3) NULL DEFAULT NULL;
+
+-- Versions of the namespaces in each worker's local cache (CACHE_BACKEND = 'local');
+-- workers read the rows changed since their last check
+CREATE INDEX IF NOT EXISTS idx_cache_versions_updated ON cache_versions(updated_at);
+
+-- Available orders near an agent: bounding box on the restaurant's location
+CREATE INDEX IF NOT EXISTS idx_sellers_location ON sellers(latitude, longitude);
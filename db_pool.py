@@ -0,0 +1,297 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import MySQLdb
+from MySQLdb import cursors
+from flask import current_app, g
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection becomes free within the pool timeout
+    """
+
+
+class ConnectionPool:
+    """
+    Bounded pool of MySQLdb connections.
+
+    Keeps up to `size` idle connections open and allows `max_overflow`
+    extra connections under load; once both are in use, callers wait up to
+    `timeout` seconds for a connection to be released.
+    """
+
+    def __init__(self, connect_kwargs, size=5, max_overflow=10, timeout=30,
+                 recycle=3600, pre_ping=True):
+        self.connect_kwargs = connect_kwargs
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.pid = os.getpid()
+
+        self._idle = []  # [(connection, created_at)], most recently used last
+        self._created = {}  # id(connection) -> created_at, for checked out connections
+        self._open = 0
+        self._cond = threading.Condition()
+
+        self._stats = {
+            'connects': 0,
+            'checkouts': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+        }
+
+    def _connect(self):
+        # Called outside the lock, like _is_usable; counters are only
+        # touched under it so stats() never sees a lost update
+        conn = MySQLdb.connect(**self.connect_kwargs)
+        with self._cond:
+            self._stats['connects'] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except MySQLdb.Error:
+            pass
+
+    def _is_usable(self, conn, created_at):
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+
+        if self.pre_ping:
+            try:
+                conn.ping()
+            except MySQLdb.Error:
+                with self._cond:
+                    self._stats['ping_failures'] += 1
+                return False
+
+        return True
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, opening one if allowed
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+
+                if self._open < self.size + self.max_overflow:
+                    # Reserve the slot before connecting outside the lock
+                    self._open += 1
+                    conn, created_at = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No connection available within {self.timeout}s '
+                        f'({self._open} open, pool size {self.size} + overflow {self.max_overflow})'
+                    )
+
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                started = time.monotonic()
+                self._cond.wait(remaining)
+                self._stats['wait_time'] += time.monotonic() - started
+
+        # Health checks and connects happen outside the lock
+        if conn is not None and not self._is_usable(conn, created_at):
+            self._close(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            created_at = time.monotonic()
+
+        with self._cond:
+            self._created[id(conn)] = created_at
+            self._stats['checkouts'] += 1
+
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Return a connection to the pool, rolling back any open transaction
+        """
+        if not discard:
+            try:
+                conn.rollback()
+            except MySQLdb.Error:
+                discard = True
+
+        with self._cond:
+            created_at = self._created.pop(id(conn), time.monotonic())
+
+            if discard or len(self._idle) >= self.size:
+                self._open -= 1
+                keep = False
+            else:
+                self._idle.append((conn, created_at))
+                keep = True
+
+            self._cond.notify()
+
+        if not keep:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for code running outside a request
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except MySQLdb.OperationalError:
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'pid': self.pid,
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': len(self._created),
+            })
+        stats['wait_time'] = round(stats['wait_time'], 4)
+        return stats
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+
+class MySQLPool:
+    """
+    Drop-in replacement for flask_mysqldb.MySQL backed by a ConnectionPool.
+
+    `mysql.connection` checks one connection out per app context and hands
+    it back on teardown, so route handlers and helpers keep using
+    `mysql.connection.cursor()` / `.commit()` unchanged.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._pool = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_UNIX_SOCKET', None)
+        app.config.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8mb4')
+        app.config.setdefault('MYSQL_CURSORCLASS', None)
+        app.config.setdefault('MYSQL_AUTOCOMMIT', False)
+        app.config.setdefault('MYSQL_POOL_SIZE', 5)
+        app.config.setdefault('MYSQL_POOL_MAX_OVERFLOW', 10)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', 30)
+        app.config.setdefault('MYSQL_POOL_RECYCLE', 3600)
+        app.config.setdefault('MYSQL_POOL_PRE_PING', True)
+
+        app.extensions['mysql_pool'] = self
+        app.teardown_appcontext(self.teardown)
+
+    def _connect_kwargs(self, config):
+        kwargs = {
+            'host': config['MYSQL_HOST'],
+            'port': config['MYSQL_PORT'],
+            'connect_timeout': config['MYSQL_CONNECT_TIMEOUT'],
+            'charset': config['MYSQL_CHARSET'],
+            'use_unicode': True,
+            'autocommit': config['MYSQL_AUTOCOMMIT'],
+        }
+
+        if config['MYSQL_USER']:
+            kwargs['user'] = config['MYSQL_USER']
+        if config['MYSQL_PASSWORD']:
+            kwargs['passwd'] = config['MYSQL_PASSWORD']
+        if config['MYSQL_DB']:
+            kwargs['db'] = config['MYSQL_DB']
+        if config['MYSQL_UNIX_SOCKET']:
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        if config['MYSQL_CURSORCLASS']:
+            kwargs['cursorclass'] = getattr(cursors, config['MYSQL_CURSORCLASS'])
+
+        return kwargs
+
+    @property
+    def pool(self):
+        """
+        The pool for the current process. Forked workers (gunicorn) get their
+        own pool instead of sharing sockets inherited from the parent.
+        """
+        pid = os.getpid()
+        if self._pool is None or self._pool.pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool.pid != pid:
+                    config = (self.app or current_app).config
+                    self._pool = ConnectionPool(
+                        self._connect_kwargs(config),
+                        size=config['MYSQL_POOL_SIZE'],
+                        max_overflow=config['MYSQL_POOL_MAX_OVERFLOW'],
+                        timeout=config['MYSQL_POOL_TIMEOUT'],
+                        recycle=config['MYSQL_POOL_RECYCLE'],
+                        pre_ping=config['MYSQL_POOL_PRE_PING'],
+                    )
+        return self._pool
+
+    @property
+    def connection(self):
+        if '_mysql_pool_conn' not in g:
+            g._mysql_pool_conn = self.pool.acquire()
+        return g._mysql_pool_conn
+
+    def release_connection(self, discard=False):
+        """
+        Hand the app context's connection back to the pool early, e.g. between
+        rounds of a long-running command. The next `connection` access
+        borrows a fresh one.
+        """
+        conn = g.pop('_mysql_pool_conn', None)
+        if conn is not None:
+            self.pool.release(conn, discard=discard)
+
+    def teardown(self, exception):
+        self.release_connection(discard=isinstance(exception, MySQLdb.OperationalError))
@@ -0,0 +1,150 @@
+import numpy as np
+
+
+def score_matrix(distances, agents):
+    """
+    Agent scores for every (order, agent) pair; higher is a better candidate.
+
+    `distances` has shape (orders, agents) in km and `agents` are rows with
+    optional `total_deliveries` and `rating` values.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    score = np.full(distances.shape, 100.0)  # Base score
+
+    # Distance bonus/penalty (farther = lower score)
+    score += np.select(
+        [distances < 5, distances < 10, distances < 15],  # Within 5/10/15km
+        [50.0, 30.0, 10.0],
+        default=0.0
+    )
+    far = distances >= 15
+    score[far] -= (distances[far] - 15) * 2  # Penalty for distance beyond 15km
+
+    # Experience bonus, max 20 points
+    experience = np.array([min((agent.get('total_deliveries') or 0) * 0.5, 20) for agent in agents],
+                          dtype=np.float64)
+
+    # Rating bonus (if you have rating system)
+    rating = np.array([float(agent.get('rating') or 0) * 10 for agent in agents], dtype=np.float64)
+
+    score += experience + rating
+    return np.maximum(score, 0)  # Ensure score is not negative
+
+
+def calculate_agent_score(agent, distance):
+    """
+    Calculate a score for agent based on various factors
+    Higher score = better candidate
+    """
+    return float(score_matrix([[distance]], [agent])[0, 0])
+
+
+def assignment_costs(distances, agents, max_distance_km=None):
+    """
+    Cost matrix for min-cost matching: prefer high scores, then short pickups.
+    Pairs that cannot be served (unknown location or beyond `max_distance_km`)
+    cost infinity.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    costs = distances - score_matrix(distances, agents)
+    infeasible = ~np.isfinite(distances)
+    if max_distance_km is not None:
+        infeasible |= distances > max_distance_km
+    costs[infeasible] = np.inf
+    return costs
+
+
+def solve_assignment(costs):
+    """
+    Minimum-cost one-to-one matching (Hungarian algorithm, shortest
+    augmenting paths) over a rectangular cost matrix.
+
+    Returns (row, col) pairs; rows or columns left over in a rectangular
+    problem, and pairs with infinite cost, are not matched.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    if costs.size == 0:
+        return []
+
+    transposed = costs.shape[0] > costs.shape[1]
+    if transposed:
+        costs = costs.T
+    n, m = costs.shape
+
+    # Infinite costs become a penalty larger than any feasible matching so the
+    # solver still returns a full matching; those pairs are dropped afterwards
+    feasible = np.isfinite(costs)
+    if not feasible.any():
+        return []
+    finite = costs[feasible]
+    penalty = (finite.max() - min(finite.min(), 0) + 1) * (n + 1)
+    c = np.where(feasible, costs, penalty)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.int64)  # match[col] = row (1-based), 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for row in range(1, n + 1):
+        match[0] = row
+        col0 = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[col0] = True
+            row0 = match[col0]
+            free = ~used[1:]
+
+            slack = c[row0 - 1] - u[row0] - v[1:]
+            improved = free & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = col0
+
+            candidates = np.where(free, min_slack[1:], np.inf)
+            col1 = int(np.argmin(candidates)) + 1
+            delta = candidates[col1 - 1]
+
+            used_cols = np.nonzero(used)[0]
+            u[match[used_cols]] += delta
+            v[used_cols] -= delta
+            min_slack[1:][free] -= delta
+
+            col0 = col1
+            if match[col0] == 0:
+                break
+
+        # Flip the augmenting path
+        while col0:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+
+    pairs = []
+    for col in range(1, m + 1):
+        if match[col]:
+            row = match[col] - 1
+            if feasible[row, col - 1]:
+                pairs.append((col - 1, row) if transposed else (row, col - 1))
+
+    pairs.sort()
+    return pairs
+
+
+def greedy_assignment(costs):
+    """
+    Per-order greedy matching in row order, as the synchronous
+    auto-assignment does: each order takes the cheapest agent still free
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    taken = set()
+    pairs = []
+    for row in range(costs.shape[0]):
+        for col in np.argsort(costs[row], kind='stable'):
+            if not np.isfinite(costs[row, col]):
+                break
+            if col not in taken:
+                taken.add(int(col))
+                pairs.append((row, int(col)))
+                break
+    return pairs
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two coordinates in kilometers.
+    Returns infinity when any coordinate is missing.
+    """
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+        return float('inf')
+
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def to_radians(values):
+    """
+    Coordinates (floats, Decimals or None) as a float64 radian array; None becomes NaN
+    """
+    return np.radians(np.array([np.nan if value is None else float(value) for value in values],
+                               dtype=np.float64))
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    # Inputs are radian arrays that broadcast against each other
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return np.where(np.isnan(distances), np.inf, distances)
+
+
+def distances_from(lat, lng, lats, lngs):
+    """
+    Distances in km from one point to many, as an array aligned with `lats`/`lngs`.
+    Missing coordinates on either side give infinity.
+    """
+    if lat is None or lng is None:
+        return np.full(len(lats), np.inf)
+
+    return _haversine(math.radians(float(lat)), math.radians(float(lng)),
+                      to_radians(lats), to_radians(lngs))
+
+
+def distance_matrix(lats1, lngs1, lats2, lngs2):
+    """
+    Distances in km between every pair, shape (len(lats1), len(lats2)).
+    Used for agents x ready orders matching.
+    """
+    lat1 = to_radians(lats1)[:, np.newaxis]
+    lon1 = to_radians(lngs1)[:, np.newaxis]
+    lat2 = to_radians(lats2)[np.newaxis, :]
+    lon2 = to_radians(lngs2)[np.newaxis, :]
+    return _haversine(lat1, lon1, lat2, lon2)
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    (min_lat, max_lat, min_lng, max_lng) enclosing a circle of `radius_km`,
+    used to prefilter rows in SQL before computing exact distances
+    """
+    lat, lng = float(lat), float(lng)
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angular_radius)
+    # Longitude degrees shrink towards the poles; widest point of the circle
+    ratio = math.sin(angular_radius) / max(math.cos(math.radians(lat)), 1e-9)
+    lng_delta = math.degrees(math.asin(ratio)) if ratio < 1 else 180.0
+    return lat - lat_delta, lat + lat_delta, lng - lng_delta, lng + lng_delta
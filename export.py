@@ -0,0 +1,80 @@
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+
+import MySQLdb
+from MySQLdb.cursors import SSDictCursor
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def stream_rows(conn, query, params, fetch_size=1000):
+    """
+    Yield the rows of `query` from an unbuffered (server-side) cursor, so the
+    result set is read from the socket as it is consumed instead of loaded
+    into memory first. The connection cannot run other statements until the
+    generator is exhausted.
+
+    If the generator is closed early (the client went away) or fails, the
+    connection is closed and must be discarded: closing the cursor would
+    first read every remaining row of the result from the server.
+    """
+    cur = conn.cursor(SSDictCursor)
+    finished = False
+    try:
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+        finished = True
+    finally:
+        if finished:
+            cur.close()
+        else:
+            try:
+                conn.close()
+            except MySQLdb.Error:
+                pass
+
+
+def encode_rows(rows, columns, fmt, chunk_size=64 * 1024):
+    """
+    Encode rows as CSV (with a header line) or NDJSON, yielding chunks of
+    about `chunk_size` bytes rather than one write per row
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+
+    if writer:
+        writer.writerow(columns)
+
+    for row in rows:
+        if writer:
+            writer.writerow(['' if row[column] is None else row[column] for column in columns])
+        else:
+            buffer.write(json.dumps({column: row[column] for column in columns},
+                                    default=json_default, ensure_ascii=False))
+            buffer.write('\n')
+
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
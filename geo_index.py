@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+
+from distance import haversine_km
+
+KM_PER_DEGREE = 111.32
+
+
+class AgentLocationIndex:
+    """
+    In-process grid index over delivery agent coordinates.
+
+    Agents are bucketed into square cells of `cell_km` (in degrees of
+    latitude); nearest/radius queries visit rings of cells around the query
+    point and stop as soon as no unvisited cell can hold a closer agent, so
+    a lookup touches only the agents near the restaurant.
+    """
+
+    def __init__(self, cell_km=2.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.loaded_at = None
+
+        self._cells = {}   # (row, col) -> set of agent ids
+        self._agents = {}  # agent id -> (lat, lng, cell, available)
+        self._bounds = None  # (min_row, max_row, min_col, max_col) ever occupied
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._agents)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def update(self, agent_id, lat, lng, available=None):
+        """
+        Add or move an agent. `available=None` keeps the current flag
+        (new agents default to available).
+        """
+        lat, lng = float(lat), float(lng)
+        cell = self._cell(lat, lng)
+
+        with self._lock:
+            previous = self._agents.get(agent_id)
+            if previous:
+                if available is None:
+                    available = previous[3]
+                if previous[2] != cell:
+                    self._discard_from_cell(agent_id, previous[2])
+            elif available is None:
+                available = True
+
+            self._cells.setdefault(cell, set()).add(agent_id)
+            self._agents[agent_id] = (lat, lng, cell, bool(available))
+
+            if self._bounds is None:
+                self._bounds = (cell[0], cell[0], cell[1], cell[1])
+            else:
+                min_row, max_row, min_col, max_col = self._bounds
+                self._bounds = (min(min_row, cell[0]), max(max_row, cell[0]),
+                                min(min_col, cell[1]), max(max_col, cell[1]))
+
+    def set_available(self, agent_id, available):
+        with self._lock:
+            entry = self._agents.get(agent_id)
+            if entry:
+                self._agents[agent_id] = entry[:3] + (bool(available),)
+
+    def remove(self, agent_id):
+        with self._lock:
+            entry = self._agents.pop(agent_id, None)
+            if entry:
+                self._discard_from_cell(agent_id, entry[2])
+
+    def _discard_from_cell(self, agent_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(agent_id)
+            if not members:
+                del self._cells[cell]
+
+    def load(self, rows):
+        """
+        Replace the index contents with (agent_id, lat, lng, available) rows
+        """
+        with self._lock:
+            self._cells = {}
+            self._agents = {}
+            self._bounds = None
+            for agent_id, lat, lng, available in rows:
+                if lat is not None and lng is not None:
+                    self.update(agent_id, lat, lng, available)
+            self.loaded_at = time.monotonic()
+
+    def is_stale(self, max_age):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age
+
+    def _ring(self, center, radius):
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for dc in range(-radius, radius + 1):
+            yield (row - radius, col + dc)
+            yield (row + radius, col + dc)
+        for dr in range(-radius + 1, radius):
+            yield (row + dr, col - radius)
+            yield (row + dr, col + radius)
+
+    def _searched_km(self, lat, rings):
+        """
+        Lower bound on the distance to any cell outside the first `rings` rings
+        """
+        # Longitude cells narrow away from the equator; use the narrowest one covered
+        edge_lat = min(abs(lat) + rings * self.cell_deg, 89.0)
+        km_per_cell = self.cell_deg * KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+        return rings * km_per_cell
+
+    def _search(self, lat, lng, k=None, radius_km=None, available_only=True):
+        lat, lng = float(lat), float(lng)
+        center = self._cell(lat, lng)
+        found = []
+
+        with self._lock:
+            if not self._cells:
+                return []
+            # Rings beyond the occupied area cannot contain agents
+            min_row, max_row, min_col, max_col = self._bounds
+            max_rings = max(abs(center[0] - min_row), abs(center[0] - max_row),
+                            abs(center[1] - min_col), abs(center[1] - max_col))
+
+            for rings in range(max_rings + 1):
+                for cell in self._ring(center, rings):
+                    for agent_id in self._cells.get(cell, ()):
+                        agent_lat, agent_lng, _, available = self._agents[agent_id]
+                        if available_only and not available:
+                            continue
+                        distance = haversine_km(lat, lng, agent_lat, agent_lng)
+                        if radius_km is None or distance <= radius_km:
+                            found.append((distance, agent_id))
+
+                # Everything beyond this ring is at least `reach` km away
+                reach = self._searched_km(lat, rings)
+                if radius_km is not None and reach >= radius_km:
+                    break
+                if k is not None and len(found) >= k:
+                    found.sort()
+                    if found[k - 1][0] <= reach:
+                        break
+
+        found.sort()
+        return found[:k] if k is not None else found
+
+    def nearest(self, lat, lng, k=1, max_radius_km=None, available_only=True):
+        """
+        Up to `k` (distance_km, agent_id) pairs, closest first
+        """
+        return self._search(lat, lng, k=k, radius_km=max_radius_km,
+                            available_only=available_only)
+
+    def within_radius(self, lat, lng, radius_km, available_only=True):
+        """
+        All (distance_km, agent_id) pairs within `radius_km`, closest first
+        """
+        return self._search(lat, lng, radius_km=radius_km, available_only=available_only)
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+
+
+def retry_delay(attempts, base=5, maximum=300):
+    """
+    Exponential backoff with jitter for the given number of attempts so far
+    """
+    delay = min(base * 2 ** max(attempts - 1, 0), maximum)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class MySQLJobQueue:
+    """
+    Durable job queue stored in the `jobs` table.
+
+    Jobs can be enqueued with the caller's cursor so they commit atomically
+    with the change that produced them. Workers claim due jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can run side
+    by side without handing the same job out twice.
+    """
+
+    def __init__(self, mysql):
+        self.mysql = mysql
+
+    def enqueue(self, kind, payload, delay=0, cur=None):
+        query = """
+            INSERT INTO jobs (kind, payload, run_at)
+            VALUES (%s, %s, NOW(3) + INTERVAL %s MICROSECOND)
+        """
+        params = (kind, json.dumps(payload), int(delay * 1000000))
+
+        if cur is not None:
+            cur.execute(query, params)
+            return cur.lastrowid
+
+        with self.mysql.pool.connection() as conn:
+            own_cur = conn.cursor()
+            own_cur.execute(query, params)
+            job_id = own_cur.lastrowid
+            conn.commit()
+            own_cur.close()
+        return job_id
+
+    def claim(self, worker_id, kinds, limit=50):
+        with self.mysql.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id, kind, payload, attempts
+                FROM jobs
+                WHERE status = 'pending'
+                AND kind IN ({})
+                AND run_at <= NOW(3)
+                ORDER BY run_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """.format(', '.join(['%s'] * len(kinds))), (*kinds, limit))
+            rows = cur.fetchall()
+
+            if rows:
+                cur.execute("""
+                    UPDATE jobs
+                    SET status = 'running', locked_by = %s, locked_at = NOW(3),
+                        attempts = attempts + 1
+                    WHERE id IN ({})
+                """.format(', '.join(['%s'] * len(rows))), (worker_id, *[row['id'] for row in rows]))
+
+            conn.commit()
+            cur.close()
+
+        return [{'id': row['id'], 'kind': row['kind'], 'payload': json.loads(row['payload']),
+                 'attempts': row['attempts'] + 1} for row in rows]
+
+    def _execute(self, query, params):
+        with self.mysql.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            conn.commit()
+            cur.close()
+
+    def complete(self, job):
+        self._execute("DELETE FROM jobs WHERE id = %s", (job['id'],))
+
+    def retry(self, job, error, delay):
+        self._execute("""
+            UPDATE jobs
+            SET status = 'pending', locked_by = NULL, locked_at = NULL,
+                last_error = %s, run_at = NOW(3) + INTERVAL %s MICROSECOND
+            WHERE id = %s
+        """, (error, int(delay * 1000000), job['id']))
+
+    def fail(self, job, error):
+        self._execute("""
+            UPDATE jobs
+            SET status = 'failed', locked_by = NULL, last_error = %s
+            WHERE id = %s
+        """, (error, job['id']))
+
+    def requeue_stale(self, older_than):
+        """
+        Put back jobs whose worker died while running them
+        """
+        self._execute("""
+            UPDATE jobs
+            SET status = 'pending', locked_by = NULL, locked_at = NULL
+            WHERE status = 'running' AND locked_at < NOW(3) - INTERVAL %s SECOND
+        """, (int(older_than),))
+
+
+class MemoryJobQueue:
+    """
+    In-process stand-in for MySQLJobQueue, for local development without a
+    separate worker process. Jobs are lost on restart and enqueue() is not
+    part of the caller's transaction.
+    """
+
+    def __init__(self):
+        self._heap = []  # (run_at, id, job)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.failed = []
+
+    def enqueue(self, kind, payload, delay=0, cur=None):
+        job_id = next(self._ids)
+        job = {'id': job_id, 'kind': kind, 'payload': payload, 'attempts': 0}
+        with self._lock:
+            heapq.heappush(self._heap, (time.monotonic() + delay, job_id, job))
+        return job_id
+
+    def claim(self, worker_id, kinds, limit=50):
+        now = time.monotonic()
+        claimed, skipped = [], []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(claimed) < limit:
+                entry = heapq.heappop(self._heap)
+                (claimed if entry[2]['kind'] in kinds else skipped).append(entry)
+            for entry in skipped:
+                heapq.heappush(self._heap, entry)
+
+        jobs = []
+        for _, _, job in claimed:
+            job['attempts'] += 1
+            jobs.append(job)
+        return jobs
+
+    def complete(self, job):
+        pass
+
+    def retry(self, job, error, delay):
+        job['last_error'] = error
+        with self._lock:
+            heapq.heappush(self._heap, (time.monotonic() + delay, job['id'], job))
+
+    def fail(self, job, error):
+        job['last_error'] = error
+        self.failed.append(job)
+
+    def requeue_stale(self, older_than):
+        pass
+
+
+def work(queue, kinds, handler, worker_id, stop_event, batch_size=50,
+         poll_interval=1.0, stale_after=300, max_attempts=None):
+    """
+    Worker loop: claim due jobs and pass each batch to `handler(jobs)`, which
+    completes or retries them. Sleeps `poll_interval` when the queue is idle.
+    If the handler raises, the batch is retried with backoff, and jobs that
+    have had `max_attempts` attempts are failed instead.
+    """
+    last_reap = 0.0
+    while not stop_event.is_set():
+        if time.monotonic() - last_reap > stale_after / 2:
+            queue.requeue_stale(stale_after)
+            last_reap = time.monotonic()
+
+        jobs = queue.claim(worker_id, kinds, batch_size)
+        if not jobs:
+            stop_event.wait(poll_interval)
+            continue
+
+        try:
+            handler(jobs)
+        except Exception as exc:
+            # Leave the batch to be retried rather than killing the worker
+            error = f'{type(exc).__name__}: {exc}'
+            for job in jobs:
+                if max_attempts is not None and job['attempts'] >= max_attempts:
+                    queue.fail(job, error)
+                else:
+                    queue.retry(job, error, retry_delay(job['attempts']))
@@ -0,0 +1,248 @@
+import json
+import threading
+import uuid
+from collections import deque
+
+RETRY_MS = 3000  # how long a browser waits before reconnecting a dropped stream
+
+
+class BrokerFull(Exception):
+    pass
+
+
+class Subscriber:
+    """
+    One open event stream. Events wait in a bounded queue until the stream
+    writes them; a subscriber that falls more than `max_queue` events behind
+    is closed as overflowed instead of holding up publish() or growing
+    without limit, and its client reloads the page when it reconnects.
+
+    Thread-based servers block in get(); an asyncio server passes `wakeup`
+    (called from the publishing thread) and reads with drain().
+    """
+
+    def __init__(self, topics, order_id=None, max_queue=100, wakeup=None):
+        self.topics = frozenset(topics)
+        self.order_id = order_id
+        self.max_queue = max_queue
+        self.wakeup = wakeup
+        self.overflowed = False
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """
+        Queue an (event_id, event) pair; False if the subscriber is closed or
+        just overflowed
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._queue) >= self.max_queue:
+                self.overflowed = self.closed = True
+                self._queue.clear()
+            else:
+                self._queue.append(item)
+            self._cond.notify()
+        if self.wakeup is not None:
+            self.wakeup()
+        return not self.overflowed
+
+    def get(self, timeout):
+        """
+        Wait up to `timeout` seconds for events; returns the queued ones
+        (empty on timeout or once closed)
+        """
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            return self._take()
+
+    def drain(self):
+        with self._cond:
+            return self._take()
+
+    def _take(self):
+        items = list(self._queue)
+        self._queue.clear()
+        return items
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        if self.wakeup is not None:
+            self.wakeup()
+
+
+class OrderEventBroker:
+    """
+    Fan-out of order status events to the streams open in this process.
+
+    Events are published with the topics they belong to (e.g. `user:12` for
+    each user involved in the order, and `all`); a subscriber receives the
+    events of any of its topics, optionally narrowed to one order. publish()
+    never blocks on a subscriber.
+
+    The last `replay_size` events are kept so a client that reconnects with
+    Last-Event-ID gets what it missed. Event ids carry this broker's epoch:
+    an id from another process or from before a restart cannot be resumed,
+    and the client is told to reset instead. A new stream can also start
+    after an order_tracking id (the page it belongs to was rendered from the
+    database as of that id), which means the same in every process.
+    """
+
+    def __init__(self, max_subscribers=500, max_queue=100, replay_size=1000):
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._recent = deque(maxlen=replay_size)  # (seq, topics, event)
+        self._by_topic = {}  # topic -> set of subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'overflowed': 0, 'replayed': 0, 'rejected': 0}
+
+    def subscribe(self, topics, order_id=None, last_event_id=None, since_tracking_id=None, wakeup=None):
+        """
+        Open a subscription. Returns (subscriber, backlog), where backlog is
+        the list of (event_id, event) missed since `last_event_id`, or None
+        if they can no longer be replayed and the client should reset;
+        without a last event id, the buffered events after
+        `since_tracking_id` are the backlog.
+        Raises BrokerFull when max_subscribers streams are already open.
+        """
+        subscriber = Subscriber(topics, order_id, self.max_queue, wakeup)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self._stats['rejected'] += 1
+                raise BrokerFull()
+            if last_event_id is not None:
+                backlog = self._backlog(subscriber, last_event_id)
+            elif since_tracking_id is not None:
+                backlog = [(self.event_id(seq), event) for seq, topics, event in self._recent
+                           if event['tracking_id'] > since_tracking_id
+                           and self._wants(subscriber, topics, event)]
+            else:
+                backlog = []
+            for topic in subscriber.topics:
+                self._by_topic.setdefault(topic, set()).add(subscriber)
+            self._subscribers.add(subscriber)
+            if backlog:
+                self._stats['replayed'] += len(backlog)
+        return subscriber, backlog
+
+    def _backlog(self, subscriber, last_event_id):
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = self._recent[0][0] if self._recent else self._seq + 1
+        if seq > self._seq or seq < oldest - 1:
+            return None
+        return [(self.event_id(event_seq), event) for event_seq, topics, event in self._recent
+                if event_seq > seq and self._wants(subscriber, topics, event)]
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.discard(subscriber)
+            if subscriber.overflowed:
+                self._stats['overflowed'] += 1
+            for topic in subscriber.topics:
+                subscribers = self._by_topic[topic]
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_topic[topic]
+
+    @staticmethod
+    def _wants(subscriber, topics, event):
+        return (not subscriber.topics.isdisjoint(topics)
+                and (subscriber.order_id is None or subscriber.order_id == event.get('order_id')))
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def publish(self, event, topics):
+        """
+        Send `event` (a JSON-serializable dict) to every subscriber of any of
+        `topics`; slow subscribers are dropped rather than waited for
+        """
+        topics = frozenset(topics)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._recent.append((seq, topics, event))
+            targets = set()
+            for topic in topics:
+                targets.update(self._by_topic.get(topic, ()))
+            self._stats['published'] += 1
+
+        item = (self.event_id(seq), event)
+        delivered = 0
+        for subscriber in targets:
+            if self._wants(subscriber, topics, event) and subscriber.put(item):
+                delivered += 1
+        with self._lock:
+            self._stats['delivered'] += delivered
+        return delivered
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+            stats['topics'] = len(self._by_topic)
+            stats['epoch'] = self.epoch
+        return stats
+
+
+def format_event(event_id, name, data):
+    """
+    One Server-Sent Events message; without an id the browser keeps the
+    last one it saw
+    """
+    message = f'id: {event_id}\n' if event_id is not None else ''
+    return message + f'event: {name}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def format_comment(text):
+    return f': {text}\n\n'
+
+
+RESET = format_event(None, 'reset', {})
+
+
+def open_stream(broker, topics, order_id=None, last_event_id=None, since_tracking_id=None, wakeup=None):
+    """
+    Subscribe a new event stream. Returns (subscriber, opening messages):
+    the reconnect delay, then the missed events, or a reset if a
+    reconnecting client cannot be caught up. The caller writes
+    stream_messages() for whatever the subscriber receives next and
+    unsubscribes when the stream ends. Raises BrokerFull.
+    """
+    subscriber, backlog = broker.subscribe(topics, order_id, last_event_id, since_tracking_id, wakeup)
+    messages = [f'retry: {RETRY_MS}\n\n']
+    if backlog is None:
+        subscriber.close()
+        messages.append(RESET)
+    else:
+        messages.extend(stream_messages(subscriber, backlog))
+    return subscriber, messages
+
+
+def stream_messages(subscriber, items):
+    """
+    The messages for events taken from a subscriber, ending with a reset if
+    it overflowed
+    """
+    messages = [format_event(event_id, 'order_status', event) for event_id, event in items]
+    if subscriber.overflowed:
+        messages.append(RESET)
+    return messages
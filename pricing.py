@@ -0,0 +1,82 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+DELIVERY_CHARGE = Decimal("30.00")  # per order, i.e. per seller in the cart
+TAX_RATE = Decimal("0.05")
+
+CENTS = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+
+def to_amount(value):
+    """
+    A price (Decimal, str, int or float) as a Decimal rounded half up to the paisa
+    """
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENTS, ROUND_HALF_UP)
+
+
+def unit_price(line):
+    """
+    What one unit of a cart line costs: its discount price when it has one
+    """
+    return line['discount_price'] if line['discount_price'] is not None else line['price']
+
+
+def line_total(line):
+    return to_amount(unit_price(line) * line['quantity'])
+
+
+def price_cart(lines, delivery_charge=DELIVERY_CHARGE, tax_rate=TAX_RATE):
+    """
+    Price a cart snapshot the way checkout charges it: one order per seller,
+    each with its own delivery charge and tax.
+
+    `lines` are mappings with seller_id, quantity, price and discount_price
+    (restaurant_name is passed through when present). One pass over the
+    lines sums exact Decimal line amounts per seller; nothing is rounded
+    until the seller totals, where tax is rounded half up to the paisa once
+    per seller, never per line. Returns ({seller_id: seller totals}, cart
+    totals), every amount a Decimal with two places.
+    """
+    delivery_charge = to_amount(delivery_charge)
+    sellers = {}  # seller_id -> [restaurant_name, item_count, subtotal]
+    count = 0
+
+    for line in lines:
+        count += 1
+        discount = line['discount_price']
+        quantity = line['quantity']
+        amount = (line['price'] if discount is None else discount) * quantity
+        seller = sellers.get(line['seller_id'])
+        if seller is None:
+            sellers[line['seller_id']] = [line.get('restaurant_name'), quantity, amount]
+        else:
+            seller[1] += quantity
+            seller[2] += amount
+
+    summaries = {}
+    subtotal_sum = tax_sum = ZERO
+    for seller_id, (restaurant_name, item_count, subtotal) in sellers.items():
+        subtotal = to_amount(subtotal)
+        tax = (subtotal * tax_rate).quantize(CENTS, ROUND_HALF_UP)
+        summaries[seller_id] = {
+            'seller_id': seller_id,
+            'restaurant_name': restaurant_name,
+            'item_count': item_count,
+            'subtotal': subtotal,
+            'delivery_charge': delivery_charge,
+            'tax': tax,
+            'total': subtotal + delivery_charge + tax,
+        }
+        subtotal_sum += subtotal
+        tax_sum += tax
+
+    delivery_sum = delivery_charge * len(summaries) if summaries else ZERO
+    return summaries, {
+        'count': count,
+        'subtotal': subtotal_sum,
+        'delivery_charge': delivery_sum,
+        'tax': tax_sum,
+        'grand_total': subtotal_sum + delivery_sum + tax_sum,
+    }
@@ -0,0 +1,93 @@
+"""
+Compare a fresh MySQL connection per request (old flask_mysqldb behaviour)
+with connections borrowed from the pool.
+
+Usage: python scripts/bench_db_pool.py [--requests 2000] [--threads 8]
+Requires the local database from database.sql and the credentials in config.py.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MySQLdb
+from MySQLdb import cursors
+
+from config import Config
+from db_pool import ConnectionPool
+
+
+def connect_kwargs():
+    kwargs = {
+        'host': Config.MYSQL_HOST,
+        'user': Config.MYSQL_USER,
+        'db': Config.MYSQL_DB,
+        'charset': 'utf8mb4',
+        'cursorclass': getattr(cursors, Config.MYSQL_CURSORCLASS),
+    }
+    if Config.MYSQL_PASSWORD:
+        kwargs['passwd'] = Config.MYSQL_PASSWORD
+    return kwargs
+
+
+def simulated_request(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM categories WHERE is_active = TRUE LIMIT 1")
+    cur.fetchall()
+    cur.close()
+
+
+def per_request_connections(count):
+    for _ in range(count):
+        conn = MySQLdb.connect(**connect_kwargs())
+        simulated_request(conn)
+        conn.close()
+
+
+def pooled_connections(pool, count):
+    for _ in range(count):
+        with pool.connection() as conn:
+            simulated_request(conn)
+
+
+def run(label, target, threads, per_thread):
+    workers = [threading.Thread(target=target, args=(per_thread,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    total = threads * per_thread
+    print(f'{label:<28} {total:>6} requests  {elapsed:8.3f}s  '
+          f'{total / elapsed:9.1f} req/s  {elapsed / total * 1000:7.3f} ms/req')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    per_thread = max(args.requests // args.threads, 1)
+    pool = ConnectionPool(connect_kwargs(), size=args.threads, max_overflow=0,
+                          timeout=Config.MYSQL_POOL_TIMEOUT,
+                          recycle=Config.MYSQL_POOL_RECYCLE,
+                          pre_ping=Config.MYSQL_POOL_PRE_PING)
+
+    run('connect per request', per_request_connections, args.threads, per_thread)
+    run('pooled (pre-ping on)', lambda n: pooled_connections(pool, n), args.threads, per_thread)
+
+    pool.pre_ping = False
+    run('pooled (pre-ping off)', lambda n: pooled_connections(pool, n), args.threads, per_thread)
+
+    print()
+    print('pool stats:', pool.stats())
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
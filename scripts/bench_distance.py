@@ -0,0 +1,96 @@
+"""
+Check the NumPy Haversine engine against the scalar formula and measure
+throughput for one-to-many and agents x orders distance matrices.
+
+Usage: python scripts/bench_distance.py [--agents 2000] [--orders 200]
+Runs entirely in memory; no database needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from distance import distance_matrix, distances_from, haversine_km
+
+# Tamil Nadu bounding box
+LAT_RANGE = (8.0, 13.5)
+LNG_RANGE = (76.2, 80.4)
+
+
+def random_points(rng, count):
+    # Coordinates come back from MySQL as Decimal
+    return ([Decimal(f'{rng.uniform(*LAT_RANGE):.8f}') for _ in range(count)],
+            [Decimal(f'{rng.uniform(*LNG_RANGE):.8f}') for _ in range(count)])
+
+
+def check_accuracy(rng):
+    lats, lngs = random_points(rng, 500)
+    lats.append(None)
+    lngs.append(Decimal('80.1'))
+
+    origin_lat, origin_lng = Decimal('13.0827'), Decimal('80.2707')
+    batch = distances_from(origin_lat, origin_lng, lats, lngs)
+    scalar = np.array([haversine_km(origin_lat, origin_lng, lat, lng) for lat, lng in zip(lats, lngs)])
+    assert np.isinf(batch[-1]) and np.isinf(scalar[-1]), 'missing coordinates must be infinite'
+    one_to_many_error = np.max(np.abs(batch[:-1] - scalar[:-1]))
+
+    matrix = distance_matrix(lats[:50], lngs[:50], lats[50:100], lngs[50:100])
+    expected = np.array([[haversine_km(lat1, lng1, lat2, lng2)
+                          for lat2, lng2 in zip(lats[50:100], lngs[50:100])]
+                         for lat1, lng1 in zip(lats[:50], lngs[:50])])
+    matrix_error = np.max(np.abs(matrix - expected))
+
+    # Symmetry and zero diagonal
+    square = distance_matrix(lats[:50], lngs[:50], lats[:50], lngs[:50])
+    assert np.allclose(square, square.T) and np.allclose(np.diag(square), 0.0)
+
+    assert one_to_many_error < 1e-9 and matrix_error < 1e-9, 'batch distances drifted from scalar Haversine'
+    print(f'accuracy: max abs error one-to-many {one_to_many_error:.2e} km, matrix {matrix_error:.2e} km')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--agents', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    check_accuracy(rng)
+
+    agent_lats, agent_lngs = random_points(rng, args.agents)
+    order_lats, order_lngs = random_points(rng, args.orders)
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for lat, lng in zip(order_lats, order_lngs):
+            [haversine_km(lat, lng, agent_lat, agent_lng) for agent_lat, agent_lng in zip(agent_lats, agent_lngs)]
+    scalar_time = (time.perf_counter() - started) / args.repeat
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for lat, lng in zip(order_lats, order_lngs):
+            distances_from(lat, lng, agent_lats, agent_lngs)
+    one_to_many_time = (time.perf_counter() - started) / args.repeat
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        distance_matrix(agent_lats, agent_lngs, order_lats, order_lngs)
+    matrix_time = (time.perf_counter() - started) / args.repeat
+
+    pairs = args.agents * args.orders
+    print(f'{args.agents} agents x {args.orders} orders = {pairs} pairs')
+    for label, elapsed in (('scalar loop', scalar_time),
+                           ('one-to-many per order', one_to_many_time),
+                           ('single matrix call', matrix_time)):
+        print(f'{label:<24} {elapsed * 1000:9.2f} ms  {pairs / elapsed / 1e6:8.2f} M pairs/s')
+
+
+if __name__ == '__main__':
+    main()
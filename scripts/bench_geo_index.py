@@ -0,0 +1,69 @@
+"""
+Compare the agent location index with the old linear Haversine scan used by
+find_nearest_delivery_agent, at 100 / 1,000 / 10,000 agents.
+
+Usage: python scripts/bench_geo_index.py [--queries 2000] [--k 25]
+Runs entirely in memory; no database needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance import haversine_km
+from geo_index import AgentLocationIndex
+
+# Roughly the Chennai metro area
+LAT_RANGE = (12.80, 13.25)
+LNG_RANGE = (80.05, 80.35)
+
+
+def random_point(rng):
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+
+
+def linear_scan(agents, lat, lng, k):
+    distances = [(haversine_km(lat, lng, agent_lat, agent_lng), agent_id)
+                 for agent_id, (agent_lat, agent_lng) in agents.items()]
+    distances.sort()
+    return distances[:k]
+
+
+def timed(fn, queries):
+    started = time.perf_counter()
+    results = [fn(lat, lng) for lat, lng in queries]
+    return (time.perf_counter() - started) / len(queries) * 1e6, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=25)
+    parser.add_argument('--cell-km', type=float, default=2.0)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f'{"agents":>8} {"linear us/query":>16} {"index us/query":>15} {"speedup":>8}')
+
+    for fleet_size in (100, 1000, 10000):
+        agents = {agent_id: random_point(rng) for agent_id in range(1, fleet_size + 1)}
+        index = AgentLocationIndex(cell_km=args.cell_km)
+        index.load((agent_id, lat, lng, True) for agent_id, (lat, lng) in agents.items())
+
+        queries = [random_point(rng) for _ in range(args.queries)]
+        k = min(args.k, fleet_size)
+
+        linear_us, expected = timed(lambda lat, lng: linear_scan(agents, lat, lng, k), queries)
+        index_us, actual = timed(lambda lat, lng: index.nearest(lat, lng, k=k), queries)
+
+        # The index must return exactly what the full scan would
+        assert actual == expected, 'index returned different nearest agents'
+
+        print(f'{fleet_size:>8} {linear_us:>16.1f} {index_us:>15.1f} {linear_us / index_us:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
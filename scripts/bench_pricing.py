@@ -0,0 +1,43 @@
+"""
+Benchmark pricing.price_cart on large carts against straightforward Decimal
+arithmetic. The pricing invariants are checked by tests/test_pricing.py.
+
+Usage: python scripts/bench_pricing.py [--lines 1000] [--sellers 20] [--runs 200]
+Runs entirely in memory; no database needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from pricing import price_cart
+from tests.test_pricing import make_cart, reference_totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=1000, help='lines per benchmarked cart')
+    parser.add_argument('--sellers', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=200, help='timed pricing runs')
+    args = parser.parse_args()
+
+    rng = random.Random(23)
+
+    cart = make_cart(rng, args.lines, args.sellers)
+    for label, fn in (('price_cart', price_cart), ('reference', reference_totals)):
+        latencies = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            fn(cart)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f'{label:<11} {args.lines} lines, {args.sellers} sellers: '
+              f'p50 {np.percentile(latencies, 50):.3f} ms, p99 {np.percentile(latencies, 99):.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
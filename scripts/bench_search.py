@@ -0,0 +1,197 @@
+"""
+Benchmark the in-memory search index on a synthetic catalog of Tamil and
+English dish names against a linear substring scan (what LIKE '%term%' does
+row by row), then the type-ahead index behind /api/search/suggest (which
+must stay under 5 ms at p99), and time incremental updates.
+
+First checks that English, romanized and Tamil spellings of the same dish
+share a phonetic key, and that typing any of them suggests every spelling.
+
+Usage: python scripts/bench_search.py [--items 50000] [--items-per-seller 20] [--queries 2000]
+Runs entirely in memory; no database needed. Exits non-zero on a failed check.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from search_index import SearchIndex, SuggestIndex, phonetic_key, tokenize
+
+DISHES = ['biryani', 'dosa', 'idli', 'vada', 'pongal', 'parotta', 'kothu', 'sambar', 'rasam',
+          'chettinad chicken', 'mutton chukka', 'fish curry', 'meals', 'appam', 'idiyappam',
+          'kuzhi paniyaram', 'payasam', 'filter coffee', 'uthappam', 'upma', 'kootu', 'poriyal']
+STYLES = ['masala', 'ghee', 'onion', 'podi', 'special', 'mini', 'family', 'spicy', 'plain',
+          'rava', 'egg', 'paneer', 'veg', 'kari', 'nattu kozhi']
+TAMIL_DISHES = ['பிரியாணி', 'தோசை', 'இட்லி', 'வடை', 'பொங்கல்', 'பரோட்டா', 'சாம்பார்', 'ரசம்',
+                'கோழி குழம்பு', 'மீன் குழம்பு', 'ஆப்பம்', 'இடியாப்பம்', 'பாயசம்', 'காபி']
+CATEGORIES = ['Breakfast', 'Biryani', 'Meals', 'Chettinad', 'Tiffin', 'Desserts', 'Beverages']
+AREAS = ['T Nagar', 'Adyar', 'Velachery', 'Anna Nagar', 'Mylapore', 'Tambaram', 'Porur']
+
+QUERIES = ['biryani', 'masala dosa', 'chettinad', 'ghee', 'mutton chukka', 'பிரியாணி', 'தோசை',
+           'filter coffee', 'nattu kozhi biryani', 'kuzhi', 'appam', 'மீன் குழம்பு']
+PREFIXES = ['bir', 'do', 'chet', 'mas', 'idl', 'பிரி', 'தோ', 'kot', 'fil', 'par', 'nattu ko', 'masala d']
+# What a customer has typed so far, in English, Tamil and romanized Tamil
+KEYSTROKES = [word[:length] for word in ('biryani', 'briyani', 'piriyani', 'dosai', 'thosai', 'பிரியாணி',
+                                         'தோசை', 'chettinad', 'kozhi', 'idiyappam', 'murugan', 'ghee roast')
+              for length in range(1, len(word) + 1)]
+
+# Spellings of one dish that must share a phonetic key
+SAME_KEY = [
+    ('Biryani', 'Biriyani', 'பிரியாணி'),
+    ('Pongal', 'பொங்கல்'),
+    ('Dosai', 'Thosai', 'தோசை'),
+    ('Idiyappam', 'இடியாப்பம்'),
+]
+# What a customer types, and the dish names it must suggest
+MUST_SUGGEST = {
+    'biry': ('Biryani', 'பிரியாணி'),
+    'piri': ('Biryani', 'பிரியாணி'),
+    'பிரி': ('Biryani', 'பிரியாணி'),
+    'pong': ('Pongal', 'பொங்கல்'),
+    'பொங்': ('Pongal', 'பொங்கல்'),
+}
+
+
+def check_spellings():
+    """
+    The spelling checks that fail, as messages
+    """
+    problems = []
+    for spellings in SAME_KEY:
+        keys = {spelling: phonetic_key(spelling) for spelling in spellings}
+        if len(set(keys.values())) != 1:
+            problems.append(f'different phonetic keys: {keys}')
+
+    suggest = SuggestIndex()
+    names = sorted({name for names in MUST_SUGGEST.values() for name in names})
+    suggest.load((('item', item_id), name) for item_id, name in enumerate(names, 1))
+    for query, expected in MUST_SUGGEST.items():
+        found = {suggestion['text'] for suggestion in suggest.suggest(query, limit=10)}
+        missing = set(expected) - found
+        if missing:
+            problems.append(f'{query!r} does not suggest {sorted(missing)}')
+    return problems
+
+
+def make_catalog(rng, item_count, items_per_seller):
+    docs = []
+    seller_count = max(item_count // items_per_seller, 1)
+    for seller_id in range(1, seller_count + 1):
+        name = f'{rng.choice(["Sri", "New", "Hotel", "Annai", "Murugan"])} {rng.choice(DISHES).title()} House'
+        docs.append((('seller', seller_id), {'name': name, 'address': f'{rng.choice(AREAS)}, Chennai'},
+                     {'seller_id': seller_id, 'name': name}))
+
+    for item_id in range(1, item_count + 1):
+        seller_id = rng.randint(1, seller_count)
+        if rng.random() < 0.25:
+            name = f'{rng.choice(TAMIL_DISHES)}'
+        else:
+            name = f'{rng.choice(STYLES)} {rng.choice(DISHES)}'.title()
+        description = f'{rng.choice(STYLES)} {rng.choice(DISHES)} served with {rng.choice(DISHES)}'
+        docs.append((('item', item_id),
+                     {'name': name, 'description': description, 'category': rng.choice(CATEGORIES)},
+                     {'seller_id': seller_id, 'name': name}))
+    return docs
+
+
+def linear_scan(docs, query, limit):
+    """
+    Every word must appear as a substring of some field, like chained LIKE '%word%'
+    """
+    words = tokenize(query)
+    hits = []
+    for doc_key, fields, meta in docs:
+        text = ' '.join(value for value in fields.values() if value).casefold()
+        if all(word in text for word in words):
+            hits.append(doc_key)
+    # No relevance to rank by; keep the first `limit`
+    return hits[:limit]
+
+
+def timed(fn, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--items-per-seller', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    problems = check_spellings()
+    print(f'{len(SAME_KEY)} spelling groups and {len(MUST_SUGGEST)} prefixes checked, {len(problems)} failed')
+    for problem in problems:
+        print(f'  {problem}')
+    print()
+
+    rng = random.Random(7)
+    docs = make_catalog(rng, args.items, args.items_per_seller)
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.load(docs)
+    build_s = time.perf_counter() - started
+    print(f'{len(docs)} documents indexed in {build_s:.2f} s')
+    print()
+
+    print(f'{"queries":<10} {"scan p50 ms":>12} {"scan p99 ms":>12} {"index p50 ms":>13} {"index p99 ms":>13}')
+    for label, pool in (('words', QUERIES), ('prefixes', PREFIXES)):
+        queries = [rng.choice(pool) for _ in range(args.queries)]
+        # Warm up: each term's scores are computed on its first query
+        for query in pool:
+            index.search(query, limit=args.limit)
+        # The scan is slow; time it on a sample
+        scan_p50, scan_p99 = timed(lambda query: linear_scan(docs, query, args.limit), queries[:200])
+        index_p50, index_p99 = timed(lambda query: index.search(query, limit=args.limit), queries)
+        print(f'{label:<10} {scan_p50:>12.2f} {scan_p99:>12.2f} {index_p50:>13.3f} {index_p99:>13.3f}')
+
+    suggest = SuggestIndex()
+    started = time.perf_counter()
+    suggest.load((doc_key, meta['name']) for doc_key, _, meta in docs)
+    print(f'\n{len(suggest)} suggestions indexed in {time.perf_counter() - started:.2f} s')
+    queries = [rng.choice(KEYSTROKES) for _ in range(args.queries)]
+    suggest_p50, suggest_p99 = timed(lambda query: suggest.suggest(query), queries)
+    print(f'suggest p50 {suggest_p50:.3f} ms, p99 {suggest_p99:.3f} ms '
+          f'({"ok" if suggest_p99 < 5 else "over the 5 ms budget"})')
+
+    print()
+    updates = [make_catalog(rng, 1, 1)[1] for _ in range(1000)]
+    doc_keys = [('item', rng.randint(1, args.items)) for _ in updates]
+    started = time.perf_counter()
+    for doc_key, (_, fields, meta) in zip(doc_keys, updates):
+        index.upsert(doc_key, fields, meta)
+    update_us = (time.perf_counter() - started) / len(updates) * 1e6
+    started = time.perf_counter()
+    for doc_key, (_, fields, meta) in zip(doc_keys, updates):
+        suggest.upsert(doc_key, meta['name'])
+    suggest_update_us = (time.perf_counter() - started) / len(updates) * 1e6
+    print(f'incremental upsert: {update_us:.1f} us per item (search), {suggest_update_us:.1f} us (suggest)')
+
+    for query in ('masala dosa', 'பிரி'):
+        print(f'\ntop hits for {query!r}:')
+        for score, doc_key, meta in index.search(query, limit=5):
+            print(f'  {score:6.2f}  {doc_key[0]:<6} {meta["name"]}')
+
+    for query in ('biry', 'thos', 'பிரி'):
+        print(f'\nsuggestions for {query!r}:')
+        for suggestion in suggest.suggest(query, limit=5):
+            print(f'  {suggestion["type"]:<10} {suggestion["text"]}')
+
+    if problems:
+        sys.exit(f'{len(problems)} spelling check(s) failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""
+Query plan regression check: EXPLAIN every SQL statement in app.py and fail
+if a query on a hot path does a full table scan or a filesort.
+
+Statements are pulled out of app.py with the ast module: string literals
+passed to cursor.execute(), plus `query = ...` / `query += ...` strings built
+up in the same function (every optional filter included). Bare `.format()`
+placeholders become %s, and %s parameters are replaced with literals so the
+statement can be explained.
+
+Usage: python scripts/check_query_plans.py [--seed-orders 20000] [--verbose]
+Requires the local database from database.sql and the credentials in config.py.
+With --seed-orders, synthetic users, sellers, menu items and orders are added
+under a plans_ prefix first (so the optimizer sees realistic table sizes) and
+removed afterwards.
+"""
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import MySQLdb
+from MySQLdb import cursors
+
+from config import Config
+
+# Functions on request paths that run on every page view or dispatch round
+HOT_FUNCTIONS = {
+    'login', 'customer_dashboard', 'customer_menu', 'view_cart', 'customer_orders',
+    'customer_order_detail', 'seller_dashboard', 'seller_orders', 'seller_order_detail',
+    'mark_order_ready', 'delivery_dashboard', 'get_available_orders', 'delivery_orders',
+    'delivery_order_detail', 'delivery_update_order_status', 'delivery_history',
+    'get_cart_count', 'add_order_tracking', 'load_available_agents', 'dispatch_ready_orders',
+    'claim_order', 'record_agent_assignment', 'record_agent_delivery',
+    'load_checkout', 'place_orders', 'publish_order_events',
+}
+
+# Accepted plan problems on hot paths, with the reason they are fine
+ALLOWED = {
+    ('customer_menu', 'categories'): 'categories is a small lookup table',
+    ('view_cart', 'cart'): "sorts the rows of one customer's cart",
+    ('seller_dashboard', 'oi'): 'popular items rank by an aggregate',
+    ('seller_dashboard', 'fi'): 'popular items rank by an aggregate',
+    ('get_available_orders', 'o'): 'orders in the bounding box sort by their computed distance',
+    ('get_available_orders', 's'): 'orders in the bounding box sort by their computed distance',
+}
+
+SMALL_TABLES = {'categories', 'c'}
+
+EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE|INSERT\s+INTO\s+\w+\s*(\([^)]*\))?\s*SELECT)',
+                         re.IGNORECASE)
+DATE_PARAM = re.compile(r'(created_at|updated_at|date)\s*(>=|<=|<|>|=|BETWEEN)\s*$', re.IGNORECASE)
+DATE_RANGE_END = re.compile(r'(created_at|updated_at|date)\s+BETWEEN\s+\S+\s+AND\s*$', re.IGNORECASE)
+
+
+def connect():
+    kwargs = {
+        'host': Config.MYSQL_HOST,
+        'user': Config.MYSQL_USER,
+        'db': Config.MYSQL_DB,
+        'charset': 'utf8mb4',
+        'cursorclass': getattr(cursors, Config.MYSQL_CURSORCLASS),
+    }
+    if Config.MYSQL_PASSWORD:
+        kwargs['passwd'] = Config.MYSQL_PASSWORD
+    return MySQLdb.connect(**kwargs)
+
+
+def string_value(node):
+    """
+    The SQL text of a string expression, or None if it is not a constant one
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == 'format'):
+        # Bare {} fields are IN (...) parameter lists; named fields fill in
+        # identifiers, which cannot be guessed
+        template = string_value(node.func.value)
+        if template is None or re.search(r'\{[^}]+\}', template):
+            return None
+        return template.replace('{}', '%s')
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = string_value(node.left), string_value(node.right)
+        return left + right if left is not None and right is not None else None
+    return None
+
+
+class StatementCollector(ast.NodeVisitor):
+    """
+    Collect (function, line, sql) for every execute() call with a constant query
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.function = None
+        self.strings = {}
+
+    def visit_FunctionDef(self, node):
+        outer = self.function, self.strings
+        if self.function:
+            # Nested loaders (cache misses) count as their enclosing route
+            self.strings = dict(self.strings)
+        else:
+            self.function, self.strings = node.name, {}
+        self.generic_visit(node)
+        self.function, self.strings = outer
+
+    def visit_Assign(self, node):
+        value = string_value(node.value)
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                if value is None:
+                    self.strings.pop(target.id, None)
+                else:
+                    self.strings[target.id] = value
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        value = string_value(node.value)
+        if (isinstance(node.target, ast.Name) and isinstance(node.op, ast.Add)
+                and value is not None and node.target.id in self.strings):
+            self.strings[node.target.id] += value
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if (isinstance(node.func, ast.Attribute) and node.func.attr == 'execute'
+                and node.args and self.function):
+            arg = node.args[0]
+            sql = self.strings.get(arg.id) if isinstance(arg, ast.Name) else string_value(arg)
+            if sql is not None:
+                self.statements.append((self.function, node.lineno, sql))
+        self.generic_visit(node)
+
+
+def with_literals(sql):
+    """
+    Replace %s parameters with literals of a plausible type
+    """
+    parts = sql.split('%s')
+    out = parts[0]
+    for part in parts[1:]:
+        if DATE_PARAM.search(out) or DATE_RANGE_END.search(out):
+            literal = "'2024-01-01 00:00:00'"
+        elif re.search(r'(LIMIT|OFFSET)\s*$', out, re.IGNORECASE):
+            literal = '20'
+        else:
+            literal = "'1'"
+        out += literal + part
+    return out.replace('%%', '%')
+
+
+def collect_statements(path):
+    with open(path, encoding='utf-8') as source:
+        tree = ast.parse(source.read(), path)
+    collector = StatementCollector()
+    collector.visit(tree)
+    return [(function, line, sql) for function, line, sql in collector.statements
+            if EXPLAINABLE.match(sql)]
+
+
+def seed(conn, prefix, order_count):
+    rng = random.Random(1)
+    cur = conn.cursor()
+
+    def users(user_type, count):
+        rows = [(f'{prefix}_{user_type}_{n}', 'x', f'{prefix}_{user_type}_{n}@example.com',
+                 '0000000000', f'{prefix} {user_type} {n}', user_type) for n in range(count)]
+        cur.executemany("""
+            INSERT INTO users (username, password, email, phone, full_name, user_type)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, rows)
+        cur.execute("SELECT id FROM users WHERE username LIKE %s ORDER BY id",
+                    (f'{prefix}\\_{user_type}\\_%',))
+        return [row['id'] for row in cur.fetchall()]
+
+    customers = users('customer', max(order_count // 10, 10))
+    seller_users = users('seller', max(order_count // 100, 5))
+    agents = users('delivery', max(order_count // 100, 5))
+
+    cur.executemany("""
+        INSERT INTO sellers (user_id, restaurant_name, restaurant_address, is_verified,
+                             verification_status, latitude, longitude)
+        VALUES (%s, %s, 'Seeded', TRUE, 'approved', %s, %s)
+    """, [(user_id, f'{prefix} restaurant {user_id}', rng.uniform(12.8, 13.25), rng.uniform(80.05, 80.35))
+          for user_id in seller_users])
+    cur.execute("SELECT id FROM sellers WHERE user_id IN ({})".format(
+        ', '.join(['%s'] * len(seller_users))), seller_users)
+    sellers = [row['id'] for row in cur.fetchall()]
+
+    cur.executemany("""
+        INSERT INTO delivery_agent_availability
+        (delivery_agent_id, is_available, current_latitude, current_longitude)
+        VALUES (%s, %s, %s, %s)
+    """, [(agent_id, rng.random() < 0.5, rng.uniform(12.8, 13.25), rng.uniform(80.05, 80.35))
+          for agent_id in agents])
+
+    cur.executemany("""
+        INSERT INTO food_items (seller_id, name, price, is_available)
+        VALUES (%s, %s, %s, %s)
+    """, [(seller_id, f'Item {n}', rng.randint(50, 400), rng.random() < 0.9)
+          for seller_id in sellers for n in range(20)])
+
+    statuses = ['pending', 'confirmed', 'preparing', 'ready', 'picked_up', 'delivered', 'delivered',
+                'delivered', 'cancelled']
+    rows = []
+    for n in range(order_count):
+        status = rng.choice(statuses)
+        agent_id = rng.choice(agents) if status in ('picked_up', 'delivered') else None
+        created = f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00'
+        rows.append((f'{prefix}-{n}', rng.choice(customers), rng.choice(sellers), agent_id,
+                     200, 200, 'Seeded', status, created, created))
+    for start in range(0, len(rows), 1000):
+        cur.executemany("""
+            INSERT INTO orders
+            (order_number, customer_id, seller_id, delivery_agent_id, total_amount, final_amount,
+             delivery_address, order_status, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows[start:start + 1000])
+
+    cur.execute("""
+        INSERT INTO order_tracking (order_id, status, created_at)
+        SELECT id, order_status, created_at FROM orders WHERE order_number LIKE %s
+    """, (f'{prefix}-%',))
+
+    conn.commit()
+    for table in ('users', 'sellers', 'food_items', 'orders', 'order_tracking',
+                  'delivery_agent_availability'):
+        cur.execute(f'ANALYZE TABLE {table}')
+        cur.fetchall()
+    cur.close()
+
+
+def cleanup(conn, prefix):
+    cur = conn.cursor()
+    # Sellers, menu items, orders and tracking cascade from users
+    cur.execute("DELETE FROM users WHERE username LIKE %s", (f'{prefix}\\_%',))
+    conn.commit()
+    cur.close()
+
+
+def problems(function, plan):
+    found = []
+    for row in plan:
+        table = row['table'] or ''
+        if table.startswith('<') or (function, table) in ALLOWED:
+            continue
+        if row['type'] == 'ALL' and table not in SMALL_TABLES:
+            found.append(f'full scan of {table} (~{row["rows"]} rows)')
+        if 'Using filesort' in (row['Extra'] or ''):
+            found.append(f'filesort on {table}')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--app', default=os.path.join(ROOT, 'app.py'))
+    parser.add_argument('--seed-orders', type=int, default=0,
+                        help='seed this many synthetic orders before checking')
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    statements = collect_statements(args.app)
+    conn = connect()
+    prefix = f'plans_{uuid.uuid4().hex[:6]}'
+    failures, warnings, errors = [], [], []
+
+    try:
+        if args.seed_orders:
+            seed(conn, prefix, args.seed_orders)
+
+        cur = conn.cursor()
+        for function, line, sql in statements:
+            try:
+                cur.execute('EXPLAIN ' + with_literals(sql))
+                plan = cur.fetchall()
+            except MySQLdb.Error as exc:
+                errors.append(f'app.py:{line} {function}: {exc}')
+                continue
+
+            if args.verbose:
+                print(f'app.py:{line} {function}')
+                for row in plan:
+                    print(f'    {row["table"] or "-":<12} {row["type"] or "-":<8} '
+                          f'{row["key"] or "-":<36} {row["rows"] or "-":>8}  {row["Extra"] or ""}')
+
+            for problem in problems(function, plan):
+                message = f'app.py:{line} {function}: {problem}'
+                (failures if function in HOT_FUNCTIONS else warnings).append(message)
+        cur.close()
+        conn.rollback()
+    finally:
+        if args.seed_orders:
+            cleanup(conn, prefix)
+        conn.close()
+
+    print(f'{len(statements)} statements explained')
+    for label, messages in (('error', errors), ('warning', warnings), ('FAIL', failures)):
+        for message in messages:
+            print(f'{label}: {message}')
+
+    if failures or errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Checkout load test: fill many customers' carts and check them out through
+app.place_orders from concurrent threads, reporting checkouts/sec and latency.
+
+Every cart spans --sellers-per-cart restaurants, so each checkout creates that
+many orders. After the timed run each checkout is retried with its
+idempotency key, which must return the original orders and create nothing.
+Exits non-zero if any cart is left non-empty, an order or order item is
+missing or duplicated, or a retry is not a replay.
+
+Usage: python scripts/load_checkout.py [--customers 500] [--threads 16] [--sellers-per-cart 3]
+Requires the local database from database.sql and the credentials in config.py.
+Test users, sellers, menus and orders are created under a load_ prefix and
+removed afterwards (with their rollups and platform metrics).
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MySQLdb
+import numpy as np
+from MySQLdb import cursors
+
+from app import place_orders, record_user_removed
+from config import Config
+
+
+def connect():
+    kwargs = {
+        'host': Config.MYSQL_HOST,
+        'user': Config.MYSQL_USER,
+        'db': Config.MYSQL_DB,
+        'charset': 'utf8mb4',
+        'cursorclass': getattr(cursors, Config.MYSQL_CURSORCLASS),
+    }
+    if Config.MYSQL_PASSWORD:
+        kwargs['passwd'] = Config.MYSQL_PASSWORD
+    return MySQLdb.connect(**kwargs)
+
+
+def create_users(cur, prefix, user_type, count):
+    ids = []
+    for _ in range(count):
+        name = f'{prefix}_{user_type}_{uuid.uuid4().hex[:8]}'
+        cur.execute("""
+            INSERT INTO users (username, password, email, phone, full_name, user_type)
+            VALUES (%s, 'x', %s, '0000000000', %s, %s)
+        """, (name, f'{name}@example.com', name, user_type))
+        ids.append(cur.lastrowid)
+    return ids
+
+
+def setup(conn, prefix, customer_count, seller_count, items_per_seller, rng):
+    cur = conn.cursor()
+    customer_ids = create_users(cur, prefix, 'customer', customer_count)
+    seller_user_ids = create_users(cur, prefix, 'seller', seller_count)
+
+    menus = {}
+    for user_id in seller_user_ids:
+        cur.execute("""
+            INSERT INTO sellers (user_id, restaurant_name, restaurant_address)
+            VALUES (%s, %s, 'Load test')
+        """, (user_id, prefix))
+        seller_id = cur.lastrowid
+        menus[seller_id] = []
+        for number in range(items_per_seller):
+            price = rng.randint(40, 400)
+            discount = price - rng.randint(5, 30) if rng.random() < 0.3 else None
+            cur.execute("""
+                INSERT INTO food_items (seller_id, name, price, discount_price)
+                VALUES (%s, %s, %s, %s)
+            """, (seller_id, f'{prefix} dish {number}', price, discount))
+            menus[seller_id].append(cur.lastrowid)
+
+    conn.commit()
+    cur.close()
+    return customer_ids, seller_user_ids, menus
+
+
+def fill_carts(conn, customer_ids, menus, sellers_per_cart, rng):
+    """
+    Returns the number of cart lines per customer
+    """
+    cur = conn.cursor()
+    rows = []
+    lines = {}
+    for customer_id in customer_ids:
+        items = [item_id
+                 for seller_id in rng.sample(sorted(menus), sellers_per_cart)
+                 for item_id in rng.sample(menus[seller_id], rng.randint(1, len(menus[seller_id])))]
+        rows.extend((customer_id, item_id, rng.randint(1, 4)) for item_id in items)
+        lines[customer_id] = len(items)
+    cur.executemany("INSERT INTO cart (customer_id, food_item_id, quantity) VALUES (%s, %s, %s)", rows)
+    conn.commit()
+    cur.close()
+    return lines
+
+
+def run_checkouts(customer_ids, keys, thread_count):
+    """
+    Check out every customer, spread over `thread_count` threads with one
+    connection each. Returns {customer_id: (orders, replayed)}, the latencies
+    in ms and the wall time in seconds.
+    """
+    results = {}
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(thread_count + 1)
+
+    def checker(batch):
+        conn = connect()
+        cur = conn.cursor()
+        barrier.wait()
+        for customer_id in batch:
+            started = time.perf_counter()
+            orders, replayed = place_orders(cur, customer_id, 'Load test', 'cash_on_delivery',
+                                            '', keys[customer_id])
+            if orders and not replayed:
+                conn.commit()
+            else:
+                conn.rollback()
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                results[customer_id] = (orders, replayed)
+                latencies.append(elapsed)
+        cur.close()
+        conn.close()
+
+    threads = [threading.Thread(target=checker, args=(customer_ids[index::thread_count],))
+               for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return results, latencies, time.perf_counter() - started
+
+
+def verify(conn, customer_ids, lines, results, sellers_per_cart):
+    problems = []
+    placeholders = ', '.join(['%s'] * len(customer_ids))
+    cur = conn.cursor()
+
+    cur.execute(f"SELECT COUNT(*) as n FROM cart WHERE customer_id IN ({placeholders})", customer_ids)
+    if cur.fetchone()['n']:
+        problems.append('carts were not emptied')
+
+    cur.execute(f"""
+        SELECT o.customer_id, COUNT(DISTINCT o.id) as orders, COUNT(oi.id) as items
+        FROM orders o
+        LEFT JOIN order_items oi ON oi.order_id = o.id
+        WHERE o.customer_id IN ({placeholders})
+        GROUP BY o.customer_id
+    """, customer_ids)
+    counts = {row['customer_id']: row for row in cur.fetchall()}
+    for customer_id in customer_ids:
+        row = counts.get(customer_id)
+        if not row or row['orders'] != sellers_per_cart or row['items'] != lines[customer_id]:
+            problems.append(f'customer {customer_id}: wrong orders or order items')
+        orders, replayed = results[customer_id]
+        if replayed or len(orders) != sellers_per_cart:
+            problems.append(f'customer {customer_id}: checkout returned {len(orders)} orders')
+    cur.close()
+    return problems
+
+
+def cleanup(conn, prefix):
+    cur = conn.cursor()
+    # Customers first: their orders cascade, then the sellers have none left
+    cur.execute("""
+        SELECT id FROM users WHERE username LIKE %s
+        ORDER BY user_type = 'seller', id
+    """, (f'{prefix}\\_%',))
+    for row in cur.fetchall():
+        record_user_removed(cur, row['id'])
+        cur.execute("DELETE FROM users WHERE id = %s", (row['id'],))
+    conn.commit()
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=500, help='checkouts in the timed run')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--sellers', type=int, default=20)
+    parser.add_argument('--items-per-seller', type=int, default=8)
+    parser.add_argument('--sellers-per-cart', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    prefix = f'load_{uuid.uuid4().hex[:6]}'
+    admin = connect()
+    problems = []
+
+    try:
+        customer_ids, _, menus = setup(admin, prefix, args.customers, args.sellers,
+                                       args.items_per_seller, rng)
+        lines = fill_carts(admin, customer_ids, menus, args.sellers_per_cart, rng)
+        keys = {customer_id: uuid.uuid4().hex for customer_id in customer_ids}
+
+        results, latencies, elapsed = run_checkouts(customer_ids, keys, args.threads)
+        admin.commit()  # fresh snapshot for verification
+        problems += verify(admin, customer_ids, lines, results, args.sellers_per_cart)
+
+        p50, p99 = np.percentile(latencies, 50), np.percentile(latencies, 99)
+        print(f'{len(latencies)} checkouts ({len(latencies) * args.sellers_per_cart} orders) '
+              f'on {args.threads} threads in {elapsed:.2f} s: {len(latencies) / elapsed:.1f} checkouts/sec')
+        print(f'latency p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {max(latencies):.2f} ms')
+
+        # Retry every checkout with its key: the original orders come back, nothing new is written
+        replays, _, replay_elapsed = run_checkouts(customer_ids, keys, args.threads)
+        for customer_id in customer_ids:
+            orders, replayed = replays[customer_id]
+            original = [order['id'] for order in results[customer_id][0]]
+            if not replayed or [order['id'] for order in orders] != original:
+                problems.append(f'customer {customer_id}: retry was not a replay')
+        admin.commit()
+        problems += verify(admin, customer_ids, lines, results, args.sellers_per_cart)
+        print(f'{len(replays)} retries replayed in {replay_elapsed:.2f} s')
+    finally:
+        cleanup(admin, prefix)
+        admin.close()
+
+    if problems:
+        for problem in problems[:20]:
+            print(problem)
+        sys.exit(f'{len(problems)} problem(s) found')
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Location ingestion load test: many delivery agents each POST a batch of GPS
+points to /delivery/api/locations every few seconds, from concurrent threads,
+while the location flusher writes the latest positions to MySQL behind them.
+
+Reports the report rate achieved against the target (agents / interval),
+request latency, and how many rows the flushes wrote for how many points.
+After the run a final flush must leave every agent's row in
+delivery_agent_availability (and users) at the newest point it sent; exits
+non-zero if one is missing or stale, a request failed, or the target rate
+was not reached.
+
+Usage: python scripts/load_locations.py [--agents 10000] [--interval 5] [--duration 60] [--threads 32]
+Requires the local database from database.sql and the credentials in config.py.
+Test agents are created under a load_ prefix and removed afterwards.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MySQLdb
+import numpy as np
+from MySQLdb import cursors
+
+from app import agent_locations, app, flush_locations, record_user_removed
+from config import Config
+
+
+def connect():
+    kwargs = {
+        'host': Config.MYSQL_HOST,
+        'user': Config.MYSQL_USER,
+        'db': Config.MYSQL_DB,
+        'charset': 'utf8mb4',
+        'cursorclass': getattr(cursors, Config.MYSQL_CURSORCLASS),
+    }
+    if Config.MYSQL_PASSWORD:
+        kwargs['passwd'] = Config.MYSQL_PASSWORD
+    return MySQLdb.connect(**kwargs)
+
+
+def create_agents(conn, prefix, count):
+    cur = conn.cursor()
+    rows = []
+    for number in range(count):
+        name = f'{prefix}_delivery_{number}'
+        rows.append((name, f'{name}@example.com', name))
+    cur.executemany("""
+        INSERT INTO users (username, password, email, phone, full_name, user_type)
+        VALUES (%s, 'x', %s, '0000000000', %s, 'delivery')
+    """, rows)
+    cur.execute("SELECT id FROM users WHERE username LIKE %s ORDER BY id", (f'{prefix}\\_%',))
+    agent_ids = [row['id'] for row in cur.fetchall()]
+    conn.commit()
+    cur.close()
+    return agent_ids
+
+
+def login(agent_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = agent_id
+        sess['user_type'] = 'delivery'
+    return client
+
+
+def run_agents(agent_ids, interval, duration, points_per_batch, thread_count, seed):
+    """
+    Every agent reports once per `interval` seconds, the agents' reports
+    spread evenly over the interval. Returns the last point each agent sent,
+    the latencies in ms, the failed request count and the wall time.
+    """
+    sent = {}
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(thread_count + 1)
+
+    def reporter(batch, offset):
+        rng = random.Random(seed + offset)
+        clients = {agent_id: login(agent_id) for agent_id in batch}
+        # Chennai, give or take a few kilometres
+        positions = {agent_id: [13.0827 + rng.uniform(-0.1, 0.1), 80.2707 + rng.uniform(-0.1, 0.1)]
+                     for agent_id in batch}
+        step = interval / max(len(batch), 1)
+        barrier.wait()
+        started = time.monotonic()
+        round_number = 0
+        while True:
+            round_start = started + round_number * interval
+            if round_start - started >= duration:
+                break
+            for index, agent_id in enumerate(batch):
+                delay = round_start + index * step - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                position = positions[agent_id]
+                now = time.time()
+                points = []
+                for number in range(points_per_batch):
+                    position[0] += rng.uniform(-0.0005, 0.0005)
+                    position[1] += rng.uniform(-0.0005, 0.0005)
+                    points.append({'latitude': round(position[0], 6), 'longitude': round(position[1], 6),
+                                   'timestamp': now - (points_per_batch - 1 - number)})
+                request_started = time.perf_counter()
+                response = clients[agent_id].post('/delivery/api/locations', json={'points': points})
+                elapsed = (time.perf_counter() - request_started) * 1000
+                ok = response.status_code == 200 and response.get_json()['success']
+                with lock:
+                    latencies.append(elapsed)
+                    if ok:
+                        sent[agent_id] = (points[-1]['latitude'], points[-1]['longitude'])
+                    else:
+                        failures[0] += 1
+            round_number += 1
+
+    threads = [threading.Thread(target=reporter, args=(agent_ids[index::thread_count], index))
+               for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return sent, latencies, failures[0], time.perf_counter() - started
+
+
+def verify(conn, sent):
+    problems = []
+    cur = conn.cursor()
+    agent_ids = sorted(sent)
+    stored = {}
+    for start in range(0, len(agent_ids), 1000):
+        chunk = agent_ids[start:start + 1000]
+        cur.execute("""
+            SELECT da.delivery_agent_id, da.current_latitude, da.current_longitude,
+                   u.latitude, u.longitude
+            FROM delivery_agent_availability da
+            JOIN users u ON u.id = da.delivery_agent_id
+            WHERE da.delivery_agent_id IN ({})
+        """.format(', '.join(['%s'] * len(chunk))), chunk)
+        stored.update((row['delivery_agent_id'], row) for row in cur.fetchall())
+    cur.close()
+
+    for agent_id, (latitude, longitude) in sent.items():
+        row = stored.get(agent_id)
+        if row is None:
+            problems.append(f'agent {agent_id}: no position written')
+            continue
+        memory = agent_locations.get(agent_id)
+        if memory is None:
+            problems.append(f'agent {agent_id}: no position in memory')
+            continue
+        for label, lat, lng in (('availability', row['current_latitude'], row['current_longitude']),
+                                ('users', row['latitude'], row['longitude']),
+                                ('memory', memory[0], memory[1])):
+            if abs(float(lat) - latitude) > 1e-6 or abs(float(lng) - longitude) > 1e-6:
+                problems.append(f'agent {agent_id}: {label} position is not the last one sent')
+    return problems
+
+
+def cleanup(conn, prefix):
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM users WHERE username LIKE %s", (f'{prefix}\\_%',))
+    for row in cur.fetchall():
+        agent_locations.forget(row['id'])
+        record_user_removed(cur, row['id'])
+        cur.execute("DELETE FROM users WHERE id = %s", (row['id'],))
+    conn.commit()
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--agents', type=int, default=10000)
+    parser.add_argument('--interval', type=float, default=Config.LOCATION_REPORT_SECONDS,
+                        help='seconds between one agent\'s reports')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to report for')
+    parser.add_argument('--points', type=int, default=5, help='GPS points per report')
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    prefix = f'load_{uuid.uuid4().hex[:6]}'
+    admin = connect()
+    problems = []
+
+    try:
+        agent_ids = create_agents(admin, prefix, args.agents)
+        sent, latencies, failures, elapsed = run_agents(agent_ids, args.interval, args.duration,
+                                                         args.points, args.threads, seed=25)
+        flush_locations()
+        admin.commit()  # fresh snapshot for verification
+        problems += verify(admin, sent)
+        if failures:
+            problems.append(f'{failures} report(s) failed')
+
+        target = args.agents / args.interval
+        rate = len(latencies) / elapsed
+        stats = agent_locations.stats()
+        print(f'{len(latencies)} reports ({len(latencies) * args.points} points) from {args.agents} agents '
+              f'on {args.threads} threads in {elapsed:.2f} s: {rate:.0f} reports/sec (target {target:.0f})')
+        print(f'latency p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms, '
+              f'max {max(latencies):.2f} ms')
+        print(f'{stats["flushes"]} flushes wrote {stats["rows_written"]} rows for {stats["points"]} points, '
+              f'last flush {stats["last_flush_ms"]} ms, {stats["flush_errors"]} flush errors')
+        if rate < target * 0.95:
+            problems.append(f'reached {rate:.0f} reports/sec, below the target of {target:.0f}')
+    finally:
+        cleanup(admin, prefix)
+        admin.close()
+
+    if problems:
+        for problem in problems[:20]:
+            print(problem)
+        sys.exit(f'{len(problems)} problem(s) found')
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Replay a synthetic stream of ready orders and delivery agents through the
+per-order greedy assignment and the batch min-cost dispatcher, and report
+assignment latency and pickup distance for each.
+
+Usage: python scripts/simulate_dispatch.py [--agents 300] [--rate 0.15] [--minutes 30] [--window 5]
+Runs entirely in memory with the same scoring as the app; no database needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from dispatch import assignment_costs, greedy_assignment, solve_assignment
+from distance import distance_matrix
+
+# Roughly the Chennai metro area
+LAT_RANGE = (12.80, 13.25)
+LNG_RANGE = (80.05, 80.35)
+
+
+def random_point(rng):
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+
+
+def nearby_point(rng, point, spread=0.03):
+    # Customers within a few km of the restaurant
+    return point[0] + rng.uniform(-spread, spread), point[1] + rng.uniform(-spread, spread)
+
+
+def make_stream(seed, agent_count, rate, seconds):
+    rng = random.Random(seed)
+    agents = [{'id': agent_id, 'position': random_point(rng),
+               'total_deliveries': rng.randint(0, 60)} for agent_id in range(agent_count)]
+
+    orders = []
+    for second in range(seconds):
+        # Poisson arrivals per second
+        count = np.random.default_rng(seed + second).poisson(rate)
+        for _ in range(count):
+            restaurant = random_point(rng)
+            orders.append({'id': len(orders), 'ready_at': second,
+                           'restaurant': restaurant, 'customer': nearby_point(rng, restaurant)})
+    return agents, orders
+
+
+def simulate(policy, agents, orders, seconds, window, speed_kmh, handling_minutes):
+    agents = [dict(agent, busy_until=0) for agent in agents]
+    arrivals = iter(orders)
+    upcoming = next(arrivals, None)
+    pending = []
+
+    latencies, pickups, solve_times = [], [], []
+
+    for second in range(seconds + 3600):
+        while upcoming and upcoming['ready_at'] <= second:
+            pending.append(upcoming)
+            upcoming = next(arrivals, None)
+
+        if second >= seconds and not pending and upcoming is None:
+            break
+
+        # Greedy assigns every second as orders become ready; batch waits for the window
+        if not pending or (policy == 'batch' and second % window):
+            continue
+
+        free = [agent for agent in agents if agent['busy_until'] <= second]
+        if not free:
+            continue
+
+        started = time.perf_counter()
+        distances = distance_matrix(
+            [order['restaurant'][0] for order in pending],
+            [order['restaurant'][1] for order in pending],
+            [agent['position'][0] for agent in free],
+            [agent['position'][1] for agent in free]
+        )
+        costs = assignment_costs(distances, free)
+        pairs = solve_assignment(costs) if policy == 'batch' else greedy_assignment(costs)
+        solve_ms = (time.perf_counter() - started) * 1000
+        solve_times.append(solve_ms)
+
+        assigned_rows = set()
+        for row, col in pairs:
+            order, agent = pending[row], free[col]
+            pickup = float(distances[row, col])
+            drop = float(distance_matrix([order['restaurant'][0]], [order['restaurant'][1]],
+                                         [order['customer'][0]], [order['customer'][1]])[0, 0])
+
+            latencies.append((second - order['ready_at']) * 1000 + solve_ms)
+            pickups.append(pickup)
+
+            trip_seconds = (pickup + drop) / speed_kmh * 3600 + handling_minutes * 60
+            agent['busy_until'] = second + int(trip_seconds)
+            agent['position'] = order['customer']
+            agent['total_deliveries'] += 1
+            assigned_rows.add(row)
+
+        pending = [order for row, order in enumerate(pending) if row not in assigned_rows]
+
+    return {
+        'assigned': len(pickups),
+        'unassigned': len(orders) - len(pickups),
+        'latency_ms_avg': np.mean(latencies) if latencies else 0.0,
+        'latency_ms_p95': np.percentile(latencies, 95) if latencies else 0.0,
+        'pickup_km_avg': np.mean(pickups) if pickups else 0.0,
+        'pickup_km_p95': np.percentile(pickups, 95) if pickups else 0.0,
+        'solve_ms_avg': np.mean(solve_times) if solve_times else 0.0,
+        'solve_ms_max': max(solve_times) if solve_times else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--agents', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=0.15, help='ready orders per second')
+    parser.add_argument('--minutes', type=int, default=30)
+    parser.add_argument('--window', type=int, default=5, help='batch dispatch window in seconds')
+    parser.add_argument('--speed', type=float, default=20.0, help='agent speed in km/h')
+    parser.add_argument('--handling', type=float, default=5.0, help='minutes spent at pickup/drop')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    seconds = args.minutes * 60
+    agents, orders = make_stream(args.seed, args.agents, args.rate, seconds)
+    print(f'{len(orders)} orders over {args.minutes} min, {args.agents} agents, '
+          f'batch window {args.window}s')
+    print()
+
+    columns = ('assigned', 'unassigned', 'latency_ms_avg', 'latency_ms_p95',
+               'pickup_km_avg', 'pickup_km_p95', 'solve_ms_avg', 'solve_ms_max')
+    print(f'{"policy":<8}' + ''.join(f'{column:>16}' for column in columns))
+    for policy in ('greedy', 'batch'):
+        result = simulate(policy, agents, orders, seconds, args.window, args.speed, args.handling)
+        print(f'{policy:<8}' + ''.join(
+            f'{result[column]:>16}' if isinstance(result[column], int) else f'{result[column]:>16.2f}'
+            for column in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Fire concurrent claims through app.claim_order and check that every race has
+exactly one winner:
+
+  agents   many agents accept the same ready order at once
+  orders   one agent accepts many ready orders at once
+
+Each claimer uses its own connection and all of them start together on a
+barrier. Reports claim latency (claim + commit) and exits non-zero if any
+round has more or fewer than one winner, or the p99 exceeds --max-p99-ms.
+
+Usage: python scripts/stress_claim_order.py [--claimers 100] [--rounds 5] [--max-p99-ms 250]
+Requires the local database from database.sql and the credentials in config.py;
+each claimer holds a connection, so keep --claimers below max_connections.
+Test users, sellers and orders are created under a stress_ prefix and removed afterwards.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MySQLdb
+import numpy as np
+from MySQLdb import cursors
+
+from app import claim_order
+from config import Config
+
+
+def connect():
+    kwargs = {
+        'host': Config.MYSQL_HOST,
+        'user': Config.MYSQL_USER,
+        'db': Config.MYSQL_DB,
+        'charset': 'utf8mb4',
+        'cursorclass': getattr(cursors, Config.MYSQL_CURSORCLASS),
+    }
+    if Config.MYSQL_PASSWORD:
+        kwargs['passwd'] = Config.MYSQL_PASSWORD
+    return MySQLdb.connect(**kwargs)
+
+
+def create_user(cur, prefix, user_type):
+    name = f'{prefix}_{user_type}_{uuid.uuid4().hex[:8]}'
+    cur.execute("""
+        INSERT INTO users (username, password, email, phone, full_name, user_type)
+        VALUES (%s, 'x', %s, '0000000000', %s, %s)
+    """, (name, f'{name}@example.com', name, user_type))
+    return cur.lastrowid
+
+
+def setup(conn, prefix, agent_count):
+    cur = conn.cursor()
+    customer_id = create_user(cur, prefix, 'customer')
+    seller_user_id = create_user(cur, prefix, 'seller')
+    cur.execute("""
+        INSERT INTO sellers (user_id, restaurant_name, restaurant_address)
+        VALUES (%s, %s, 'Stress test')
+    """, (seller_user_id, prefix))
+    seller_id = cur.lastrowid
+
+    agent_ids = []
+    for _ in range(agent_count):
+        agent_id = create_user(cur, prefix, 'delivery')
+        cur.execute("""
+            INSERT INTO delivery_agent_availability (delivery_agent_id, is_available)
+            VALUES (%s, TRUE)
+        """, (agent_id,))
+        agent_ids.append(agent_id)
+
+    conn.commit()
+    cur.close()
+    return customer_id, seller_id, agent_ids
+
+
+def create_orders(conn, prefix, customer_id, seller_id, count):
+    cur = conn.cursor()
+    order_ids = []
+    for _ in range(count):
+        cur.execute("""
+            INSERT INTO orders
+            (order_number, customer_id, seller_id, total_amount, final_amount,
+             delivery_address, order_status)
+            VALUES (%s, %s, %s, 100, 100, 'Stress test', 'ready')
+        """, (f'{prefix}-{uuid.uuid4().hex[:12]}', customer_id, seller_id))
+        order_ids.append(cur.lastrowid)
+    conn.commit()
+    cur.close()
+    return order_ids
+
+
+def reset_agents(conn, agent_ids):
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE delivery_agent_availability SET is_available = TRUE
+        WHERE delivery_agent_id IN ({})
+    """.format(', '.join(['%s'] * len(agent_ids))), agent_ids)
+    conn.commit()
+    cur.close()
+
+
+def cleanup(conn, prefix):
+    cur = conn.cursor()
+    # Orders, sellers, availability and stats cascade from users
+    cur.execute("DELETE FROM users WHERE username LIKE %s", (f'{prefix}\\_%',))
+    conn.commit()
+    cur.close()
+
+
+def race(connections, claims):
+    """
+    Run claims[i] = (order_id, agent_id) on connections[i], all at once.
+    Returns the claims that won and the per-claim latencies in ms.
+    """
+    barrier = threading.Barrier(len(claims))
+    results = [None] * len(claims)
+
+    def claimer(index):
+        conn = connections[index]
+        order_id, agent_id = claims[index]
+        cur = conn.cursor()
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            error = claim_order(cur, order_id, agent_id)
+            if error:
+                conn.rollback()
+            else:
+                conn.commit()
+        except MySQLdb.OperationalError as exc:
+            # Deadlock victims and lock wait timeouts count as lost claims
+            conn.rollback()
+            error = str(exc)
+        results[index] = (error, (time.perf_counter() - started) * 1000)
+        cur.close()
+
+    threads = [threading.Thread(target=claimer, args=(index,)) for index in range(len(claims))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [claims[index] for index, (error, _) in enumerate(results) if error is None]
+    return winners, [latency for _, latency in results]
+
+
+def verify(conn, winners, order_ids, agent_ids):
+    """
+    The database must agree with the single winner of the race
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, delivery_agent_id FROM orders WHERE id IN ({})
+    """.format(', '.join(['%s'] * len(order_ids))), order_ids)
+    assigned = {row['id']: row['delivery_agent_id'] for row in cur.fetchall() if row['delivery_agent_id']}
+
+    cur.execute("""
+        SELECT delivery_agent_id FROM delivery_agent_availability
+        WHERE delivery_agent_id IN ({}) AND is_available = FALSE
+    """.format(', '.join(['%s'] * len(agent_ids))), agent_ids)
+    busy = {row['delivery_agent_id'] for row in cur.fetchall()}
+    cur.close()
+
+    return assigned == dict(winners) and busy == {agent_id for _, agent_id in winners}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--claimers', type=int, default=100, help='concurrent claims per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--max-p99-ms', type=float, default=250.0)
+    args = parser.parse_args()
+
+    prefix = f'stress_{uuid.uuid4().hex[:6]}'
+    admin = connect()
+    connections = [connect() for _ in range(args.claimers)]
+    failures = 0
+    latencies = []
+
+    try:
+        customer_id, seller_id, agent_ids = setup(admin, prefix, args.claimers)
+
+        for scenario in ('agents', 'orders'):
+            for round_number in range(1, args.rounds + 1):
+                reset_agents(admin, agent_ids)
+
+                if scenario == 'agents':
+                    order_ids = create_orders(admin, prefix, customer_id, seller_id, 1)
+                    claims = [(order_ids[0], agent_id) for agent_id in agent_ids]
+                    round_agents = agent_ids
+                else:
+                    order_ids = create_orders(admin, prefix, customer_id, seller_id, args.claimers)
+                    claims = [(order_id, agent_ids[0]) for order_id in order_ids]
+                    round_agents = agent_ids[:1]
+
+                winners, round_latencies = race(connections, claims)
+                latencies.extend(round_latencies)
+
+                admin.commit()  # fresh snapshot for verification
+                ok = len(winners) == 1 and verify(admin, winners, order_ids, round_agents)
+                failures += not ok
+                print(f'{scenario:<7} round {round_number}: {len(winners)} winner(s) of {len(claims)}, '
+                      f'p99 {np.percentile(round_latencies, 99):7.2f} ms  {"ok" if ok else "FAILED"}')
+    finally:
+        for conn in connections:
+            conn.close()
+        cleanup(admin, prefix)
+        admin.close()
+
+    p50, p99 = np.percentile(latencies, 50), np.percentile(latencies, 99)
+    print(f'\n{len(latencies)} claims: p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {max(latencies):.2f} ms')
+
+    if failures:
+        sys.exit(f'{failures} round(s) did not have exactly one winner')
+    if p99 > args.max_p99_ms:
+        sys.exit(f'p99 {p99:.2f} ms exceeds {args.max_p99_ms} ms')
+
+
+if __name__ == '__main__':
+    main()
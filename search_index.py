@@ -0,0 +1,478 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+
+# Field weights: a hit in a dish or restaurant name outranks one in a description
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 1.5,
+    'address': 1.0,
+    'description': 1.0,
+}
+
+PREFIX_WEIGHT = 0.7     # a prefix (type-ahead) match counts for less than the whole word
+MAX_EXPANSIONS = 50     # terms a prefix may expand to
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """
+    Split Tamil or English text into lower-case word tokens.
+
+    A token is a run of letters (L*), marks (M*) and digits (N*). Tamil vowel
+    signs and the virama are marks, so they stay inside the word instead of
+    splitting it the way a [a-z0-9]+ pattern would.
+    """
+    if not text:
+        return []
+
+    tokens = []
+    current = []
+    for char in unicodedata.normalize('NFC', text).casefold():
+        if unicodedata.category(char)[0] in 'LMN':
+            current.append(char)
+        elif current:
+            tokens.append(''.join(current))
+            current = []
+    if current:
+        tokens.append(''.join(current))
+    return tokens
+
+
+class SearchIndex:
+    """
+    In-process inverted index over restaurants and dishes.
+
+    Documents are keyed ('seller', id) or ('item', id) and carry a few text
+    fields plus a `meta` dict returned with each hit. Ranking is BM25 over
+    field-weighted term frequencies; the last query word also matches as a
+    prefix so results update while the customer is still typing. The
+    vocabulary is kept sorted, so a prefix is a bisect plus a short scan.
+
+    Each term's postings are scored once and kept sorted by score, so a
+    one-word query merges the top of a few lists instead of scoring every
+    document containing the word. A term's scores are recomputed after its
+    postings change, and every term's once the document count or average
+    length they were computed with has moved, so all the terms of a query
+    are scored against the same collection statistics.
+    """
+
+    def __init__(self):
+        self.version = None      # id of the last search_changes row applied
+        self.loaded_at = None
+
+        self._postings = {}      # term -> {doc_key: weighted tf}
+        self._docs = {}          # doc_key -> (length, terms, meta)
+        self._terms = []         # sorted vocabulary
+        self._impacts = {}       # term -> ([(score, doc_key)] best first, {doc_key: score}); built on first use
+        self._impacts_stats = None  # (doc_count, average_length) the cached impacts were scored with
+        self._seller_items = {}  # seller id -> set of item ids
+        self._total_length = 0.0
+        self._bulk = False       # load() sorts the vocabulary once instead of per new term
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _index(self, doc_key, fields, meta):
+        weighted = {}
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for token in tokenize(text):
+                weighted[token] = weighted.get(token, 0.0) + weight
+
+        length = sum(weighted.values())
+        for term, tf in weighted.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if not self._bulk:
+                    bisect.insort(self._terms, term)
+            postings[doc_key] = tf
+            self._impacts.pop(term, None)
+
+        self._docs[doc_key] = (length, tuple(weighted), meta)
+        self._total_length += length
+        if doc_key[0] == 'item':
+            self._seller_items.setdefault(meta['seller_id'], set()).add(doc_key[1])
+
+    def _unindex(self, doc_key):
+        doc = self._docs.pop(doc_key, None)
+        if doc is None:
+            return
+
+        length, terms, meta = doc
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_key, None)
+            self._impacts.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._terms, term)
+                if position < len(self._terms) and self._terms[position] == term:
+                    del self._terms[position]
+
+        if doc_key[0] == 'item':
+            items = self._seller_items.get(meta['seller_id'])
+            if items:
+                items.discard(doc_key[1])
+                if not items:
+                    del self._seller_items[meta['seller_id']]
+
+    def load(self, docs, version=None):
+        """
+        Replace the index contents with (doc_key, fields, meta) tuples
+        """
+        with self._lock:
+            self._postings, self._docs, self._terms, self._impacts = {}, {}, [], {}
+            self._impacts_stats = None
+            self._seller_items, self._total_length = {}, 0.0
+            self._bulk = True
+            try:
+                for doc_key, fields, meta in docs:
+                    self._index(doc_key, fields, meta)
+            finally:
+                self._bulk = False
+            self._terms = sorted(self._postings)
+            self.version = version
+            self.loaded_at = time.monotonic()
+
+    def upsert(self, doc_key, fields, meta):
+        with self._lock:
+            self._unindex(doc_key)
+            self._index(doc_key, fields, meta)
+
+    def remove(self, doc_key):
+        with self._lock:
+            self._unindex(doc_key)
+
+    def seller_items(self, seller_id):
+        with self._lock:
+            return set(self._seller_items.get(seller_id, ()))
+
+    def expand(self, prefix, limit=MAX_EXPANSIONS):
+        """
+        Vocabulary terms starting with `prefix`, in sorted order
+        """
+        with self._lock:
+            start = bisect.bisect_left(self._terms, prefix)
+            terms = []
+            for term in self._terms[start:start + limit]:
+                if not term.startswith(prefix):
+                    break
+                terms.append(term)
+            return terms
+
+    def _score(self, term, doc_key, doc_count, average_length):
+        postings = self._postings[term]
+        tf = postings.get(doc_key)
+        if tf is None:
+            return 0.0
+        idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        length = self._docs[doc_key][0]
+        return idf * tf * (BM25_K1 + 1) / (
+            tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+
+    def _term_impacts(self, term, doc_count, average_length):
+        if self._impacts_stats != (doc_count, average_length):
+            # Documents were added or removed since; every cached score is off
+            self._impacts, self._impacts_stats = {}, (doc_count, average_length)
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            by_doc = {doc_key: self._score(term, doc_key, doc_count, average_length)
+                      for doc_key in self._postings[term]}
+            ranked = sorted(((score, doc_key) for doc_key, score in by_doc.items()),
+                            key=lambda hit: (-hit[0], hit[1]))
+            impacts = self._impacts[term] = (ranked, by_doc)
+        return impacts
+
+    def _word_scores(self, terms, doc_count, average_length):
+        """
+        {doc_key: score} for one query word; a word scores by its best-matching term
+        """
+        if len(terms) == 1 and terms[0][1] == 1.0:
+            return self._term_impacts(terms[0][0], doc_count, average_length)[1]
+
+        merged = {}
+        for term, weight in terms:
+            for doc_key, score in self._term_impacts(term, doc_count, average_length)[1].items():
+                score *= weight
+                if score > merged.get(doc_key, 0.0):
+                    merged[doc_key] = score
+        return merged
+
+    def search(self, query, limit=20, kind=None, prefix=True):
+        """
+        Rank documents matching every word of `query`. Returns a list of
+        (score, doc_key, meta), best first. `kind` limits hits to 'seller'
+        or 'item' documents.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+
+            # (term, weight) alternatives for each word; only the word being typed is incomplete
+            word_terms = []
+            for position, word in enumerate(words):
+                if prefix and position == len(words) - 1:
+                    terms = [(term, 1.0 if term == word else PREFIX_WEIGHT) for term in self.expand(word)]
+                else:
+                    terms = [(word, 1.0)] if word in self._postings else []
+                if not terms:
+                    return []
+                word_terms.append(terms)
+
+            if len(word_terms) == 1:
+                # Merge the per-term lists, best first, until `limit` documents are found
+                streams = [((-score * weight, doc_key) for score, doc_key
+                            in self._term_impacts(term, doc_count, average_length)[0])
+                           for term, weight in word_terms[0]]
+                ranked, seen = [], set()
+                for negative_score, doc_key in heapq.merge(*streams):
+                    if doc_key in seen or (kind and doc_key[0] != kind):
+                        continue
+                    seen.add(doc_key)
+                    ranked.append((-negative_score, doc_key))
+                    if len(ranked) >= limit:
+                        break
+            else:
+                # Intersect from the rarest word up, always iterating the smaller side
+                word_terms.sort(key=lambda terms: sum(len(self._postings[term]) for term, _ in terms))
+                scores = None
+                for terms in word_terms:
+                    by_doc = self._word_scores(terms, doc_count, average_length)
+                    if scores is None:
+                        scores = ({doc_key: score for doc_key, score in by_doc.items() if doc_key[0] == kind}
+                                  if kind else dict(by_doc))
+                    elif len(by_doc) < len(scores):
+                        scores = {doc_key: scores[doc_key] + score
+                                  for doc_key, score in by_doc.items() if doc_key in scores}
+                    else:
+                        scores = {doc_key: total + by_doc[doc_key]
+                                  for doc_key, total in scores.items() if doc_key in by_doc}
+                    if not scores:
+                        return []
+
+                ranked = heapq.nlargest(limit, ((score, doc_key) for doc_key, score in scores.items()))
+
+            return [(score, doc_key, self._docs[doc_key][2]) for score, doc_key in ranked]
+
+
+TAMIL_VOWELS = {
+    'அ': 'a', 'ஆ': 'aa', 'இ': 'i', 'ஈ': 'ii', 'உ': 'u', 'ஊ': 'uu', 'எ': 'e', 'ஏ': 'ee',
+    'ஐ': 'ai', 'ஒ': 'o', 'ஓ': 'oo', 'ஔ': 'au', 'ஃ': 'k',
+}
+TAMIL_CONSONANTS = {
+    'க': 'k', 'ங': 'ng', 'ச': 's', 'ஞ': 'nj', 'ட': 'd', 'ண': 'n', 'த': 'th', 'ந': 'n',
+    'ப': 'p', 'ம': 'm', 'ய': 'y', 'ர': 'r', 'ல': 'l', 'வ': 'v', 'ழ': 'zh', 'ள': 'l',
+    'ற': 'r', 'ன': 'n', 'ஜ': 'j', 'ஷ': 'sh', 'ஸ': 's', 'ஹ': 'h',
+}
+TAMIL_VOWEL_SIGNS = {
+    'ா': 'aa', 'ி': 'i', 'ீ': 'ii', 'ு': 'u', 'ூ': 'uu', 'ெ': 'e', 'ே': 'ee', 'ை': 'ai',
+    'ொ': 'o', 'ோ': 'oo', 'ௌ': 'au',
+}
+TAMIL_VIRAMA = '்'
+
+# Applied in order to transliterated text, so that the ways a dish is spelt in
+# English ("biryani", "biriyani") and its Tamil name land on the same key.
+# ங்க transliterates to "ngk" where English writes "ng" (பொங்கல், "pongal").
+PHONETIC_FOLDS = (
+    ('zh', 'l'), ('th', 't'), ('dh', 't'), ('sh', 's'), ('ch', 's'), ('nj', 'n'), ('ngk', 'ng'),
+    ('ng', 'n'), ('h', ''), ('b', 'p'), ('d', 't'), ('g', 'k'), ('j', 's'), ('c', 'k'), ('q', 'k'),
+    ('f', 'p'), ('w', 'v'), ('z', 's'), ('x', 'ks'), ('e', 'i'), ('o', 'u'), ('iy', 'i'),
+)
+# The i/y glide: "rya", "riya" and ரியா all become "ria"
+CONSONANT_Y = re.compile(r'([^aiu ])y')
+
+SUGGEST_SCAN_LIMIT = 400  # sorted keys examined per query
+
+
+def transliterate(text):
+    """
+    Romanize Tamil script (other characters pass through), e.g. பிரியாணி -> piriyaani
+    """
+    out = []
+    chars = unicodedata.normalize('NFC', text)
+    for position, char in enumerate(chars):
+        if char in TAMIL_CONSONANTS:
+            following = chars[position + 1] if position + 1 < len(chars) else ''
+            out.append(TAMIL_CONSONANTS[char])
+            # The inherent vowel, unless a vowel sign or virama follows
+            if following not in TAMIL_VOWEL_SIGNS and following != TAMIL_VIRAMA:
+                out.append('a')
+        elif char in TAMIL_VOWEL_SIGNS:
+            out.append(TAMIL_VOWEL_SIGNS[char])
+        elif char in TAMIL_VOWELS:
+            out.append(TAMIL_VOWELS[char])
+        elif char != TAMIL_VIRAMA:
+            out.append(char)
+    return ''.join(out)
+
+
+def phonetic_key(text):
+    """
+    Spelling-insensitive Latin key for Tamil or English text
+    """
+    key = transliterate(' '.join(tokenize(text)))
+    for source, target in PHONETIC_FOLDS:
+        key = key.replace(source, target)
+    key = CONSONANT_Y.sub(r'\1i', key)
+    # Long vowels and doubled consonants are spelt both ways
+    folded = []
+    for char in key:
+        if not folded or char != folded[-1] or char == ' ':
+            folded.append(char)
+    return ''.join(folded)
+
+
+class SuggestIndex:
+    """
+    Type-ahead over restaurant names and distinct dish names.
+
+    Every word position of a name contributes two keys to one sorted array:
+    the name from that word on as written, and its phonetic_key(), so
+    "biry", "பிரி" and "piri" all find பிரியாணி / Biryani. A lookup is a
+    bisect plus a scan of the keys sharing the prefix, and updates insert or
+    delete single keys, so the array never needs rebuilding.
+    """
+
+    def __init__(self):
+        self._keys = []     # sorted (key, entry_key)
+        self._entries = {}  # entry_key -> {'type', 'text', 'count', 'keys', 'full_keys'}
+        self._docs = {}     # doc_key -> entry_key
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_key(doc_key, name):
+        # Dishes with the same name at different restaurants are one suggestion
+        if doc_key[0] == 'item':
+            return ('dish', ' '.join(tokenize(name)))
+        return ('restaurant', doc_key[1])
+
+    @staticmethod
+    def _name_keys(name):
+        """
+        (all keys, keys for the whole name)
+        """
+        words = tokenize(name)
+        keys = set()
+        for start in range(len(words)):
+            suffix = ' '.join(words[start:])
+            keys.add(suffix)
+            keys.add(phonetic_key(suffix))
+        keys.discard('')
+        whole = ' '.join(words)
+        return sorted(keys), {whole, phonetic_key(whole)}
+
+    def _add(self, doc_key, name, bulk=False):
+        entry_key = self._entry_key(doc_key, name)
+        if not entry_key[1]:
+            return
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            keys, full_keys = self._name_keys(name)
+            entry = self._entries[entry_key] = {
+                'type': entry_key[0],
+                'text': name.strip(),
+                'count': 0,
+                'keys': keys,
+                'full_keys': full_keys,
+            }
+            if entry_key[0] == 'restaurant':
+                entry['id'] = doc_key[1]
+            for key in keys:
+                if bulk:
+                    self._keys.append((key, entry_key))
+                else:
+                    bisect.insort(self._keys, (key, entry_key))
+        entry['count'] += 1
+        self._docs[doc_key] = entry_key
+
+    def _remove(self, doc_key):
+        entry_key = self._docs.pop(doc_key, None)
+        if entry_key is None:
+            return
+        entry = self._entries[entry_key]
+        entry['count'] -= 1
+        if entry['count'] > 0:
+            return
+        del self._entries[entry_key]
+        for key in entry['keys']:
+            position = bisect.bisect_left(self._keys, (key, entry_key))
+            if position < len(self._keys) and self._keys[position] == (key, entry_key):
+                del self._keys[position]
+
+    def load(self, docs):
+        """
+        Replace the contents with (doc_key, name) pairs
+        """
+        with self._lock:
+            self._keys, self._entries, self._docs = [], {}, {}
+            for doc_key, name in docs:
+                if name:
+                    self._add(doc_key, name, bulk=True)
+            self._keys.sort()
+
+    def upsert(self, doc_key, name):
+        with self._lock:
+            self._remove(doc_key)
+            if name:
+                self._add(doc_key, name)
+
+    def remove(self, doc_key):
+        with self._lock:
+            self._remove(doc_key)
+
+    def suggest(self, query, limit=8):
+        """
+        Up to `limit` suggestions for what has been typed so far. Names that
+        start with the query come before names with a later word matching,
+        exact spellings before phonetic matches, then dishes sold by more
+        restaurants, then shorter names.
+        """
+        written = ' '.join(tokenize(query))
+        if not written:
+            return []
+        phonetic = phonetic_key(written)
+
+        candidates = {}
+        with self._lock:
+            for prefix, exact in ((written, True), (phonetic, False)):
+                if not prefix:
+                    continue
+                start = bisect.bisect_left(self._keys, (prefix,))
+                for key, entry_key in self._keys[start:start + SUGGEST_SCAN_LIMIT]:
+                    if not key.startswith(prefix):
+                        break
+                    entry = self._entries[entry_key]
+                    # Lower ranks first
+                    rank = (0 if key in entry['full_keys'] else 1, 0 if exact else 1,
+                            -entry['count'], len(entry['text']))
+                    if entry_key not in candidates or rank < candidates[entry_key][0]:
+                        candidates[entry_key] = (rank, entry)
+
+        ranked = sorted(candidates.values(), key=lambda candidate: candidate[0])[:limit]
+        suggestions = []
+        for _, entry in ranked:
+            suggestion = {'type': entry['type'], 'text': entry['text']}
+            if entry['type'] == 'restaurant':
+                suggestion['id'] = entry['id']
+            else:
+                suggestion['restaurants'] = entry['count']
+            suggestions.append(suggestion)
+        return suggestions
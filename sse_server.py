@@ -0,0 +1,119 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+from order_events import BrokerFull, format_comment, open_stream, stream_messages
+
+
+class EventStreamServer:
+    """
+    Minimal asyncio HTTP server for the order event streams.
+
+    Under the threaded web server every open stream holds a thread for as
+    long as the page is open; here a stream is a coroutine, so one process
+    can hold thousands. It only answers GET `path`, with the same messages
+    as the Flask route. `authenticate(cookie_header)` returns the user's
+    event topics, or None when the request is not logged in.
+
+    Backpressure: a client whose socket does not drain within
+    `write_timeout` seconds is disconnected, and one that falls behind the
+    broker's per-subscriber queue gets a reset; neither slows the others.
+    """
+
+    def __init__(self, broker, authenticate, path='/events/orders', keepalive=15, write_timeout=10):
+        self.broker = broker
+        self.authenticate = authenticate
+        self.path = path
+        self.keepalive = keepalive
+        self.write_timeout = write_timeout
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            method, target, headers = await asyncio.wait_for(self._read_request(reader), 10)
+            url = urlsplit(target)
+            if method != 'GET' or url.path != self.path:
+                await self._respond(writer, '404 Not Found')
+                return
+
+            topics = self.authenticate(headers.get('cookie', ''))
+            if topics is None:
+                await self._respond(writer, '401 Unauthorized')
+                return
+
+            query = parse_qs(url.query)
+            order_id = int(query['order_id'][0]) if 'order_id' in query else None
+            since = int(query['since'][0]) if 'since' in query else None
+
+            loop = asyncio.get_running_loop()
+            ready = asyncio.Event()
+
+            def wakeup():
+                # Called from the thread that publishes
+                try:
+                    loop.call_soon_threadsafe(ready.set)
+                except RuntimeError:
+                    pass  # loop already closed
+
+            try:
+                subscriber, messages = open_stream(self.broker, topics, order_id,
+                                                   headers.get('last-event-id'), since, wakeup)
+            except BrokerFull:
+                await self._respond(writer, '503 Service Unavailable', 'Retry-After: 10\r\n')
+                return
+
+            try:
+                writer.write(b'HTTP/1.1 200 OK\r\n'
+                             b'Content-Type: text/event-stream\r\n'
+                             b'Cache-Control: no-cache\r\n'
+                             b'X-Accel-Buffering: no\r\n'
+                             b'Connection: close\r\n\r\n')
+                await self._send(writer, messages)
+                # The client sends nothing more; the read ends when it disconnects
+                disconnected = asyncio.ensure_future(reader.read())
+                try:
+                    while not subscriber.closed:
+                        woken = asyncio.ensure_future(ready.wait())
+                        done, _ = await asyncio.wait({woken, disconnected}, timeout=self.keepalive,
+                                                     return_when=asyncio.FIRST_COMPLETED)
+                        if woken not in done:
+                            woken.cancel()
+                            if disconnected in done:
+                                break
+                            await self._send(writer, [format_comment('keepalive')])
+                            continue
+                        ready.clear()
+                        messages = stream_messages(subscriber, subscriber.drain())
+                        if messages:
+                            await self._send(writer, messages)
+                finally:
+                    disconnected.cancel()
+            finally:
+                self.broker.unsubscribe(subscriber)
+        except (ConnectionError, asyncio.TimeoutError, ValueError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def _send(self, writer, messages):
+        writer.write(''.join(messages).encode())
+        # A client that stops reading is dropped instead of buffering for it
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def _respond(self, writer, status, headers=''):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Length: 0\r\n{headers}Connection: close\r\n\r\n'.encode())
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
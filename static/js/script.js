@@ -19,34 +19,72 @@ function updateCartCount() {
         url: '/api/cart_count',
         method: 'GET',
         success: function(data) {
-            if(data.count > 0) {
-                $('#cart-count').text(data.count).show();
-            } else {
-                $('#cart-count').hide();
-            }
+            setCartCount(data.count);
         }
     });
 }
 
-// Add item to cart
-function addToCart(foodItemId, quantity) {
+function setCartCount(count) {
+    if(count > 0) {
+        $('#cart-count').text(count).show();
+    } else {
+        $('#cart-count').hide();
+    }
+}
+
+// Send cart changes in one request; the response has the changed lines,
+// their sellers' totals and the cart totals, all computed by the server
+function sendCartChanges(changes, onSuccess) {
     $.ajax({
-        url: '/customer/add_to_cart',
+        url: '/customer/api/cart/batch',
         method: 'POST',
-        data: {
-            food_item_id: foodItemId,
-            quantity: quantity || 1
-        },
-        success: function(response) {
-            updateCartCount();
-            showNotification('Item added to cart!', 'success');
+        contentType: 'application/json',
+        data: JSON.stringify({changes: changes}),
+        success: function(data) {
+            setCartCount(data.cart.count);
+            if(onSuccess) {
+                onSuccess(data);
+            }
         },
-        error: function() {
-            showNotification('Failed to add item to cart', 'danger');
+        error: function(xhr) {
+            const message = xhr.responseJSON && xhr.responseJSON.message;
+            showNotification(message || 'Failed to update cart', 'danger');
         }
     });
 }
 
+// Quantity clicks in quick succession are sent as one batch, last value per item
+let pendingCartChanges = {};
+let cartBatchTimer = null;
+
+function queueCartQuantity(foodItemId, quantity, onSuccess) {
+    pendingCartChanges[foodItemId] = quantity;
+    clearTimeout(cartBatchTimer);
+    cartBatchTimer = setTimeout(function() {
+        const changes = Object.keys(pendingCartChanges).map(id => ({
+            food_item_id: parseInt(id),
+            quantity: pendingCartChanges[id]
+        }));
+        pendingCartChanges = {};
+        sendCartChanges(changes, onSuccess);
+    }, 250);
+}
+
+function hasPendingCartChange(foodItemId) {
+    return foodItemId in pendingCartChanges;
+}
+
+function formatRupees(amount) {
+    return '₹' + parseFloat(amount).toFixed(2);
+}
+
+// Add item to cart
+function addToCart(foodItemId, quantity) {
+    sendCartChanges([{food_item_id: foodItemId, add: quantity || 1}], function() {
+        showNotification('Item added to cart!', 'success');
+    });
+}
+
 // Show notification
 function showNotification(message, type) {
     const alertHtml = `
@@ -64,6 +102,33 @@ function showNotification(message, type) {
     }, 3000);
 }
 
+// Order status changes pushed by the server (/events/orders). The browser
+// reconnects on its own; a `reset` means events were missed, so reload.
+function subscribeOrderEvents(url, onStatus) {
+    if(!window.EventSource) {
+        return null;
+    }
+    const source = new EventSource(url);
+    source.addEventListener('order_status', function(e) {
+        onStatus(JSON.parse(e.data));
+    });
+    source.addEventListener('reset', function() {
+        source.close();
+        location.reload();
+    });
+    return source;
+}
+
+function statusLabel(status) {
+    return status.replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase());
+}
+
+function setStatusBadge(badge, status) {
+    $(badge).removeClass(function(index, className) {
+        return (className.match(/\bstatus-\S+/g) || []).join(' ');
+    }).addClass('status-' + status).text(statusLabel(status));
+}
+
 // Form validation
 function validateForm(formId) {
     const form = document.getElementById(formId);
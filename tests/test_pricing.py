@@ -0,0 +1,135 @@
+"""
+Invariants of pricing.price_cart on seeded random carts, so a change to the
+pricing rules cannot silently break totals.
+
+Usage: python -m pytest -q tests/test_pricing.py
+"""
+import os
+import random
+import sys
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing import CENTS, DELIVERY_CHARGE, TAX_RATE, price_cart, unit_price
+
+SEEDS = range(200)
+
+
+def make_menus(rng, seller_count, items_per_seller=40):
+    menus = {}
+    for seller_id in range(1, seller_count + 1):
+        menus[seller_id] = []
+        for _ in range(items_per_seller):
+            price = Decimal(rng.randint(100, 99999)).scaleb(-2)
+            discount = None
+            if rng.random() < 0.3:
+                discount = (price * Decimal(rng.randint(50, 99)) / 100).quantize(CENTS)
+            menus[seller_id].append((price, discount))
+    return menus
+
+
+def make_cart(rng, line_count, seller_count):
+    menus = make_menus(rng, seller_count)
+    lines = []
+    for _ in range(line_count):
+        seller_id = rng.randint(1, seller_count)
+        price, discount = rng.choice(menus[seller_id])
+        lines.append({
+            'seller_id': seller_id,
+            'restaurant_name': None,
+            'quantity': rng.randint(1, 12),
+            'price': price,
+            'discount_price': discount,
+        })
+    return lines
+
+
+def reference_totals(lines):
+    """
+    Straightforward Decimal arithmetic, one line at a time
+    """
+    subtotals = {}
+    for line in lines:
+        subtotals[line['seller_id']] = subtotals.get(line['seller_id'], Decimal('0')) + unit_price(line) * line['quantity']
+    return {seller_id: (subtotal, (subtotal * TAX_RATE).quantize(CENTS, ROUND_HALF_UP))
+            for seller_id, subtotal in subtotals.items()}
+
+
+@pytest.fixture(params=SEEDS, ids=lambda seed: f'seed{seed}')
+def cart(request):
+    rng = random.Random(request.param)
+    # Every tenth cart at full size
+    if request.param % 10 == 9:
+        return rng, make_cart(rng, 1000, 20)
+    return rng, make_cart(rng, rng.randint(0, 60), rng.randint(1, 6))
+
+
+def test_sellers_match_reference(cart):
+    _, lines = cart
+    sellers, _ = price_cart(lines)
+    expected = reference_totals(lines)
+    assert set(sellers) == set(expected)
+    for seller_id, seller in sellers.items():
+        subtotal, tax = expected[seller_id]
+        assert seller['subtotal'] == subtotal
+        assert seller['tax'] == tax
+        assert seller['delivery_charge'] == DELIVERY_CHARGE
+        assert seller['total'] == seller['subtotal'] + seller['delivery_charge'] + seller['tax']
+
+
+def test_cart_totals_are_sums_over_sellers(cart):
+    _, lines = cart
+    sellers, totals = price_cart(lines)
+    for name in ('subtotal', 'delivery_charge', 'tax'):
+        assert totals[name] == sum((seller[name] for seller in sellers.values()), Decimal('0.00'))
+    assert totals['grand_total'] == totals['subtotal'] + totals['delivery_charge'] + totals['tax']
+    assert totals['count'] == len(lines)
+
+
+def test_amounts_have_two_places(cart):
+    _, lines = cart
+    sellers, totals = price_cart(lines)
+    amounts = [amount for name, amount in totals.items() if name != 'count']
+    amounts += [seller[name] for seller in sellers.values()
+                for name in ('subtotal', 'delivery_charge', 'tax', 'total')]
+    assert all(amount.as_tuple().exponent == -2 for amount in amounts)
+
+
+def test_shuffling_lines_changes_nothing(cart):
+    rng, lines = cart
+    shuffled = list(lines)
+    rng.shuffle(shuffled)
+    assert price_cart(shuffled) == price_cart(lines)
+
+
+def test_splitting_a_line_changes_nothing(cart):
+    rng, lines = cart
+    splittable = [index for index, line in enumerate(lines) if line['quantity'] > 1]
+    if not splittable:
+        pytest.skip('no line with a quantity above 1')
+    index = rng.choice(splittable)
+    first = rng.randint(1, lines[index]['quantity'] - 1)
+    split = (lines[:index]
+             + [dict(lines[index], quantity=first), dict(lines[index], quantity=lines[index]['quantity'] - first)]
+             + lines[index + 1:])
+    assert price_cart(split)[0] == price_cart(lines)[0]
+
+
+def test_tax_rounds_half_up_once_per_seller():
+    # Three lines of 1.10: 3.30 x 5% = 0.165 rounds to 0.17, where rounding
+    # each line's 0.055 would give 3 x 0.06 = 0.18
+    lines = [{'seller_id': 1, 'quantity': 1, 'price': Decimal('1.10'), 'discount_price': None}] * 3
+    sellers, totals = price_cart(lines)
+    assert sellers[1]['subtotal'] == Decimal('3.30')
+    assert sellers[1]['tax'] == Decimal('0.17')
+    assert totals['grand_total'] == Decimal('3.30') + DELIVERY_CHARGE + Decimal('0.17')
+
+
+def test_empty_cart():
+    sellers, totals = price_cart([])
+    assert sellers == {}
+    assert totals['grand_total'] == Decimal('0.00')
+    assert totals['count'] == 0
@@ -0,0 +1,51 @@
+"""
+SearchIndex kept current with upsert() and remove() must rank exactly like
+one rebuilt from scratch with load().
+
+Usage: python -m pytest -q tests/test_search_index.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex
+
+
+def dish(item_id, name):
+    return ('item', item_id), {'name': name}, {'seller_id': 1, 'name': name}
+
+
+OLD = [dish(item_id, 'plain dosa') for item_id in range(5)]
+NEW = [dish(item_id, 'masala vada with a long description') for item_id in range(5, 50)]
+
+
+def ranking(index, query):
+    return [(round(score, 9), doc_key) for score, doc_key, _ in index.search(query, limit=100, prefix=False)]
+
+
+@pytest.mark.parametrize('query', ['plain', 'plain dosa', 'masala'])
+def test_upserts_rank_like_a_rebuild(query):
+    index = SearchIndex()
+    index.load(OLD)
+    index.search(query, prefix=False)  # cache the scores before the collection grows
+    for doc in NEW:
+        index.upsert(*doc)
+
+    rebuilt = SearchIndex()
+    rebuilt.load(OLD + NEW)
+    assert ranking(index, query) == ranking(rebuilt, query)
+
+
+def test_removals_rank_like_a_rebuild():
+    index = SearchIndex()
+    index.load(OLD + NEW)
+    index.search('plain', prefix=False)
+    for doc_key, _, _ in NEW[:30]:
+        index.remove(doc_key)
+
+    rebuilt = SearchIndex()
+    rebuilt.load(OLD + NEW[30:])
+    assert ranking(index, 'plain') == ranking(rebuilt, 'plain')